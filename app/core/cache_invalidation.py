@@ -0,0 +1,91 @@
+# Cross-process invalidation for the process-local caches.
+#
+# The dashboard, projection and principal caches live in each app process.
+# A change drops the committing process's entry at once; so that every other
+# process drops its copy too, the key is also sent with NOTIFY on the
+# CACHE_INVALIDATION_CHANNEL inside the committing transaction (NOTIFY is
+# transactional: nothing goes out for a rollback), and every app process
+# LISTENs and deletes it from its own cache.
+#
+# Notifications sent while a process is not listening are lost, so the
+# registered caches are cleared every time the listener (re)connects. If it
+# can't connect at all, the caches' TTLs still bound how stale they get.
+import asyncio
+import logging
+import os
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.core.cache import CacheBackend
+from app.core.database import async_engine
+
+logger = logging.getLogger(__name__)
+
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache_invalidation")
+CACHE_INVALIDATION_RETRY_INTERVAL = float(os.getenv("CACHE_INVALIDATION_RETRY_INTERVAL", "5"))
+
+# name -> cache; the name travels in the notification as "<name>:<key>".
+_caches: dict[str, CacheBackend] = {}
+
+
+def register(name: str, cache: CacheBackend):
+    _caches[name] = cache
+
+
+def invalidate_everywhere_on_commit(session: Session, name: str, key):
+    # Queues a NOTIFY for the key, sent just before the session commits.
+    session.info.setdefault("cache_invalidations", set()).add(f"{name}:{key}")
+
+
+# Sent before commit for keys queued outside a flush, and after each flush for
+# those queued by mapper events: commit's own flush runs after before_commit.
+@event.listens_for(Session, "before_commit")
+@event.listens_for(Session, "after_flush_postexec")
+def _notify_invalidations(session, flush_context=None):
+    payloads = session.info.pop("cache_invalidations", None)
+    if payloads:
+        session.connection().execute(
+            text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+            {"channel": CACHE_INVALIDATION_CHANNEL, "payloads": sorted(payloads)},
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop("cache_invalidations", None)
+
+
+def _on_notification(connection, pid, channel, payload: str):
+    name, _, key = payload.partition(":")
+    cache = _caches.get(name)
+    if cache is not None:
+        cache.delete(key)
+
+
+def _clear_all():
+    for cache in _caches.values():
+        cache.clear()
+
+
+async def run_listener():
+    # Holds one connection from the async pool while listening.
+    while True:
+        try:
+            async with async_engine.connect() as conn:
+                listener = (await conn.get_raw_connection()).driver_connection
+                closed = asyncio.Event()
+                listener.add_termination_listener(lambda _: closed.set())
+                await listener.add_listener(CACHE_INVALIDATION_CHANNEL, _on_notification)
+                try:
+                    _clear_all()
+                    await closed.wait()
+                finally:
+                    if not listener.is_closed():
+                        await listener.remove_listener(CACHE_INVALIDATION_CHANNEL, _on_notification)
+            logger.warning("Cache invalidation listener disconnected; reconnecting")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Cache invalidation listener failed")
+        await asyncio.sleep(CACHE_INVALIDATION_RETRY_INTERVAL)
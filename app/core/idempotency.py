@@ -0,0 +1,295 @@
+# Idempotency-Key support for retried POSTs.
+#
+# The first request with a given key runs normally and its response is stored;
+# retries with the same key get that response replayed without touching the
+# handler. Keys are scoped to the authenticated user and the path. Duplicates
+# that arrive while the first request is still running wait for it instead of
+# doing the work again.
+import asyncio
+import hashlib
+import logging
+import os
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.database import async_engine, utcnow
+from app.core.jwt import verify_access_token
+from app.models.idempotency import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = "idempotent-replayed"
+
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "memory")
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# How long a started request holds its key before a retry may take over,
+# e.g. after the process handling it died.
+IDEMPOTENCY_LOCK_TTL = float(os.getenv("IDEMPOTENCY_LOCK_TTL", "60"))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "10"))
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "3600"))
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyStore:
+    # Records are dicts: fingerprint, status_code (None while in flight),
+    # headers as [name, value] pairs, and body bytes.
+    async def get(self, key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def reserve(self, key: str, fingerprint: str, ttl: float) -> bool:
+        # Claims the key for a new request; False if someone else holds it.
+        raise NotImplementedError
+
+    async def complete(self, key: str, record: dict, ttl: float):
+        raise NotImplementedError
+
+    async def release(self, key: str):
+        raise NotImplementedError
+
+    async def purge(self):
+        pass
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    # Process-local LRU. Every method runs on the event loop without awaiting,
+    # so reserve's check-and-set is atomic.
+    def __init__(self, maxsize: int = IDEMPOTENCY_CACHE_SIZE):
+        self.cache = TTLCache(maxsize=maxsize, ttl=IDEMPOTENCY_TTL)
+
+    async def get(self, key):
+        return self.cache.get(key)
+
+    async def reserve(self, key, fingerprint, ttl):
+        if self.cache.get(key) is not None:
+            return False
+        self.cache.set(key, {"fingerprint": fingerprint, "status_code": None}, ttl)
+        return True
+
+    async def complete(self, key, record, ttl):
+        self.cache.set(key, record, ttl)
+
+    async def release(self, key):
+        self.cache.delete(key)
+
+
+class PostgresIdempotencyStore(IdempotencyStore):
+    # Shared across processes through the idempotency_keys table.
+    async def get(self, key):
+        async with async_engine.connect() as conn:
+            row = (
+                await conn.execute(
+                    select(
+                        IdempotencyKey.fingerprint,
+                        IdempotencyKey.status_code,
+                        IdempotencyKey.headers,
+                        IdempotencyKey.body,
+                    ).where(IdempotencyKey.key == key, IdempotencyKey.expires_at > utcnow())
+                )
+            ).first()
+        return dict(row._mapping) if row else None
+
+    async def reserve(self, key, fingerprint, ttl):
+        now = utcnow()
+        stmt = insert(IdempotencyKey).values(
+            key=key, fingerprint=fingerprint, created_at=now, expires_at=now + timedelta(seconds=ttl)
+        )
+        # An expired row (finished or abandoned) can be taken over in place.
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.key],
+            set_={
+                "fingerprint": stmt.excluded.fingerprint,
+                "status_code": None,
+                "headers": None,
+                "body": None,
+                "created_at": stmt.excluded.created_at,
+                "expires_at": stmt.excluded.expires_at,
+            },
+            where=IdempotencyKey.expires_at <= now,
+        ).returning(IdempotencyKey.key)
+        async with async_engine.begin() as conn:
+            return (await conn.execute(stmt)).first() is not None
+
+    async def complete(self, key, record, ttl):
+        async with async_engine.begin() as conn:
+            await conn.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key)
+                .values(
+                    status_code=record["status_code"],
+                    headers=record["headers"],
+                    body=record["body"],
+                    expires_at=utcnow() + timedelta(seconds=ttl),
+                )
+            )
+
+    async def release(self, key):
+        async with async_engine.begin() as conn:
+            await conn.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None))
+            )
+
+    async def purge(self):
+        async with async_engine.begin() as conn:
+            await conn.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= utcnow()))
+
+
+def create_store(backend: str = IDEMPOTENCY_BACKEND) -> IdempotencyStore:
+    if backend == "postgres":
+        return PostgresIdempotencyStore()
+    if backend == "memory":
+        return MemoryIdempotencyStore()
+    raise ValueError(f"Unknown idempotency backend: {backend}")
+
+
+idempotency_store = create_store()
+
+
+def _principal(authorization: Optional[str]) -> Optional[str]:
+    # Same token handling as get_current_user; requests it would reject are
+    # passed through untouched and fail there.
+    if not authorization:
+        return None
+    token = authorization[7:] if authorization.startswith("Bearer ") else authorization
+    payload = verify_access_token(token)
+    return payload.get("user_id") if payload else None
+
+
+def _error(status_code: int, detail: str) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"detail": detail})
+
+
+class IdempotencyMiddleware:
+    # Pure ASGI so the stored body is exactly the bytes that were sent.
+    def __init__(self, app, routes: Iterable[tuple], store: Optional[IdempotencyStore] = None):
+        self.app = app
+        self.routes = set(routes)
+        self.store = store or idempotency_store
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in self.routes:
+            return await self.app(scope, receive, send)
+        # Replays never reach the router; the configured paths are literal.
+        metrics.set_route_label(scope, scope["path"])
+
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_HEADER)
+        principal = _principal(headers.get("authorization"))
+        if not key or principal is None:
+            return await self.app(scope, receive, send)
+        if len(key) > MAX_KEY_LENGTH:
+            return await _error(400, "Idempotency-Key is too long")(scope, receive, send)
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        fingerprint = hashlib.sha256(scope.get("query_string", b"") + b"\0" + body).hexdigest()
+        storage_key = f"{principal}:{scope['path']}:{key}"
+
+        response = await self._acquire(storage_key, fingerprint)
+        if response is not None:
+            return await response(scope, receive, send)
+
+        async def replay_receive():
+            nonlocal body
+            if body is not None:
+                message, body = {"type": "http.request", "body": body, "more_body": False}, None
+                return message
+            return await receive()
+
+        record = {"fingerprint": fingerprint, "status_code": None, "headers": [], "body": b""}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                record["status_code"] = message["status"]
+                record["headers"] = [[k.decode("latin-1"), v.decode("latin-1")] for k, v in message.get("headers", [])]
+            elif message["type"] == "http.response.body":
+                record["body"] += message.get("body", b"")
+            await send(message)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[storage_key] = future
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await self.store.release(storage_key)
+            raise
+        else:
+            # Only successes are replayed; after an error the client may retry
+            # with the same key once the cause is fixed.
+            if record["status_code"] is not None and record["status_code"] < 400:
+                await self.store.complete(storage_key, record, IDEMPOTENCY_TTL)
+            else:
+                await self.store.release(storage_key)
+        finally:
+            del self._inflight[storage_key]
+            future.set_result(None)
+
+    async def _acquire(self, storage_key: str, fingerprint: str):
+        # Returns a response to send instead of running the request, or None
+        # once this request holds the key.
+        deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_TIMEOUT
+        delay = 0.05
+        while True:
+            inflight = self._inflight.get(storage_key)
+            if inflight is not None:
+                # Same process: wait for the first request rather than polling.
+                try:
+                    await asyncio.wait_for(asyncio.shield(inflight), deadline - asyncio.get_running_loop().time())
+                except asyncio.TimeoutError:
+                    return _error(409, "A request with this Idempotency-Key is still in progress")
+
+            record = await self.store.get(storage_key)
+            if record is not None and record["fingerprint"] != fingerprint:
+                return _error(422, "Idempotency-Key was already used with a different request")
+            if record is not None and record["status_code"] is not None:
+                headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in record["headers"]]
+                return _ReplayedResponse(record["status_code"], headers, record["body"])
+            if record is None and storage_key not in self._inflight:
+                if await self.store.reserve(storage_key, fingerprint, IDEMPOTENCY_LOCK_TTL):
+                    return None
+                continue
+
+            # Held by another process (or just re-claimed locally): poll.
+            if asyncio.get_running_loop().time() >= deadline:
+                return _error(409, "A request with this Idempotency-Key is still in progress")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+
+class _ReplayedResponse:
+    def __init__(self, status_code: int, headers: list, body: bytes):
+        self.status_code = status_code
+        self.headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+        self.body = body
+
+    async def __call__(self, scope, receive, send):
+        headers = self.headers + [
+            (b"content-length", str(len(self.body)).encode()),
+            (REPLAYED_HEADER.encode(), b"true"),
+        ]
+        await send({"type": "http.response.start", "status": self.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": self.body})
+
+
+async def run_purger(store: Optional[IdempotencyStore] = None):
+    store = store or idempotency_store
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_PURGE_INTERVAL)
+        try:
+            await store.purge()
+        except Exception:
+            logger.exception("Idempotency key purge failed")
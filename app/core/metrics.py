@@ -0,0 +1,273 @@
+# In-process metrics in the Prometheus text format, served on /metrics.
+#
+# Recording is lock-free: every counter, gauge and histogram keeps one list of
+# values per thread and only that thread writes to it, so the hot path is a
+# thread-local lookup and a list increment. A scrape adds the per-thread
+# values up; it may miss an increment that lands mid-scrape, never loses one.
+#
+# Metrics are module-level objects declared next to the code they measure.
+# Values that already live elsewhere (worker stats, pool sizes) are exported
+# with register_callback/export_dict and read at scrape time.
+import contextvars
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Scope key for a route label when the request never reaches the router,
+# e.g. a response replayed by the idempotency middleware.
+ROUTE_LABEL_KEY = "metrics.route"
+UNMATCHED_ROUTE = "unmatched"
+
+_families: list = []
+_callbacks: list = []
+
+
+class _Sharded:
+    # Per-thread value lists; size is fixed per metric type.
+    size = 1
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: list[list] = []
+
+    def _shard(self) -> list:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = [0] * self.size
+            # list.append is atomic, so a new thread needs no lock either.
+            self._shards.append(values)
+            return values
+
+    def _totals(self) -> list:
+        totals = [0] * self.size
+        for shard in list(self._shards):
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+class Counter(_Sharded):
+    def inc(self, amount: float = 1):
+        self._shard()[0] += amount
+
+    def samples(self, name: str, labels: str) -> Iterable[str]:
+        yield f"{name}{labels} {_format(self._totals()[0])}"
+
+
+class Gauge(Counter):
+    # Only moves by deltas, which keeps it shardable; absolute values that
+    # live elsewhere are exported with register_callback instead.
+    def dec(self, amount: float = 1):
+        self._shard()[0] -= amount
+
+
+class Histogram(_Sharded):
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # One slot per bucket, one for +Inf, one for the sum.
+        self.size = len(self.buckets) + 2
+        super().__init__()
+
+    def observe(self, value: float):
+        shard = self._shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def samples(self, name: str, labels: str) -> Iterable[str]:
+        totals = self._totals()
+        inner = labels[1:-1] + "," if labels else ""
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), totals):
+            cumulative += count
+            yield f'{name}_bucket{{{inner}le="{_format(bound)}"}} {cumulative}'
+        yield f"{name}_sum{labels} {_format(totals[-1])}"
+        yield f"{name}_count{labels} {cumulative}"
+
+
+class Timer:
+    # with metric.time(): ...  observes the elapsed seconds on exit.
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Family:
+    # A named metric with label dimensions. Children are created on first use
+    # of a label combination; keep label values low-cardinality.
+    def __init__(self, kind: str, name: str, help: str, labelnames: tuple, factory: Callable):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._factory = factory
+        self._children: dict[tuple, _Sharded] = {}
+        if not labelnames:
+            self._children[()] = factory()
+        _families.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            # setdefault keeps the first child if two threads race here.
+            child = self._children.setdefault(values, self._factory())
+        return child
+
+    # Unlabelled families record directly.
+    def inc(self, amount: float = 1):
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._children[()].dec(amount)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def time(self) -> Timer:
+        return Timer(self._children[()])
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, child in list(self._children.items()):
+            yield from child.samples(self.name, _labels(self.labelnames, values))
+
+
+def counter(name: str, help: str, labelnames: tuple = ()) -> Family:
+    return Family("counter", name, help, labelnames, Counter)
+
+
+def gauge(name: str, help: str, labelnames: tuple = ()) -> Family:
+    return Family("gauge", name, help, labelnames, Gauge)
+
+
+def histogram(name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Family:
+    return Family("histogram", name, help, labelnames, lambda: Histogram(buckets))
+
+
+def register_callback(kind: str, name: str, help: str, fn: Callable, labelnames: tuple = ()):
+    # fn is called at scrape time and returns a number, or for labelled
+    # metrics a dict of label value tuples to numbers.
+    _callbacks.append((kind, name, help, fn, labelnames))
+
+
+def export_dict(prefix: str, values: dict, help: str):
+    # Exposes a plain stats dict such as a worker's `metrics`; keys ending in
+    # _total are counters, the rest gauges.
+    for key in values:
+        kind = "counter" if key.endswith("_total") else "gauge"
+        register_callback(kind, f"{prefix}_{key}", help, lambda key=key: values[key])
+
+
+def _format(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def render() -> str:
+    lines = []
+    for family in list(_families):
+        lines.extend(family.render())
+    for kind, name, help, fn, labelnames in list(_callbacks):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        value = fn()
+        if labelnames:
+            for values, v in value.items():
+                lines.append(f"{name}{_labels(labelnames, values)} {_format(v)}")
+        else:
+            lines.append(f"{name} {_format(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# Per-request statistics, visible to code running on behalf of the request
+# (including SQLAlchemy's greenlets, which share the caller's context).
+class RequestStats:
+    __slots__ = ("statements",)
+
+    def __init__(self):
+        self.statements = 0
+
+
+request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+http_request_duration = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"),
+)
+http_requests_in_flight = gauge("http_requests_in_flight", "HTTP requests being served")
+db_statements_per_request = histogram(
+    "db_statements_per_request", "SQL statements executed per HTTP request", ("method", "route"), COUNT_BUCKETS,
+)
+
+
+def set_route_label(scope, route: str):
+    scope.setdefault(ROUTE_LABEL_KEY, route)
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", UNMATCHED_ROUTE)
+    # Never the raw path: unmatched URLs are unbounded.
+    return scope.get(ROUTE_LABEL_KEY, UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    # Pure ASGI and outermost, so the timings include the other middleware.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            request_stats.reset(token)
+            method, route = scope["method"], route_label(scope)
+            http_request_duration.labels(method, route, str(status)).observe(elapsed)
+            db_statements_per_request.labels(method, route).observe(stats.statements)
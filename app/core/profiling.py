@@ -0,0 +1,210 @@
+# Opt-in per-request SQL profiling.
+#
+# With SQL_PROFILE=true every statement a request runs is recorded with its
+# timing. Identical statements (same SQL, different parameters) repeated
+# SQL_PROFILE_N_PLUS_ONE times or more are flagged as N+1: the usual cause is
+# a lazy relationship, e.g. User.safelocks, loaded inside a loop. The summary
+# goes out in an X-SQL-Profile response header, and with
+# SQL_PROFILE_TRACE_FILE set each request is also appended to that file as
+# one JSON line.
+#
+# Off by default. The middleware is always installed but passes requests
+# straight through until profiling is enabled, and the SQLAlchemy listeners
+# are only attached then. app.core.pytest_plugin enables it for test runs.
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import orjson
+from sqlalchemy import event
+
+from app.core import metrics
+from app.core.database import async_engine, engine
+
+logger = logging.getLogger(__name__)
+
+SQL_PROFILE = os.getenv("SQL_PROFILE", "false").lower() == "true"
+SQL_PROFILE_HEADER = os.getenv("SQL_PROFILE_HEADER", "true").lower() == "true"
+SQL_PROFILE_TRACE_FILE = os.getenv("SQL_PROFILE_TRACE_FILE") or None
+SQL_PROFILE_N_PLUS_ONE = int(os.getenv("SQL_PROFILE_N_PLUS_ONE", "3"))
+
+PROFILE_HEADER = b"x-sql-profile"
+# Statement text kept in summaries and traces.
+MAX_STATEMENT_LENGTH = 500
+
+
+class QueryProfile:
+    def __init__(self):
+        self.statements: list[tuple[str, float]] = []
+
+    def record(self, statement: str, seconds: float):
+        self.statements.append((statement, seconds))
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def seconds(self) -> float:
+        return sum(seconds for _, seconds in self.statements)
+
+    def n_plus_one(self, threshold: int = SQL_PROFILE_N_PLUS_ONE) -> list[dict]:
+        counts = Counter(statement for statement, _ in self.statements)
+        durations: dict[str, float] = {}
+        for statement, seconds in self.statements:
+            if counts[statement] >= threshold:
+                durations[statement] = durations.get(statement, 0.0) + seconds
+        return [
+            {"statement": statement[:MAX_STATEMENT_LENGTH], "count": counts[statement], "ms": round(ms * 1000, 3)}
+            for statement, ms in sorted(durations.items(), key=lambda item: -counts[item[0]])
+        ]
+
+    def summary(self) -> dict:
+        return {
+            "statements": self.count,
+            "ms": round(self.seconds * 1000, 3),
+            "n_plus_one": self.n_plus_one(),
+        }
+
+
+_current: contextvars.ContextVar[Optional[QueryProfile]] = contextvars.ContextVar("sql_profile", default=None)
+_enabled = False
+_installed = False
+_install_lock = threading.Lock()
+# Called with each finished request summary; the pytest plugin collects them.
+_listeners: list[Callable[[dict], None]] = []
+_trace_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None and context is not None:
+        context._sql_profile_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    start = getattr(context, "_sql_profile_start", None)
+    if profile is not None and start is not None:
+        profile.record(statement, time.perf_counter() - start)
+
+
+def install():
+    # Attaches the statement listeners to both engines, once.
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        for target in (engine, async_engine.sync_engine):
+            event.listen(target, "before_cursor_execute", _before_cursor_execute)
+            event.listen(target, "after_cursor_execute", _after_cursor_execute)
+        _installed = True
+
+
+def enable():
+    global _enabled
+    install()
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def add_listener(fn: Callable[[dict], None]):
+    _listeners.append(fn)
+
+
+def remove_listener(fn: Callable[[dict], None]):
+    _listeners.remove(fn)
+
+
+@contextmanager
+def profile() -> Iterator[QueryProfile]:
+    # Records the statements run inside the block, outside of any request,
+    # e.g. in a script or a test calling a worker function directly.
+    install()
+    current = QueryProfile()
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+
+
+def _header_value(summary: dict) -> bytes:
+    return f"statements={summary['statements']}; ms={summary['ms']}; n_plus_one={len(summary['n_plus_one'])}".encode()
+
+
+def _append_trace(path: str, line: bytes):
+    with _trace_lock, open(path, "ab") as f:
+        f.write(line + b"\n")
+
+
+class SQLProfilingMiddleware:
+    # Pure ASGI. The header reports what ran before the response started;
+    # the trace line and listeners get the whole request.
+    def __init__(self, app, trace_file: Optional[str] = SQL_PROFILE_TRACE_FILE, header: bool = SQL_PROFILE_HEADER):
+        self.app = app
+        self.trace_file = trace_file
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _enabled:
+            return await self.app(scope, receive, send)
+
+        current = QueryProfile()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.header:
+                    headers = list(message.get("headers", []))
+                    headers.append((PROFILE_HEADER, _header_value(current.summary())))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current.set(current)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            summary = {
+                "method": scope["method"],
+                "route": metrics.route_label(scope),
+                "path": scope["path"],
+                "status": status,
+                **current.summary(),
+            }
+            if summary["n_plus_one"]:
+                logger.warning(
+                    "Possible N+1 on %s %s: %s", summary["method"], summary["route"],
+                    ", ".join(f"{item['count']}x {item['statement'][:80]!r}" for item in summary["n_plus_one"]),
+                )
+            for listener in list(_listeners):
+                listener(summary)
+            if self.trace_file:
+                trace = {
+                    **summary,
+                    "queries": [
+                        {"statement": statement[:MAX_STATEMENT_LENGTH], "ms": round(seconds * 1000, 3)}
+                        for statement, seconds in current.statements
+                    ],
+                }
+                await asyncio.to_thread(_append_trace, self.trace_file, orjson.dumps(trace))
+
+
+if SQL_PROFILE:
+    enable()
@@ -0,0 +1,104 @@
+# pytest plugin enforcing SQL query budgets per route.
+#
+#   # conftest.py
+#   pytest_plugins = ["app.core.pytest_plugin"]
+#
+# Turns on app.core.profiling for the session, so every request a test makes
+# through the app (TestClient or httpx.ASGITransport) is measured. A test fails
+# if any request runs more statements than its budget. Budgets come from, most
+# specific first:
+#
+#   @pytest.mark.query_budget(3, route="GET /goals/my-Goals")
+#   @pytest.mark.query_budget(5)                  # every request in the test
+#
+#   # pytest.ini / pyproject [tool.pytest.ini_options]
+#   query_budgets =
+#       GET /goals/my-Goals = 3
+#       GET /payments/verify-deposit = 8
+#   query_budget_default = 20
+#
+# Routes are the route templates shown in X-SQL-Profile traces, without the
+# query string: GET /payments/verify-deposit?reference=... is budgeted as
+# GET /payments/verify-deposit. With --fail-on-n-plus-one, a request that
+# repeats one statement SQL_PROFILE_N_PLUS_ONE times or more fails the test as
+# well. The sql_profile fixture records statements run outside a request.
+#
+# tests/test_pytest_plugin.py runs the plugin itself under pytester.
+from typing import Optional
+
+import pytest
+
+from app.core import profiling
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("query budget")
+    group.addoption(
+        "--fail-on-n-plus-one", action="store_true", default=False,
+        help="fail tests whose requests repeat an identical SQL statement",
+    )
+    parser.addini("query_budgets", "per-route statement budgets, 'METHOD /route = N' per line", type="linelist")
+    parser.addini("query_budget_default", "statement budget for routes without one", default="")
+
+
+def _parse_budgets(lines: list) -> dict:
+    budgets = {}
+    for line in lines:
+        route, _, limit = line.rpartition("=")
+        if not route.strip() or not limit.strip().isdigit():
+            raise pytest.UsageError(f"query_budgets: expected 'METHOD /route = N', got {line!r}")
+        budgets[" ".join(route.split())] = int(limit)
+    return budgets
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "query_budget(limit, route=None): cap SQL statements per request")
+    config._query_budgets = _parse_budgets(config.getini("query_budgets"))
+    default = config.getini("query_budget_default")
+    config._query_budget_default = int(default) if default else None
+    profiling.enable()
+
+
+def _budget_for(item, route: str) -> Optional[int]:
+    general = None
+    for marker in item.iter_markers("query_budget"):
+        limit = marker.args[0] if marker.args else marker.kwargs["limit"]
+        marker_route = marker.kwargs.get("route")
+        if marker_route is not None and " ".join(marker_route.split()) == route:
+            return limit
+        if marker_route is None and general is None:
+            general = limit
+    if general is not None:
+        return general
+    return item.config._query_budgets.get(route, item.config._query_budget_default)
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    summaries = []
+    listener = summaries.append
+    profiling.add_listener(listener)
+    try:
+        # Re-raises if the test itself failed; budgets are only checked on passes.
+        result = yield
+    finally:
+        profiling.remove_listener(listener)
+
+    problems = []
+    for summary in summaries:
+        route = f"{summary['method']} {summary['route']}"
+        budget = _budget_for(item, route)
+        if budget is not None and summary["statements"] > budget:
+            problems.append(f"{route} ran {summary['statements']} SQL statements, budget is {budget}")
+        if item.config.getoption("fail_on_n_plus_one"):
+            for repeat in summary["n_plus_one"]:
+                problems.append(f"{route} repeated {repeat['count']}x: {repeat['statement'][:200]}")
+    if problems:
+        pytest.fail("Query budget exceeded:\n  " + "\n  ".join(problems), pytrace=False)
+    return result
+
+
+@pytest.fixture
+def sql_profile():
+    # with sql_profile() as p: ...; assert p.count <= 2
+    return profiling.profile
@@ -0,0 +1,164 @@
+# Rate limiting for the abuse-prone auth endpoints.
+#
+# Uses GCRA, a token bucket that stores a single timestamp per key: a limit of
+# N hits per period allows a burst of N, then one hit every period/N. A hit
+# that would go over is rejected with the number of seconds until it would be
+# allowed, which becomes the Retry-After header.
+#
+# The memory backend keeps per-process buckets in lock-sharded dicts; with
+# several workers each one enforces the limit separately. The postgres
+# backend shares buckets through the unlogged rate_limits table at the cost of
+# one upsert per check. Other stores (e.g. Redis) plug in as a
+# RateLimitBackend.
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import Float, bindparam, case, delete, func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.database import async_engine
+from app.models.rate_limit import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "16"))
+# Keys tracked per process by the memory backend, across all shards.
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_PURGE_INTERVAL = float(os.getenv("RATE_LIMIT_PURGE_INTERVAL", "600"))
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    # "5/600" -> 5 hits per 600 seconds.
+    limit, _, period = rate.partition("/")
+    limit, period = int(limit), float(period)
+    if limit <= 0 or period <= 0:
+        raise ValueError(f"Invalid rate {rate!r}; expected 'hits/seconds'")
+    return limit, period
+
+
+def _gcra(tat: Optional[float], now: float, limit: int, period: float) -> tuple[Optional[float], float]:
+    # Returns (new tat, 0) if the hit is allowed, (None, retry_after) if not.
+    interval = period / limit
+    new_tat = (now if tat is None else max(tat, now)) + interval
+    if new_tat - now > period:
+        return None, new_tat - period - now
+    return new_tat, 0.0
+
+
+class RateLimitBackend:
+    async def hit(self, key: str, limit: int, period: float) -> float:
+        # Records a hit; returns 0 if allowed, else seconds until it would be.
+        raise NotImplementedError
+
+    async def purge(self):
+        pass
+
+
+class _Shard:
+    __slots__ = ("lock", "buckets")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets: dict[str, float] = {}
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    # Keys are spread over independently locked shards, so checks for
+    # different keys from different threads rarely contend. Each shard is kept
+    # in least-recently-hit order and trimmed past its share of max_keys.
+    def __init__(self, shards: int = RATE_LIMIT_SHARDS, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.shards = [_Shard() for _ in range(shards)]
+        self.max_per_shard = max(1, max_keys // shards)
+
+    def hit_sync(self, key: str, limit: int, period: float, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        shard = self.shards[hash(key) % len(self.shards)]
+        with shard.lock:
+            buckets = shard.buckets
+            # Popped and re-added to keep the dict in last-hit order.
+            previous = buckets.pop(key, None)
+            tat, retry_after = _gcra(previous, now, limit, period)
+            # Rejected hits leave the bucket as it was.
+            buckets[key] = previous if tat is None else tat
+            if len(buckets) > self.max_per_shard:
+                self._trim(buckets, now)
+        return retry_after
+
+    def _trim(self, buckets: dict, now: float):
+        # Expired buckets are as good as absent; after those, drop the least
+        # recently hit keys.
+        for key in [key for key, tat in buckets.items() if tat <= now]:
+            del buckets[key]
+        while len(buckets) > self.max_per_shard:
+            del buckets[next(iter(buckets))]
+
+    async def hit(self, key, limit, period):
+        return self.hit_sync(key, limit, period)
+
+    def clear(self):
+        for shard in self.shards:
+            with shard.lock:
+                shard.buckets.clear()
+
+
+class PostgresRateLimitBackend(RateLimitBackend):
+    # One upsert per hit against the shared rate_limits table. Uses the app
+    # servers' wall clocks, which NTP keeps well inside any useful period.
+    def __init__(self):
+        table = RateLimitBucket.__table__
+        now = bindparam("now", type_=Float)
+        interval = bindparam("interval", type_=Float)
+        period = bindparam("period", type_=Float)
+        new_tat = func.greatest(table.c.tat, now) + interval
+        allowed = new_tat - now <= period
+        stmt = insert(table).values(key=bindparam("key"), tat=now + interval, allowed_at=now)
+        # Built once with bind parameters so the compiled form is reused.
+        self.statement = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={
+                "tat": case((allowed, new_tat), else_=table.c.tat),
+                "allowed_at": case((allowed, now), else_=table.c.allowed_at),
+            },
+        ).returning(table.c.tat, table.c.allowed_at)
+
+    async def hit(self, key, limit, period):
+        now = time.time()
+        interval = period / limit
+        params = {"key": key, "now": now, "interval": interval, "period": period}
+        # A single atomic statement, so autocommit saves the BEGIN/COMMIT trips.
+        async with async_engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            tat, allowed_at = (await conn.execute(self.statement, params)).one()
+        if allowed_at == now:
+            return 0.0
+        return max(tat + interval - period - now, 0.0)
+
+    async def purge(self):
+        async with async_engine.begin() as conn:
+            await conn.execute(delete(RateLimitBucket).where(RateLimitBucket.tat <= time.time()))
+
+
+def create_backend(backend: str = RATE_LIMIT_BACKEND) -> RateLimitBackend:
+    if backend == "postgres":
+        return PostgresRateLimitBackend()
+    if backend == "memory":
+        return MemoryRateLimitBackend()
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+rate_limit_backend = create_backend()
+
+
+async def run_purger():
+    while True:
+        await asyncio.sleep(RATE_LIMIT_PURGE_INTERVAL)
+        try:
+            await rate_limit_backend.purge()
+        except Exception:
+            logger.exception("Failed to purge expired rate limit buckets")
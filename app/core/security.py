@@ -1,7 +1,17 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
 from passlib.context import CryptContext
+from app.core import metrics
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(max(HASH_WORKERS, 1) * 4)))
+
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -14,3 +24,75 @@ def hash_pin(pin: str) -> str:
 
 def verify_pin(plain_pin: str, hashed_pin: str) -> bool:
     return pwd_context.verify(plain_pin, hashed_pin)
+
+
+class HashingBusyError(Exception):
+    pass
+
+
+hashing_seconds = metrics.histogram(
+    "password_hashing_seconds", "bcrypt hash/verify time, including the wait for a pool worker", ("operation",),
+)
+hashing_rejected = metrics.counter("password_hashing_rejected_total", "bcrypt calls rejected because the pool was saturated")
+
+
+class HashingService:
+    # Runs bcrypt in a worker pool so request handlers only await it. Work
+    # beyond max_pending is rejected immediately instead of queueing, so a
+    # login storm turns into fast 503s rather than starving other endpoints.
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.workers > 0:
+                # spawn keeps the children clear of the parent's event loop and DB sockets
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            hashing_rejected.inc()
+            raise HashingBusyError("Hashing pool saturated")
+
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            hashing_seconds.labels(fn.__name__).observe(time.perf_counter() - start)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hashing_service = HashingService()
+metrics.register_callback(
+    "gauge", "password_hashing_pending", "bcrypt calls running or queued", lambda: hashing_service.pending,
+)
+
+
+async def hash_password_async(password: str) -> str:
+    return await hashing_service.run(hash_password, password)
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await hashing_service.run(verify_password, plain, hashed)
+
+
+async def hash_pin_async(pin: str) -> str:
+    return await hashing_service.run(hash_pin, pin)
+
+async def verify_pin_async(plain_pin: str, hashed_pin: str) -> bool:
+    return await hashing_service.run(verify_pin, plain_pin, hashed_pin)
@@ -0,0 +1,79 @@
+# Fast path for returning ORM rows from response_model routes.
+#
+# FastAPI validates a handler's return value against response_model and then
+# serialises the validated copy. For rows that came straight from the
+# database that validation only re-checks what the column types already
+# guarantee. orm_response() instead reads the schema's fields off each row,
+# applies the few conversions Pydantic would (Decimal -> float, date ->
+# datetime) and encodes with orjson. The output matches the validated path;
+# the route's response_model still documents it.
+import types
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Optional, Sequence, Union, get_args, get_origin
+from uuid import UUID
+
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+
+def _to_float(value):
+    return value if value is None or type(value) is float else float(value)
+
+
+def _to_datetime(value):
+    if type(value) is date:
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+def _converter(annotation):
+    # None when orjson already encodes the column type the way Pydantic does.
+    if get_origin(annotation) in (Union, types.UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return _converter(args[0]) if len(args) == 1 else None
+    if annotation is float:
+        return _to_float
+    if annotation is datetime:
+        return _to_datetime
+    return None
+
+
+@lru_cache(maxsize=None)
+def _plan(schema: type[BaseModel], fields: Optional[tuple] = None) -> tuple:
+    names = fields or tuple(schema.model_fields)
+    return tuple((name, _converter(schema.model_fields[name].annotation)) for name in names)
+
+
+def dump_rows(schema: type[BaseModel], rows: Sequence, fields: Optional[Sequence[str]] = None) -> list:
+    # Plain dicts for the given rows; anything with the schema's fields as
+    # attributes works (ORM entities, Row tuples).
+    plan = _plan(schema, tuple(fields) if fields else None)
+    out = []
+    for row in rows:
+        item = {}
+        for name, convert in plan:
+            value = getattr(row, name)
+            item[name] = convert(value) if convert else value
+        out.append(item)
+    return out
+
+
+def _default(value):
+    # asyncpg returns its own UUID subclass, which orjson does not recognise.
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+
+def orm_response(schema: type[BaseModel], content, fields: Optional[Sequence[str]] = None,
+                 status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    # content is one row or a list of rows.
+    many = isinstance(content, (list, tuple))
+    data = dump_rows(schema, content if many else [content], fields)
+    body = orjson.dumps(data if many else data[0], default=_default)
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
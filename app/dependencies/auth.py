@@ -1,8 +1,15 @@
+import os
+import threading
+from typing import Optional
+from uuid import UUID
 from fastapi import Depends, HTTPException
 # from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from app.core.jwt import SECRET_KEY, ALGORITHM
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from app.core import cache_invalidation, metrics
+from app.core.cache import CacheBackend, TTLCache
+from app.core.jwt import verify_access_token
 from app.models.user import User
 from app.core.database import get_db
 from fastapi.security import APIKeyHeader
@@ -10,7 +17,124 @@ from fastapi.security import APIKeyHeader
 # oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 oauth2_scheme = APIKeyHeader(name="Authorization")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+# The User columns cached for routes to read. Secrets (hashed_password, pin)
+# are left out: the shared backend may live outside this process.
+PRINCIPAL_COLUMNS = (
+    "id", "first_name", "last_name", "gender", "date_of_birth", "phone_number",
+    "email", "is_phone_verified", "is_verified", "created_at",
+)
+
+
+class PrincipalCache:
+    # Caches user row snapshots by user_id: a process-local LRU in front of an
+    # optional shared backend. Snapshots are plain dicts so any backend works.
+    def __init__(self, local: CacheBackend, shared: Optional[CacheBackend] = None):
+        self.local = local
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        # Sync routes run in the threadpool, so the counters need a lock.
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[dict]:
+        data = self.local.get(user_id)
+        if data is None and self.shared is not None:
+            data = self.shared.get(user_id)
+            if data is not None:
+                self.local.set(user_id, data)
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def set(self, user_id: str, data: dict):
+        self.local.set(user_id, data)
+        if self.shared is not None:
+            self.shared.set(user_id, data)
+
+    def invalidate(self, user_id: str):
+        self.local.delete(user_id)
+        if self.shared is not None:
+            self.shared.delete(user_id)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+        }
+
+
+principal_cache = PrincipalCache(TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL))
+# Other processes drop their local copy when a user row changes here; the
+# local tier only, so a reconnect's clear keeps the hit counters.
+cache_invalidation.register("principals", principal_cache.local)
+metrics.register_callback(
+    "counter", "principal_cache_hits_total", "Authenticated requests served from the principal cache",
+    lambda: principal_cache.hits,
+)
+metrics.register_callback(
+    "counter", "principal_cache_misses_total", "Authenticated requests that loaded the user row",
+    lambda: principal_cache.misses,
+)
+
+
+def _snapshot(user: User) -> dict:
+    return {key: getattr(user, key) for key in PRINCIPAL_COLUMNS}
+
+
+async def _restore(db: AsyncSession, data: dict) -> User:
+    # Attach the snapshot to this request's session without a SELECT, so it
+    # can be refreshed and updated like a queried instance. The secret
+    # columns and relationships are not loaded, and an AsyncSession cannot
+    # lazy-load them (MissingGreenlet): routes that need them load them
+    # explicitly, e.g. await db.refresh(user, ["pin"]).
+    user = User(**{key: data[key] for key in PRINCIPAL_COLUMNS if key in data})
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    user_id = str(target.id)
+    principal_cache.invalidate(user_id)
+    # Invalidate again on commit so a concurrent request can't re-cache the
+    # pre-commit row in between.
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("invalidated_users", set()).add(user_id)
+        cache_invalidation.invalidate_everywhere_on_commit(session, "principals", user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop("invalidated_users", ()):
+        principal_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidated_users(session):
+    session.info.pop("invalidated_users", None)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
     credentials_error = HTTPException(
         status_code=401,
         detail="Invalid or expired token",
@@ -20,16 +144,30 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     if token.startswith("Bearer "):
         token = token[7:] 
 
+    payload = verify_access_token(token)
+    if payload is None:
+        raise credentials_error
+    user_id: str = payload.get("user_id")
+    if user_id is None:
+        raise credentials_error
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("user_id")
-        if user_id is None:
-            raise credentials_error
-    except JWTError:
+        user_uuid = UUID(user_id)
+    except ValueError:
         raise credentials_error
 
-    user = db.query(User).filter(User.id == user_id).first()
+    # Read-your-writes: RoutingSession keys replica stickiness on it.
+    db.info["user_id"] = user_id
+
+    if PRINCIPAL_CACHE_TTL > 0:
+        data = principal_cache.get(user_id)
+        if data is not None:
+            return await _restore(db, data)
+
+    user = await db.scalar(select(User).where(User.id == user_uuid))
     if user is None:
         raise credentials_error
 
+    if PRINCIPAL_CACHE_TTL > 0:
+        principal_cache.set(user_id, _snapshot(user))
+
     return user
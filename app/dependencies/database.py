@@ -0,0 +1,10 @@
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db
+
+
+async def read_only(db: AsyncSession = Depends(get_db)):
+    # Route-level dependency for handlers that never write. Runs before the
+    # endpoint's own dependencies, so even get_current_user's lookup can be
+    # served by the replica (see app.core.database.RoutingSession).
+    db.info["read_only"] = True
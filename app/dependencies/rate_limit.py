@@ -0,0 +1,98 @@
+import math
+import os
+from typing import Callable, Optional
+from fastapi import HTTPException, Request
+from app.core import metrics
+from app.core.jwt import verify_access_token
+from app.core.rate_limit import RATE_LIMIT_ENABLED, RateLimitBackend, parse_rate, rate_limit_backend
+
+# Behind N reverse proxies the client address is the Nth entry from the right
+# of X-Forwarded-For; 0 uses the socket peer.
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "0"))
+
+rate_limited = metrics.counter("rate_limited_total", "Requests rejected by a rate limit", ("limit",))
+
+
+async def client_ip(request: Request) -> Optional[str]:
+    if RATE_LIMIT_PROXY_HOPS > 0:
+        forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(forwarded) >= RATE_LIMIT_PROXY_HOPS:
+            return forwarded[-RATE_LIMIT_PROXY_HOPS]
+    return request.client.host if request.client else None
+
+
+async def request_email(request: Request) -> Optional[str]:
+    # From the query string or the JSON body. FastAPI has already read and
+    # parsed the body by the time dependencies run, so this reuses it.
+    email = request.query_params.get("email")
+    if email is None and request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = await request.json()
+        except ValueError:
+            return None
+        email = body.get("email") if isinstance(body, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+async def token_user(request: Request) -> Optional[str]:
+    # Decodes the bearer token without touching the database; invalid tokens
+    # are left for get_current_user to reject.
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+    payload = verify_access_token(authorization.removeprefix("Bearer "))
+    return payload.get("user_id") if payload else None
+
+
+class RateLimit:
+    # `rate` is "hits/seconds"; `key` is an async function returning what to
+    # count by for a request, or None to skip this limit for it.
+    def __init__(self, name: str, rate: str, key: Callable):
+        self.name = name
+        self.limit, self.period = parse_rate(rate)
+        self.key = key
+
+
+def rate_limit(*limits: RateLimit, backend: Optional[RateLimitBackend] = None):
+    # Route-level dependency: `dependencies=[Depends(rate_limit(...))]` runs
+    # ahead of the endpoint's own dependencies, so a throttled request never
+    # opens a session or reaches bcrypt. Limits are checked in order and the
+    # first one exceeded answers 429.
+    backend = backend or rate_limit_backend
+
+    async def check(request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        for limit in limits:
+            value = await limit.key(request)
+            if value is None:
+                continue
+            retry_after = await backend.hit(f"{limit.name}:{value}", limit.limit, limit.period)
+            if retry_after > 0:
+                rate_limited.labels(limit.name).inc()
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests, please retry later",
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+
+    return check
+
+
+# Sending a code costs an SMTP session and mail quota; guessing one is a
+# 6-digit brute force; logins and PIN checks each cost a bcrypt verify.
+otp_send_limit = rate_limit(
+    RateLimit("otp_send_ip", os.getenv("RATE_LIMIT_OTP_SEND_IP", "20/600"), client_ip),
+    RateLimit("otp_send_email", os.getenv("RATE_LIMIT_OTP_SEND_EMAIL", "3/600"), request_email),
+)
+otp_verify_limit = rate_limit(
+    RateLimit("otp_verify_ip", os.getenv("RATE_LIMIT_OTP_VERIFY_IP", "60/600"), client_ip),
+    RateLimit("otp_verify_email", os.getenv("RATE_LIMIT_OTP_VERIFY_EMAIL", "10/600"), request_email),
+)
+login_limit = rate_limit(
+    RateLimit("login_ip", os.getenv("RATE_LIMIT_LOGIN_IP", "30/60"), client_ip),
+    RateLimit("login_email", os.getenv("RATE_LIMIT_LOGIN_EMAIL", "10/300"), request_email),
+)
+pin_limit = rate_limit(
+    RateLimit("pin_user", os.getenv("RATE_LIMIT_PIN_USER", "5/300"), token_user),
+)
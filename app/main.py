@@ -1,11 +1,100 @@
-from fastapi import FastAPI
-from app.routes import auth, goals, payments
-from app.core.database import engine, Base 
+import asyncio
+import importlib
+import logging
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, ORJSONResponse
+from app.routes import auth, dashboard, goals, metrics as metrics_routes, payments
+from app.core import cache_invalidation, idempotency, metrics, profiling, rate_limit
+from app.core.database import run_replica_monitor, warm_pool
+from app.core.security import HashingBusyError, hashing_service
+from app.utils import otp, paystack
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Imported on first use rather than at startup; the warm-up loads them in a
+# thread so the first request that needs one does not pay for it.
+LAZY_MODULES = ("httpx", "jose.jwt", "numpy", "smtplib")
+
+
+def _preload_modules():
+    for name in LAZY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            logger.exception("Could not preload %s", name)
+
+
+async def _warm_up():
+    await asyncio.gather(warm_pool(), asyncio.to_thread(_preload_modules))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The workers pull in SMTP and the Paystack client; loading them here
+    # keeps `import app.main` cheap for tooling that never starts the app.
+    from app.workers import deposits as deposit_worker
+    from app.workers import email as email_worker
+    from app.workers import events as event_relay
+    from app.workers import ledger as ledger_worker
+    from app.workers import maturity as maturity_worker
+    from app.workers import partitions as partition_worker
+    from app.workers import reconcile as reconcile_worker
+
+    # Startup does no I/O of its own; the pool fills in the background.
+    warm_up = asyncio.create_task(_warm_up())
+    workers = [
+        asyncio.create_task(deposit_worker.run_consumer()),
+        asyncio.create_task(email_worker.run_sender()),
+        asyncio.create_task(event_relay.run_relay()),
+        asyncio.create_task(ledger_worker.run_folder()),
+        asyncio.create_task(maturity_worker.run_scheduler()),
+        asyncio.create_task(partition_worker.run_partition_manager()),
+        asyncio.create_task(reconcile_worker.run_reconciler()),
+        asyncio.create_task(idempotency.run_purger()),
+        asyncio.create_task(rate_limit.run_purger()),
+        asyncio.create_task(otp.run_purger()),
+        asyncio.create_task(run_replica_monitor()),
+        asyncio.create_task(cache_invalidation.run_listener()),
+    ]
+    yield
+    for task in [warm_up, *workers]:
+        task.cancel()
+    for task in [warm_up, *workers]:
+        with suppress(asyncio.CancelledError):
+            await task
+    await paystack.close_client()
+    hashing_service.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Retries of these carrying an Idempotency-Key header replay the first response.
+app.add_middleware(
+    idempotency.IdempotencyMiddleware,
+    routes=[
+        ("POST", "/payments/init-deposit"),
+        ("POST", "/goals/create"),
+        ("POST", "/goals/create-myGoal"),
+    ],
+)
+# Pass-through unless SQL_PROFILE=true.
+app.add_middleware(profiling.SQLProfilingMiddleware)
+# Added last so it wraps everything, replays and rejections included.
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.exception_handler(HashingBusyError)
+async def hashing_busy_handler(request: Request, exc: HashingBusyError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
 
-Base.metadata.create_all(bind=engine)
 
 app.include_router(auth.router)
 app.include_router(goals.router)
-app.include_router(payments.router) 
\ No newline at end of file
+app.include_router(payments.router)
+app.include_router(dashboard.router)
+app.include_router(metrics_routes.router)
@@ -0,0 +1,24 @@
+from sqlalchemy import BigInteger, Column, DateTime, Identity, Index, String
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from app.core.database import Base, utcnow
+
+
+class OutboxEvent(Base):
+    # Domain events, written in the same transaction as the change they
+    # describe. app.workers.events numbers them in commit order
+    # (stream_offset) and relays them; consumers track offsets.
+    __tablename__ = "event_outbox"
+
+    id = Column(BigInteger, Identity(), primary_key=True)
+    event_type = Column(String, nullable=False)
+    aggregate_type = Column(String, nullable=False)
+    aggregate_id = Column(UUID(as_uuid=True), nullable=False)
+    user_id = Column(UUID(as_uuid=True), nullable=True)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    stream_offset = Column(BigInteger, nullable=True)
+
+    __table_args__ = (
+        Index("ix_event_outbox_offset", "stream_offset", unique=True),
+        Index("ix_event_outbox_unstamped", "id", postgresql_where=stream_offset.is_(None)),
+    )
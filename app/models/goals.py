@@ -1,10 +1,10 @@
 from uuid import uuid4
-from sqlalchemy import Column, Integer, String, Date, Float, ForeignKey, Boolean, DateTime
-from sqlalchemy.orm import relationship
-from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, Date, Float, ForeignKey, Boolean, DateTime, Index
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy.dialects.postgresql import UUID
 from uuid import uuid4
-from app.core.database import Base
+from app.core.database import Base, utcnow
+from app.models.ledger import ledger_balance
 
 
 class SafeLockAccount(Base):
@@ -14,14 +14,24 @@ class SafeLockAccount(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     goal_name = Column(String, nullable=False)
     target_amount = Column(Float, nullable=False)
-    current_amount = Column(Float, nullable=False, default=0.0)
     target_date = Column(Date, nullable=False)
     has_emergency_fund = Column(Boolean, default=False)
     emergency_fund_percentage = Column(Integer, nullable=True)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
+    # Set by app.workers.maturity once target_date arrives; the lock is off.
+    matured_at = Column(DateTime, nullable=True)
+
+    # Balances are derived from the ledger (app.models.ledger), never stored here.
+    current_amount = column_property(ledger_balance("safelock", id))
 
     user = relationship("User", back_populates="safelocks")
 
+    __table_args__ = (
+        Index("ix_safelock_user_created", "user_id", "created_at"),
+        # Only goals still waiting to mature, so the sweep's scan stays small.
+        Index("ix_safelock_due", "target_date", postgresql_where=matured_at.is_(None)),
+    )
+
 
 
 class MyGoalAccount(Base):
@@ -31,20 +41,28 @@ class MyGoalAccount(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     goal_name = Column(String, nullable=False)
     target_amount = Column(Float, nullable=False)
-    current_amount = Column(Float, nullable=False, default=0.0)
     target_date = Column(Date, nullable=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
+    matured_at = Column(DateTime, nullable=True)
+
+    current_amount = column_property(ledger_balance("mygoal", id))
 
     user = relationship("User", back_populates="mygoals")
 
+    __table_args__ = (
+        Index("ix_mygoal_user_created", "user_id", "created_at"),
+        Index("ix_mygoal_due", "target_date", postgresql_where=matured_at.is_(None)),
+    )
+
 
 class EmergencyFund(Base):
     __tablename__ = "emergency_funds"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), unique=True)
-    balance = Column(Float, default=0.0)
-    percentage = Column(Float, default=0.0) 
+    percentage = Column(Float, default=0.0)
+
+    balance = column_property(ledger_balance("emergency", user_id))
 
     user = relationship("User", back_populates="emergency_fund")
 
@@ -53,7 +71,8 @@ class FlexiAccount(Base):
     __tablename__ = "flexi_accounts"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
-    balance = Column(Float, default=0.0)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), unique=True)
+
+    balance = column_property(ledger_balance("flexi", user_id))
 
     user = relationship("User", back_populates="flexi_account")
\ No newline at end of file
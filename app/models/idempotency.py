@@ -0,0 +1,21 @@
+from sqlalchemy import Column, DateTime, Index, Integer, LargeBinary, String
+from sqlalchemy.dialects.postgresql import JSONB
+from app.core.database import Base, utcnow
+
+
+class IdempotencyKey(Base):
+    # Stored responses for the Postgres idempotency backend (app.core.idempotency).
+    # status_code stays NULL while the first request is still running.
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=True)
+    headers = Column(JSONB, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires", "expires_at"),
+    )
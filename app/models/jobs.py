@@ -0,0 +1,13 @@
+from sqlalchemy import BigInteger, Column, DateTime, String
+from sqlalchemy.dialects.postgresql import JSONB
+from app.core.database import Base, utcnow
+
+
+class JobCheckpoint(Base):
+    # Resume position for long-running background jobs, one row per job.
+    __tablename__ = "job_checkpoints"
+
+    name = Column(String, primary_key=True)
+    position = Column(BigInteger, nullable=False, default=0)
+    state = Column(JSONB, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
@@ -0,0 +1,70 @@
+from uuid import UUID as PyUUID
+from sqlalchemy import BigInteger, Column, DateTime, Identity, Index, Numeric, String, func, select, text
+from sqlalchemy.dialects.postgresql import UUID
+from app.core.database import Base, utcnow
+
+# Counter-account for money arriving from Paystack, and for balances carried
+# over when the ledger was introduced.
+PAYSTACK_CLEARING_ID = PyUUID(int=0)
+OPENING_BALANCE_ID = PyUUID(int=1)
+
+
+class LedgerEntry(Base):
+    # Append-only; the legs of one transaction_id always sum to zero.
+    __tablename__ = "ledger_entries"
+
+    id = Column(BigInteger, Identity(), primary_key=True)
+    transaction_id = Column(UUID(as_uuid=True), nullable=False)
+    account_type = Column(String, nullable=False)
+    account_id = Column(UUID(as_uuid=True), nullable=False)
+    user_id = Column(UUID(as_uuid=True), nullable=True)
+    amount_minor = Column(Numeric(20, 0), nullable=False)
+    deposit_id = Column(UUID(as_uuid=True), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow)
+    # Id of the database transaction that wrote the entry. Ids and created_at
+    # are set at insert, not commit, so app.workers.ledger folds by txid: once
+    # every transaction below a txid has finished, no entry below it can
+    # still appear.
+    txid = Column(BigInteger, nullable=False, server_default=text("pg_current_xact_id()::text::bigint"))
+
+    __table_args__ = (
+        Index("ix_ledger_account_txid", "account_type", "account_id", "txid"),
+        Index("ix_ledger_txid", "txid"),
+        Index("ix_ledger_transaction", "transaction_id"),
+    )
+
+
+class AccountBalance(Base):
+    # Running total of one account's ledger_entries with txid below folded_txid.
+    __tablename__ = "account_balances"
+
+    account_type = Column(String, primary_key=True)
+    account_id = Column(UUID(as_uuid=True), primary_key=True)
+    balance_minor = Column(Numeric(20, 0), nullable=False, default=0)
+    folded_txid = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+
+
+def ledger_balance(account_type: str, account_id):
+    # Snapshot plus the entries not folded into it yet: three index lookups,
+    # independent of how long the account's history is. Used as a
+    # column_property so balances read like ordinary columns.
+    snapshot = (AccountBalance.account_type == account_type) & (AccountBalance.account_id == account_id)
+    folded_txid = func.coalesce(
+        select(AccountBalance.folded_txid).where(snapshot).correlate_except(AccountBalance).scalar_subquery(), 0
+    )
+    snapshot_minor = func.coalesce(
+        select(AccountBalance.balance_minor).where(snapshot).correlate_except(AccountBalance).scalar_subquery(), 0
+    )
+    pending_minor = func.coalesce(
+        select(func.sum(LedgerEntry.amount_minor))
+        .where(
+            LedgerEntry.account_type == account_type,
+            LedgerEntry.account_id == account_id,
+            LedgerEntry.txid >= folded_txid,
+        )
+        .correlate_except(LedgerEntry)
+        .scalar_subquery(),
+        0,
+    )
+    return ((snapshot_minor + pending_minor) / 100).cast(Numeric(20, 2))
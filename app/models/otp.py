@@ -0,0 +1,18 @@
+from sqlalchemy import Column, DateTime, Index, Integer, String
+from app.core.database import Base
+
+
+class OneTimeCode(Base):
+    # Outstanding codes for the Postgres OTP backend (app.utils.otp). One row
+    # per purpose and subject, e.g. "email_verification:ada@example.com";
+    # the code itself is only stored as an HMAC.
+    __tablename__ = "otp_codes"
+
+    key = Column(String, primary_key=True)
+    code_hash = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_otp_codes_expires", "expires_at"),
+    )
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Float, Index, String
+from app.core.database import Base
+
+
+class RateLimitBucket(Base):
+    # GCRA state for the Postgres rate limit backend (app.core.rate_limit).
+    # Times are epoch seconds. Unlogged: losing the buckets in a crash only
+    # resets the limits, and it keeps the hot upsert out of the WAL.
+    __tablename__ = "rate_limits"
+
+    key = Column(String, primary_key=True)
+    # Theoretical arrival time: the key is unthrottled again once it passes.
+    tat = Column(Float, nullable=False)
+    # When the last allowed hit was recorded.
+    allowed_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_rate_limits_tat", "tat"),
+        {"prefixes": ["UNLOGGED"]},
+    )
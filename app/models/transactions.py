@@ -1,20 +1,82 @@
-from sqlalchemy import Column, Float, String, ForeignKey, Boolean, DateTime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Integer, Numeric, String, ForeignKey, Boolean, DateTime, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from uuid import uuid4
-from datetime import datetime, timezone
-from app.core.database import Base
+from app.core.database import Base, utcnow
 
 class DepositTransaction(Base):
+    # Range-partitioned by month of created_at; app.workers.partitions creates
+    # partitions ahead of time and archives old ones. Keys and unique indexes
+    # have to include created_at, so reference is unique per partition (see
+    # create_partition), which new_reference() makes global by putting the
+    # creation date in the reference.
     __tablename__ = "deposit_transactions"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     goal_id = Column(UUID(as_uuid=True), nullable=True)
-    amount = Column(Float, nullable=False)
-    reference = Column(String, unique=True, nullable=False)
+    amount = Column(Numeric(14, 2), nullable=False)
+    reference = Column(String, nullable=False)
     account_type = Column(String, nullable=False)  
     is_successful = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, primary_key=True, default=utcnow)
 
     user = relationship("User", back_populates="deposits")
+
+    __table_args__ = (
+        # The *_history indexes give app.utils.history its (created_at, id)
+        # order under each filter without a sort.
+        Index("ix_deposit_user_history", "user_id", "created_at", "id"),
+        Index(
+            "ix_deposit_user_settled_history",
+            "user_id",
+            "created_at",
+            "id",
+            postgresql_where=is_successful.is_(True),
+        ),
+        Index(
+            "ix_deposit_user_pending_history",
+            "user_id",
+            "created_at",
+            "id",
+            postgresql_where=is_successful.is_not(True),
+        ),
+        Index("ix_deposit_user_type_history", "user_id", "account_type", "created_at", "id"),
+        Index(
+            "ix_deposit_goal_history",
+            "goal_id",
+            "created_at",
+            "id",
+            postgresql_where=goal_id.is_not(None),
+        ),
+        Index(
+            "ix_deposit_pending_created",
+            "created_at",
+            postgresql_where=is_successful.is_not(True),
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+class PaystackEvent(Base):
+    # Inbox of verified Paystack webhook deliveries, drained by app.workers.deposits.
+    __tablename__ = "paystack_events"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    event = Column(String, nullable=False)
+    reference = Column(String, nullable=True)
+    payload = Column(JSONB, nullable=False)
+    received_at = Column(DateTime, default=utcnow)
+    processed_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        # Paystack retries deliveries; keep one row per event/reference.
+        UniqueConstraint("event", "reference", name="uq_paystack_events_event_reference"),
+        Index(
+            "ix_paystack_events_pending",
+            "received_at",
+            postgresql_where=processed_at.is_(None),
+        ),
+    )
@@ -2,9 +2,8 @@ from sqlalchemy import Column, String, Boolean, DateTime, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from uuid import uuid4
-from datetime import datetime, timezone
 from sqlalchemy import Date
-from app.core.database import Base
+from app.core.database import Base, utcnow
 from app.models.goals import SafeLockAccount, MyGoalAccount
 import enum 
 
@@ -26,10 +25,8 @@ class User(Base):
        email = Column(String, unique=True, nullable=False)
        hashed_password = Column(String, nullable=False)
        is_phone_verified = Column(Boolean, default=False)
-       email_verification_code = Column(String, nullable=True)
-       email_code_expiry = Column(DateTime, nullable=True)
        is_verified = Column(Boolean, default=False)
-       created_at = Column(DateTime, default=datetime.now(timezone.utc)) 
+       created_at = Column(DateTime, default=utcnow) 
        pin = Column(String, nullable=True)
 
 
@@ -1,44 +1,37 @@
-from datetime import datetime, timedelta
-import random
-import smtplib
-from email.message import EmailMessage
 from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from app.core.database import SessionLocal, get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db
 from app.core.jwt import create_access_token
 from app.dependencies.auth import get_current_user
+from app.dependencies.database import read_only
+from app.dependencies.rate_limit import login_limit, otp_send_limit, otp_verify_limit, pin_limit
 from app.schemas.user import EmailVerificationInput, LoginRequest, ResendCodeInput, SetPinInput, UserCreate, UserOut
 from app.models.user import User
-from app.core.security import hash_password, hash_pin, verify_password, verify_pin
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-email_host = os.getenv("EMAIL_HOST")            
-email_port = int(os.getenv("EMAIL_PORT"))       
-email_user = os.getenv("EMAIL_HOST_USER")            
-email_pass = os.getenv("EMAIL_HOST_PASSWORD") 
+from app.core.security import hash_password_async, hash_pin_async, verify_password_async, verify_pin_async
+from app.utils import otp
+from app.utils.email import send_email_verification_code
+from app.workers import email as email_worker
 
 router = APIRouter(tags=["Authentication"])
 
-# def get_db():
-#     db = SessionLocal()
-#     try:
-#         yield db
-#     finally:
-#         db.close()
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
-db_dependency = Annotated[Session, Depends(get_db)]
+VERIFICATION_ERRORS = {
+    otp.OTPResult.missing: "No verification code sent to this email",
+    otp.OTPResult.expired: "Verification code has expired",
+    otp.OTPResult.invalid: "Invalid verification code",
+    otp.OTPResult.locked: "Too many incorrect attempts, request a new code",
+}
 
 @router.post("/register")
-def register(user_data: UserCreate, db: db_dependency):
-    if db.query(User).filter(User.email == user_data.email).first():
+async def register(user_data: UserCreate, db: db_dependency):
+    if await db.scalar(select(User).where(User.email == user_data.email)):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    if db.query(User).filter(User.phone_number == user_data.phone_number).first():
+    if await db.scalar(select(User).where(User.phone_number == user_data.phone_number)):
         raise HTTPException(status_code=400, detail="Phone number already registered")
 
     new_user = User(
@@ -48,12 +41,12 @@ def register(user_data: UserCreate, db: db_dependency):
         date_of_birth=user_data.date_of_birth,
         phone_number=user_data.phone_number,
         email=user_data.email,
-        hashed_password=hash_password(user_data.password)
+        hashed_password=await hash_password_async(user_data.password)
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return {
         "message": "User registered successfully. Proceed to email verification.",
@@ -64,45 +57,19 @@ def register(user_data: UserCreate, db: db_dependency):
 
 
 
-@router.post("/send-verification-code")
-def send_verification_code(email: str, db: db_dependency):
-    user = db.query(User).filter(User.email == email).first()
+@router.post("/send-verification-code", dependencies=[Depends(otp_send_limit)])
+async def send_verification_code(email: str, db: db_dependency):
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     if user.is_verified:
         raise HTTPException(status_code=400, detail="User already verified")
 
-    code = ''.join(str(random.randint(0, 9)) for _ in range(6)) 
-    expiry = datetime.now() + timedelta(minutes=10)  
-
-    user.email_verification_code = code
-    user.email_code_expiry = expiry
-    db.commit()
-
-    msg = EmailMessage()
-    msg["Subject"] = "DreamBox Email Verification Code"
-    msg["From"] = "agyekumpaul07@gmail.com"
-    msg["To"] = user.email
-    msg.set_content(f"""
-    Hello {user.first_name},
-
-    Your DreamBox 6-digit verification code is: {code}
-    It will expire in 10 minutes.
-
-    Thanks,
-    DreamBox Team
-    """)
-
-    try:
-        with smtplib.SMTP(email_host, email_port) as smtp:  
-            smtp.starttls()
-            smtp.login(email_user, email_pass)
-            smtp.send_message(msg)
-            print(f"Verification email sent to {user.email} ✅")
-    except Exception as e:
-        print("Failed to send email ❌", str(e))
-        raise HTTPException(status_code=500, detail="Failed to send verification email")
+    code = await otp.issue_code(otp.EMAIL_VERIFICATION, user.email)
+    send_email_verification_code(db, user.email, code, user.first_name)
+    await db.commit()
+    email_worker.notify()
 
     return {
         "message": "Verification code sent successfully"
@@ -111,13 +78,13 @@ def send_verification_code(email: str, db: db_dependency):
 
 
 
-@router.post("/verify-email")
-def verify_email(
+@router.post("/verify-email", dependencies=[Depends(otp_verify_limit)])
+async def verify_email(
     data: EmailVerificationInput,
     db: db_dependency,
 ):
     
-    user = db.query(User).filter(User.email == data.email).first()
+    user = await db.scalar(select(User).where(User.email == data.email))
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -125,26 +92,19 @@ def verify_email(
     if user.is_verified:
         return {"message": "Your email is already verified ✅"}
 
-    if not user.email_verification_code:
-        raise HTTPException(status_code=400, detail="No verification code sent to this email")
-
-    if datetime.now() > user.email_code_expiry:
-        raise HTTPException(status_code=400, detail="Verification code has expired")
-
-    if data.code != user.email_verification_code:
-        raise HTTPException(status_code=400, detail="Invalid verification code")
+    result = await otp.verify_code(otp.EMAIL_VERIFICATION, user.email, data.code)
+    if result is not otp.OTPResult.valid:
+        raise HTTPException(status_code=400, detail=VERIFICATION_ERRORS[result])
 
     user.is_verified = True
-    user.email_verification_code = None
-    user.email_code_expiry = None
-    db.commit()
+    await db.commit()
 
     return {"message": "Email verified successfully ✅."}
 
 
-@router.post("/resend-code")
-def resend_verification_code(data: ResendCodeInput, db: db_dependency):
-    user = db.query(User).filter(User.email == data.email).first()
+@router.post("/resend-code", dependencies=[Depends(otp_send_limit)])
+async def resend_verification_code(data: ResendCodeInput, db: db_dependency):
+    user = await db.scalar(select(User).where(User.email == data.email))
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -152,44 +112,20 @@ def resend_verification_code(data: ResendCodeInput, db: db_dependency):
     if user.is_verified:
         raise HTTPException(status_code=400, detail="User is already verified")
 
-    code = ''.join(str(random.randint(0, 9)) for _ in range(6))
-    expiry = datetime.now() + timedelta(minutes=10)
-
-    user.email_verification_code = code
-    user.email_code_expiry = expiry
-    db.commit()
-
-    msg = EmailMessage()
-    msg["Subject"] = "DreamBox Email Verification Code"
-    msg["From"] = os.getenv("EMAIL_USER")
-    msg["To"] = user.email
-    msg.set_content(
-        f"Hello {user.first_name},\n\n"
-        f"Your verification code is: {code}\n"
-        f"This code expires in 10 minutes.\n\n"
-        f"Thanks,\nDreamBox Team"
-    )
-
-    try:
-        with smtplib.SMTP(os.getenv("EMAIL_HOST"), email_port) as smtp:
-            smtp.starttls()
-            smtp.login(os.getenv("EMAIL_HOST_USER"), os.getenv("EMAIL_HOST_PASSWORD"))
-            smtp.send_message(msg)
-    except Exception as e:
-        print("❌ Failed to resend email:", e)
-        raise HTTPException(status_code=500, detail="Could not send email")
+    code = await otp.issue_code(otp.EMAIL_VERIFICATION, user.email)
+    send_email_verification_code(db, user.email, code, user.first_name)
+    await db.commit()
+    email_worker.notify()
 
     return {"message": "Verification code resent successfully ✅"}
 
 
 
-@router.post("/login")
-def login(user_data: LoginRequest, db: db_dependency):
-    user = db.query(User).filter(
-        (User.email == user_data.email)
-        ).first()
+@router.post("/login", dependencies=[Depends(login_limit)])
+async def login(user_data: LoginRequest, db: db_dependency):
+    user = await db.scalar(select(User).where(User.email == user_data.email))
 
-    if not user or not verify_password(user_data.password, user.hashed_password):
+    if not user or not await verify_password_async(user_data.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     token = create_access_token({"user_id": str(user.id)})
@@ -201,8 +137,8 @@ def login(user_data: LoginRequest, db: db_dependency):
 }
 
 @router.post("/set-pin")
-def set_user_pin(data: SetPinInput, db: db_dependency):
-    user = db.query(User).filter(User.email == data.email).first()
+async def set_user_pin(data: SetPinInput, db: db_dependency):
+    user = await db.scalar(select(User).where(User.email == data.email))
     
     if not user:
         user = User(email=data.email)
@@ -210,25 +146,25 @@ def set_user_pin(data: SetPinInput, db: db_dependency):
     if user.pin:
         raise HTTPException(status_code=400, detail="PIN already set")
 
-    user.pin = hash_password(data.pin)
-    db.commit()
+    user.pin = await hash_pin_async(data.pin)
+    await db.commit()
 
     return {"message": "PIN set successfully"}
 
 
-@router.post("/verify-pin")
-def verify_user_pin(data: SetPinInput, db: db_dependency, current_user: User = Depends(get_current_user)):
+@router.post("/verify-pin", dependencies=[Depends(pin_limit)])
+async def verify_user_pin(data: SetPinInput, db: db_dependency, current_user: User = Depends(get_current_user)):
     if not current_user.transaction_pin:
         raise HTTPException(status_code=400, detail="No PIN set.")
 
-    if not verify_pin(data.pin, current_user.transaction_pin):
+    if not await verify_pin_async(data.pin, current_user.transaction_pin):
         raise HTTPException(status_code=401, detail="Incorrect PIN")
 
     return {"message": "PIN verified successfully."}
 
 
 @router.post("/logout")
-def logout(current_user: dict = Depends(get_current_user)):
+async def logout(current_user: dict = Depends(get_current_user)):
     return JSONResponse(
         content={"message": "Logged out successfully."},
         status_code=status.HTTP_200_OK
@@ -236,8 +172,8 @@ def logout(current_user: dict = Depends(get_current_user)):
 
 
 
-@router.get("/me", response_model=UserOut)
-def get_me(current_user: User = Depends(get_current_user)):
+@router.get("/me", response_model=UserOut, dependencies=[Depends(read_only)])
+async def get_me(current_user: User = Depends(get_current_user)):
     return {
         "id": str(current_user.id),
         "first_name": current_user.first_name,
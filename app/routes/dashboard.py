@@ -0,0 +1,38 @@
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, Header, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db
+from app.dependencies.auth import get_current_user
+from app.dependencies.database import read_only
+from app.models.user import User
+from app.schemas.dashboard import DashboardOut
+from app.utils.dashboard import build_dashboard, dashboard_cache, render_dashboard
+
+router = APIRouter(tags=["Dashboard"])
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+@router.get("/dashboard", response_model=DashboardOut, dependencies=[Depends(read_only)])
+async def get_dashboard(
+    db: db_dependency,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+):
+    cached = dashboard_cache.get(str(current_user.id))
+    if cached is None:
+        cached = render_dashboard(await build_dashboard(db, current_user))
+        dashboard_cache.set(str(current_user.id), cached)
+
+    etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
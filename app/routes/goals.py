@@ -1,36 +1,113 @@
-from datetime import datetime, timezone
-from typing import Annotated, List
-from uuid import uuid4
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from typing import Annotated, List, Optional
+from uuid import UUID, uuid4
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db, utcnow
+from app.core.serialization import orm_response
 from app.dependencies.auth import get_current_user
+from app.dependencies.database import read_only
 from app.models import user as user_model 
 from app.models.goals import EmergencyFund, FlexiAccount
 from app.schemas import goals
+from app.utils.events import record_event
+from app.utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.utils.projections import PROJECTION_MAX_SCENARIOS, user_projections
 
 
 router = APIRouter(prefix="/goals", tags=["Goals"])
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 
-@router.get("/", response_model=List[goals.SafeLockResponse])
-def get_user_safelocks(
+async def _list_goals(db: AsyncSession, model, schema, user_id, limit: Optional[int], cursor: Optional[str], fields: Optional[str]):
+    # Keyset pagination on (created_at, id), newest first. With `fields`, only
+    # the requested columns are selected instead of whole ORM entities.
+    names = None
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in schema.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        keys = [key for key in ("created_at", "id") if key not in names]
+        query = select(*(getattr(model, name) for name in names + keys))
+    else:
+        query = select(model)
+
+    query = query.where(model.user_id == user_id).order_by(model.created_at.desc(), model.id.desc())
+
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) < (created_at, last_id))
+
+    if limit:
+        query = query.limit(limit + 1)
+
+    result = await db.execute(query)
+    rows = result.all() if names is not None else result.scalars().all()
+
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return rows, next_cursor, names
+
+
+def _goal_page(schema, rows, next_cursor: Optional[str], names: Optional[list]):
+    # Rows come straight from the database, so they are encoded without
+    # another response_model validation pass; projections keep only `names`.
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return orm_response(schema, rows, fields=names, headers=headers)
+
+
+@router.get("/", response_model=List[goals.SafeLockResponse], dependencies=[Depends(read_only)])
+async def get_user_safelocks(
     db: db_dependency,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated SafeLockResponse fields"),
     current_user: user_model.User = Depends(get_current_user),
 ):
-    safelocks = (
-        db.query(user_model.SafeLockAccount)
-        .filter(user_model.SafeLockAccount.user_id == current_user.id)
-        .all()
+    safelocks, next_cursor, names = await _list_goals(
+        db, user_model.SafeLockAccount, goals.SafeLockResponse, current_user.id, limit, cursor, fields
     )
-    return safelocks
+    return _goal_page(goals.SafeLockResponse, safelocks, next_cursor, names)
+
+
+
+WhatIf = Annotated[
+    List[float],
+    Query(max_length=PROJECTION_MAX_SCENARIOS, description="Extra monthly amounts to project each goal with"),
+]
+
+
+@router.get("/projections", response_model=List[goals.GoalProjection], dependencies=[Depends(read_only)])
+async def get_goal_projections(
+    db: db_dependency,
+    what_if: WhatIf = [],
+    current_user: user_model.User = Depends(get_current_user),
+):
+    return await user_projections(db, current_user.id, what_if)
+
+
+@router.get("/{goal_id}/projection", response_model=goals.GoalProjection, dependencies=[Depends(read_only)])
+async def get_goal_projection(
+    goal_id: UUID,
+    db: db_dependency,
+    what_if: WhatIf = [],
+    current_user: user_model.User = Depends(get_current_user),
+):
+    # Projected together with the user's other goals; they share the cache.
+    for projection in await user_projections(db, current_user.id, what_if):
+        if projection["id"] == str(goal_id):
+            return projection
+    raise HTTPException(status_code=404, detail="Goal not found.")
 
 
 
 @router.post("/create", response_model=goals.SafeLockResponse)
-def create_safelock(
+async def create_safelock(
     safelock_data: goals.SafeLockCreate,
     db: db_dependency,
     current_user: user_model.User = Depends(get_current_user),
@@ -40,107 +117,109 @@ def create_safelock(
         user_id=current_user.id,
         goal_name=safelock_data.goal_name,
         target_amount=safelock_data.target_amount,
-        current_amount=0.0,
         target_date=safelock_data.target_date,
         has_emergency_fund=safelock_data.has_emergency_fund,
         emergency_fund_percentage=safelock_data.emergency_fund_percentage,
-        created_at=datetime.now(timezone.utc),
+        created_at=utcnow(),
     )
 
     db.add(new_safelock)
-    db.commit()
-    db.refresh(new_safelock)
+    record_event(db, "safelock.created", "safelock", new_safelock.id, current_user.id, safelock_data.model_dump())
+    await db.commit()
+    await db.refresh(new_safelock)
 
     if safelock_data.has_emergency_fund:
-        existing = db.query(EmergencyFund).filter_by(user_id=current_user.id).first()
+        existing = await db.scalar(select(EmergencyFund).where(EmergencyFund.user_id == current_user.id))
         if not existing:
             new_emergency_fund = EmergencyFund(
                 id=uuid4(),
                 user_id=current_user.id,
-                balance=0.0
             )
             db.add(new_emergency_fund)
-            db.commit()
+            record_event(db, "emergency_fund.created", "emergency_fund", new_emergency_fund.id, current_user.id)
+            await db.commit()
 
     return new_safelock
 
 
 
-@router.get("/my-Goals", response_model=List[goals.MyGoalOut])
-def get_user_myGoals(
+@router.get("/my-Goals", response_model=List[goals.MyGoalOut], dependencies=[Depends(read_only)])
+async def get_user_myGoals(
     db: db_dependency,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated MyGoalOut fields"),
     current_user: user_model.User = Depends(get_current_user),
 ):
-    myGoals = (
-        db.query(user_model.MyGoalAccount)
-        .filter(user_model.MyGoalAccount.user_id == current_user.id)
-        .all()
+    myGoals, next_cursor, names = await _list_goals(
+        db, user_model.MyGoalAccount, goals.MyGoalOut, current_user.id, limit, cursor, fields
     )
-    return myGoals
+    return _goal_page(goals.MyGoalOut, myGoals, next_cursor, names)
 
 
 
 
 @router.post("/create-myGoal", response_model=goals.MyGoalOut)
-def create_my_goal(
+async def create_my_goal(
     goal_data: goals.MyGoalCreate,
     db: db_dependency,
     current_user: user_model.User = Depends(get_current_user)
 ):
     new_goal = user_model.MyGoalAccount(
+        id=uuid4(),
         user_id=current_user.id,
         goal_name=goal_data.goal_name,
         target_amount=goal_data.target_amount,
         target_date=goal_data.target_date,
-        current_amount=0.0,
-        created_at=datetime.now(timezone.utc)
+        created_at=utcnow()
     )
     db.add(new_goal)
-    db.commit()
-    db.refresh(new_goal)
+    record_event(db, "mygoal.created", "mygoal", new_goal.id, current_user.id, goal_data.model_dump())
+    await db.commit()
+    await db.refresh(new_goal)
     return new_goal
 
 
-@router.get("/emergency", response_model=goals.EmergencyFundOut)
-def get_emergency_fund(
+@router.get("/emergency", response_model=goals.EmergencyFundOut, dependencies=[Depends(read_only)])
+async def get_emergency_fund(
     db: db_dependency,
     current_user: user_model.User = Depends(get_current_user)
 ):
-    fund = db.query(EmergencyFund).filter_by(user_id=current_user.id).first()
+    fund = await db.scalar(select(EmergencyFund).where(EmergencyFund.user_id == current_user.id))
     if not fund:
         raise HTTPException(status_code=404, detail="Emergency fund not found.")
-    return fund
+    return orm_response(goals.EmergencyFundOut, fund)
 
 
 
-@router.get("/flexi", response_model=goals.FlexiAccountOut)
-def get_flexi_account(
+@router.get("/flexi", response_model=goals.FlexiAccountOut, dependencies=[Depends(read_only)])
+async def get_flexi_account(
     db: db_dependency,
     current_user: user_model.User = Depends(get_current_user)
 ):
-    flexi = db.query(FlexiAccount).filter_by(user_id=current_user.id).first()
+    flexi = await db.scalar(select(FlexiAccount).where(FlexiAccount.user_id == current_user.id))
     if not flexi:
         raise HTTPException(status_code=404, detail="Flexi account not found.")
-    return flexi
+    return orm_response(goals.FlexiAccountOut, flexi)
 
 
 
 
 @router.post("/create-flexi", response_model=goals.FlexiAccountOut)
-def create_flexi_account(
+async def create_flexi_account(
     db: db_dependency,
     current_user: user_model.User = Depends(get_current_user)
 ):
-    existing = db.query(FlexiAccount).filter_by(user_id=current_user.id).first()
+    existing = await db.scalar(select(FlexiAccount).where(FlexiAccount.user_id == current_user.id))
     if existing:
         raise HTTPException(status_code=400, detail="Flexi account already exists.")
 
     new_account = FlexiAccount(
         id=uuid4(),
         user_id=current_user.id,
-        balance=0.0
     )
     db.add(new_account)
-    db.commit()
-    db.refresh(new_account)
+    record_event(db, "flexi_account.created", "flexi_account", new_account.id, current_user.id)
+    await db.commit()
+    await db.refresh(new_account)
     return new_account
\ No newline at end of file
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from app.core import metrics
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    # Prometheus text exposition; scrape from inside the network only.
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,28 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from uuid import uuid4
-import os, requests
-from app.core.database import get_db
+import json
+from datetime import datetime
+from decimal import Decimal
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+from uuid import UUID, uuid4
+from app.core.database import get_db, utcnow
+from app.core.serialization import orm_response
 from app.models import user as user_model
 from app.models.goals import SafeLockAccount
-from app.models.transactions import DepositTransaction
+from app.models.transactions import DepositTransaction, PaystackEvent
 from app.dependencies.auth import get_current_user
+from app.dependencies.database import read_only
 from app.models.goals import SafeLockAccount, MyGoalAccount, EmergencyFund, FlexiAccount
+from app.schemas.payments import DepositOut
+from app.utils import paystack
+from app.utils.deposits import by_reference, credit_deposit, new_reference, to_minor
+from app.utils.history import EXPORT_FORMATS, export_history, history_query
+from app.utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.workers import deposits as deposit_worker
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
+ACCOUNT_TYPES = ("flexi", "emergency", "safelock")
+
 
 @router.post("/init-deposit", status_code=201)
-def initialize_deposit(
+async def initialize_deposit(
     amount: float,
     account_type: str,
-    goal_id: str = None,
-    db: Session = Depends(get_db),
+    goal_id: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_db),
     current_user: user_model.User = Depends(get_current_user),
 ):
     account_type = account_type.lower()
-    valid_account_types = ["flexi", "emergency", "safelock"]
-    if account_type not in valid_account_types:
+    if account_type not in ACCOUNT_TYPES:
         raise HTTPException(
             status_code=400,
             detail="Invalid account type. Must be 'flexi', 'emergency', or 'safelock'."
@@ -33,60 +48,54 @@ def initialize_deposit(
         if not goal_id:
             raise HTTPException(status_code=400, detail="goal_id is required for this account type")
 
+        goal = await db.scalar(
+            select(SafeLockAccount).where(SafeLockAccount.id == goal_id, SafeLockAccount.user_id == current_user.id)
+        )
         if account_type == "safelock":
-            goal = db.query(SafeLockAccount).filter_by(id=goal_id, user_id=current_user.id).first()
             if not goal:
                 raise HTTPException(status_code=404, detail="SafeLock goal not found")
         elif account_type == "emergency":
-            goal = db.query(SafeLockAccount).filter_by(id=goal_id, user_id=current_user.id).first()
             if not goal or not goal.has_emergency_fund:
                 raise HTTPException(status_code=400, detail="This goal does not have emergency fund enabled.")
 
-    # ✅ PAYSTACK SETUP
-    paystack_secret_key = os.getenv("PAYSTACK_SECRET_KEY")
-    if not paystack_secret_key:
-        raise HTTPException(status_code=500, detail="Paystack secret key not configured")
-
-    headers = {
-        "Authorization": f"Bearer {paystack_secret_key}",
-        "Content-Type": "application/json"
-    }
-
     # Generate a unique reference for this transaction
-    reference = f"dep_{uuid4().hex[:12]}"
+    created_at = utcnow()
+    reference = new_reference(created_at)
     callback_url = "http://your-app.com/payment/callback"  # update to your real callback URL
 
     payload = {
         "email": current_user.email,
-        "amount": int(amount * 100),  # Convert to kobo
+        "amount": to_minor(amount),  # Convert to kobo
         "reference": reference,
         "callback_url": callback_url,
         "metadata": {
             "account_type": account_type,
-            "goal_id": goal_id,
+            "goal_id": str(goal_id) if goal_id else None,
             "user_id": str(current_user.id)
         }
     }
 
     # ✅ Send request to Paystack
-    response = requests.post("https://api.paystack.co/transaction/initialize", json=payload, headers=headers)
-
-    if response.status_code != 200:
-        raise HTTPException(status_code=500, detail="Failed to initialize payment with Paystack")
-
-    paystack_data = response.json().get("data")
+    try:
+        paystack_data = await paystack.initialize_transaction(payload)
+    except paystack.DuplicateReferenceError:
+        # No checkout URL to send the user to; a new attempt gets a new reference.
+        raise HTTPException(status_code=409, detail="Payment could not be started, please try again")
+    except paystack.PaystackError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
     # ✅ CREATE PENDING TRANSACTION RECORD
     deposit = DepositTransaction(
         user_id=current_user.id,
-        amount=amount,
+        amount=payload["amount"] / Decimal(100),
         account_type=account_type,
         goal_id=goal_id,
         reference=reference,
-        is_successful=False
+        is_successful=False,
+        created_at=created_at,
     )
     db.add(deposit)
-    db.commit()
+    await db.commit()
 
     # ✅ Ensure we return the correct data to frontend
     return {
@@ -95,13 +104,15 @@ def initialize_deposit(
     }
 
 @router.get("/verify-deposit")
-def verify_deposit(
+async def verify_deposit(
     reference: str = Query(..., description="Paystack transaction reference"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: user_model.User = Depends(get_current_user),
 ):
     # Step 1: Look up the transaction by reference
-    deposit = db.query(DepositTransaction).filter_by(reference=reference, user_id=current_user.id).first()
+    deposit = await db.scalar(
+        select(DepositTransaction).where(*by_reference(reference), DepositTransaction.user_id == current_user.id)
+    )
     
     if not deposit:
         raise HTTPException(status_code=404, detail="Transaction not found")
@@ -115,88 +126,118 @@ def verify_deposit(
         }
 
     # Step 2: Verify payment with Paystack
-    headers = {
-        "Authorization": f"Bearer {os.getenv('PAYSTACK_SECRET_KEY')}"
-    }
-    response = requests.get(f"https://api.paystack.co/transaction/verify/{reference}", headers=headers)
-
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail="Failed to verify transaction with Paystack")
-
-    data = response.json().get("data")
+    try:
+        data = await paystack.verify_transaction(reference)
+    except paystack.PaystackError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     if data["status"] != "success":
         raise HTTPException(status_code=400, detail="Transaction not successful yet")
 
     # Verify the amount matches (convert from kobo to naira/cedi)
-    expected_amount = int(deposit.amount * 100)
+    expected_amount = to_minor(deposit.amount)
     if data["amount"] != expected_amount:
         raise HTTPException(status_code=400, detail="Transaction amount mismatch")
 
-    # Step 3: Mark transaction as successful
-    deposit.is_successful = True
-
-    # Step 4: Update account balances based on account_type
+    # Step 3: Mark transaction as successful and update account balances.
+    # The conditional update inside credit_deposit makes concurrent verifies
+    # of the same reference credit exactly once.
     try:
-        if deposit.account_type == "safelock":
-            safelock = db.query(SafeLockAccount).filter_by(id=deposit.goal_id, user_id=current_user.id).first()
-            if not safelock:
-                raise HTTPException(status_code=404, detail="SafeLock goal not found")
-
-            # If emergency fund is enabled, split the amount
-            if safelock.has_emergency_fund and safelock.emergency_fund_percentage:
-                emergency_share = (safelock.emergency_fund_percentage / 100.0) * deposit.amount
-                safelock_share = deposit.amount - emergency_share
-
-                safelock.current_amount += safelock_share
-
-                # Update EmergencyFund balance
-                emergency = db.query(EmergencyFund).filter_by(user_id=current_user.id).first()
-                if not emergency:
-                    emergency = EmergencyFund(
-                        user_id=current_user.id, 
-                        balance=emergency_share, 
-                        percentage=safelock.emergency_fund_percentage
-                    )
-                    db.add(emergency)
-                else:
-                    emergency.balance += emergency_share
-            else:
-                # No emergency split
-                safelock.current_amount += deposit.amount
-
-        elif deposit.account_type == "emergency":
-            emergency = db.query(EmergencyFund).filter_by(user_id=current_user.id).first()
-            if not emergency:
-                # Create emergency fund if it doesn't exist
-                emergency = EmergencyFund(user_id=current_user.id, balance=deposit.amount)
-                db.add(emergency)
-            else:
-                emergency.balance += deposit.amount
-
-        elif deposit.account_type == "flexi":
-            flexi = db.query(FlexiAccount).filter_by(user_id=current_user.id).first()
-            if not flexi:
-                # Create flexi account if it doesn't exist
-                flexi = FlexiAccount(user_id=current_user.id, balance=deposit.amount)
-                db.add(flexi)
-            else:
-                flexi.balance += deposit.amount
-
-        else:
-            raise HTTPException(status_code=400, detail="Invalid account type")
-        
-        # Commit all changes
-        db.commit()
-
+        credited = await db.run_sync(credit_deposit, deposit)
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update account balance: {str(e)}")
 
+    if not credited:
+        return {
+            "message": "Transaction has already been verified and processed.",
+            "amount": deposit.amount,
+            "account_type": deposit.account_type,
+            "reference": deposit.reference
+        }
+
     return {
         "message": "Deposit verified and balance updated successfully",
         "amount": deposit.amount,
         "account_type": deposit.account_type,
         "reference": deposit.reference,
         "success": True
-    }
\ No newline at end of file
+    }
+
+
+@router.post("/webhook")
+async def paystack_webhook(
+    request: Request,
+    x_paystack_signature: str = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    body = await request.body()
+    if not paystack.is_valid_signature(body, x_paystack_signature):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid payload")
+
+    # Only persist here; crediting happens in the background consumer so
+    # Paystack gets its 200 quickly and redeliveries collapse onto one row.
+    stmt = insert(PaystackEvent).values(
+        id=uuid4(),
+        event=event.get("event", ""),
+        reference=(event.get("data") or {}).get("reference"),
+        payload=event,
+    ).on_conflict_do_nothing(constraint="uq_paystack_events_event_reference")
+    await db.execute(stmt)
+    await db.commit()
+
+    deposit_worker.notify()
+
+    return {"status": "received"}
+
+
+
+def history_filters(
+    account_type: Optional[Literal[ACCOUNT_TYPES]] = None,
+    is_successful: Optional[bool] = None,
+    goal_id: Optional[UUID] = None,
+    since: Optional[datetime] = Query(None, description="Deposits created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Deposits created before this time"),
+) -> dict:
+    return dict(account_type=account_type, is_successful=is_successful, goal_id=goal_id, since=since, until=until)
+
+
+@router.get("/history", response_model=List[DepositOut], dependencies=[Depends(read_only)])
+async def get_deposit_history(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    filters: dict = Depends(history_filters),
+    db: AsyncSession = Depends(get_db),
+    current_user: user_model.User = Depends(get_current_user),
+):
+    # Newest first; pass the X-Next-Cursor header back as `cursor` for the
+    # next page.
+    after = decode_cursor(cursor) if cursor else None
+    query = history_query(current_user.id, after=after, **filters).limit(limit + 1)
+    rows = (await db.execute(query)).all()
+
+    headers = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers = {NEXT_CURSOR_HEADER: encode_cursor(rows[-1].created_at, rows[-1].id)}
+    return orm_response(DepositOut, rows, headers=headers)
+
+
+@router.get("/history/export", dependencies=[Depends(read_only)])
+async def export_deposit_history(
+    format: Literal[tuple(EXPORT_FORMATS)] = "csv",
+    filters: dict = Depends(history_filters),
+    current_user: user_model.User = Depends(get_current_user),
+):
+    filename = f"deposits-{utcnow():%Y%m%d}.{format}"
+    return StreamingResponse(
+        export_history(current_user.id, history_query(current_user.id, **filters), format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,37 @@
+from datetime import date
+from uuid import UUID
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class PlanSummary(BaseModel):
+    count: int
+    balance: float
+    target: float
+    progress: Optional[float]
+
+
+class GoalProgress(BaseModel):
+    id: UUID
+    plan: str
+    goal_name: str
+    current_amount: float
+    target_amount: float
+    target_date: date
+    progress: float
+
+
+class DashboardUser(BaseModel):
+    id: UUID
+    first_name: str
+    last_name: str
+    email: str
+    phone_number: Optional[str]
+    date_of_birth: date
+
+
+class DashboardOut(BaseModel):
+    user: DashboardUser
+    total_balance: float
+    plans: dict[str, PlanSummary]
+    goals: List[GoalProgress]
@@ -1,8 +1,8 @@
 # schemas/safelock.py
 from uuid import UUID
 from pydantic import BaseModel, ValidationInfo, field_validator
-from typing import Optional
-from datetime import datetime
+from typing import List, Optional
+from datetime import date, datetime
 
 
 class SafeLockCreate(BaseModel):
@@ -46,6 +46,7 @@ class SafeLockResponse(BaseModel):
     has_emergency_fund: bool
     emergency_fund_percentage: Optional[int]
     created_at: datetime
+    matured_at: Optional[datetime] = None
 
     class Config:
         model_config = {
@@ -67,6 +68,7 @@ class MyGoalOut(BaseModel):
     current_amount: float
     target_date: datetime
     created_at: datetime
+    matured_at: Optional[datetime] = None
 
     model_config = {
         "from_attributes": True  
@@ -92,4 +94,26 @@ class FlexiAccountOut(BaseModel):
     balance: float
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ProjectionScenario(BaseModel):
+    extra_monthly: float
+    projected_amount: float
+    completion_date: Optional[date]
+    on_track: bool
+
+
+class GoalProjection(BaseModel):
+    id: UUID
+    plan: str
+    goal_name: str
+    current_amount: float
+    target_amount: float
+    target_date: date
+    days_left: int
+    contribution_rate: float
+    required_daily: Optional[float]
+    projected_amount: float
+    completion_date: Optional[date]
+    on_track: bool
+    scenarios: List[ProjectionScenario] = []
@@ -0,0 +1,18 @@
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+from pydantic import BaseModel
+
+
+class DepositOut(BaseModel):
+    id: UUID
+    reference: str
+    amount: float
+    account_type: str
+    goal_id: Optional[UUID]
+    is_successful: bool
+    created_at: datetime
+
+    model_config = {
+        "from_attributes": True
+    }
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+from typing import Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+from app.core import cache_invalidation
+from app.core.cache import TTLCache
+from app.core.database import stick_to_primary_on_commit
+from app.models.goals import SafeLockAccount, MyGoalAccount, EmergencyFund, FlexiAccount
+from app.models.user import User
+
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "60"))
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", "10000"))
+
+# user_id -> (etag, rendered body). Dropped whenever any of the user's rows
+# change, in every process (app.core.cache_invalidation).
+dashboard_cache = TTLCache(maxsize=DASHBOARD_CACHE_SIZE, ttl=DASHBOARD_CACHE_TTL)
+cache_invalidation.register("dashboards", dashboard_cache)
+
+EMPTY_JSON_ARRAY = literal_column("'[]'::json")
+
+
+def _goal_plan(model, plan: str, user_id):
+    goal = func.json_build_object(
+        "id", model.id,
+        "plan", plan,
+        "goal_name", model.goal_name,
+        "current_amount", model.current_amount,
+        "target_amount", model.target_amount,
+        "target_date", model.target_date,
+    )
+    return (
+        select(
+            func.json_build_object(
+                "count", func.count(),
+                "balance", func.coalesce(func.sum(model.current_amount), 0),
+                "target", func.coalesce(func.sum(model.target_amount), 0),
+                "goals", func.coalesce(func.json_agg(aggregate_order_by(goal, model.created_at.desc())), EMPTY_JSON_ARRAY),
+            )
+        )
+        .where(model.user_id == user_id)
+        .scalar_subquery()
+    )
+
+
+def _balance_plan(model, user_id):
+    return (
+        select(
+            func.json_build_object(
+                "count", func.count(),
+                "balance", func.coalesce(func.sum(model.balance), 0),
+            )
+        )
+        .where(model.user_id == user_id)
+        .scalar_subquery()
+    )
+
+
+def _progress(balance: float, target: float) -> Optional[float]:
+    return round(balance / target, 4) if target else None
+
+
+async def build_dashboard(db: AsyncSession, user: User) -> dict:
+    # All four plans in a single round-trip.
+    row = (await db.execute(
+        select(
+            _goal_plan(SafeLockAccount, "safelock", user.id).label("safelock"),
+            _goal_plan(MyGoalAccount, "mygoal", user.id).label("mygoal"),
+            _balance_plan(EmergencyFund, user.id).label("emergency"),
+            _balance_plan(FlexiAccount, user.id).label("flexi"),
+        )
+    )).one()
+
+    plans = {}
+    goals = []
+    for plan, summary in row._mapping.items():
+        target = summary.get("target", 0)
+        plans[plan] = {
+            "count": summary["count"],
+            "balance": summary["balance"],
+            "target": target,
+            "progress": _progress(summary["balance"], target),
+        }
+        for goal in summary.get("goals", []):
+            goal["progress"] = _progress(goal["current_amount"], goal["target_amount"]) or 0.0
+            goals.append(goal)
+
+    return {
+        "user": {
+            "id": user.id,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "email": user.email,
+            "phone_number": user.phone_number,
+            "date_of_birth": user.date_of_birth,
+        },
+        "total_balance": sum(plan["balance"] for plan in plans.values()),
+        "plans": plans,
+        "goals": goals,
+    }
+
+
+def render_dashboard(dashboard: dict) -> tuple[str, bytes]:
+    body = json.dumps(jsonable_encoder(dashboard), separators=(",", ":")).encode()
+    return f'"{hashlib.sha1(body).hexdigest()}"', body
+
+
+def invalidate_dashboard(user_id):
+    dashboard_cache.delete(str(user_id))
+
+
+def invalidate_dashboard_on_commit(session: Session, user_id):
+    invalidate_dashboard(user_id)
+    # Again on commit, so a concurrent request can't re-cache pre-commit data,
+    # and the refill reads from the primary until the replica has the write.
+    session.info.setdefault("invalidated_dashboards", set()).add(str(user_id))
+    cache_invalidation.invalidate_everywhere_on_commit(session, "dashboards", user_id)
+    stick_to_primary_on_commit(session, user_id)
+
+
+def _invalidate_on_change(mapper, connection, target):
+    user_id = target.id if isinstance(target, User) else target.user_id
+    session = object_session(target)
+    if session is not None:
+        invalidate_dashboard_on_commit(session, user_id)
+    else:
+        invalidate_dashboard(user_id)
+
+
+for _model in (SafeLockAccount, MyGoalAccount, EmergencyFund, FlexiAccount, User):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _invalidate_on_change)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_dashboards(session):
+    for user_id in session.info.pop("invalidated_dashboards", ()):
+        invalidate_dashboard(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidated_dashboards(session):
+    session.info.pop("invalidated_dashboards", None)
@@ -0,0 +1,212 @@
+import re
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable, Optional
+from uuid import uuid4
+from sqlalchemy import insert as sa_insert, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.goals import SafeLockAccount, EmergencyFund, FlexiAccount
+from app.models.ledger import LedgerEntry, PAYSTACK_CLEARING_ID
+from app.models.transactions import DepositTransaction
+from app.utils.dashboard import invalidate_dashboard_on_commit
+from app.utils.events import record_events
+from app.utils.projections import invalidate_projections_on_commit
+
+
+# dep_<created_at as YYYYMMDD>_<random>; older references are dep_<random>.
+REFERENCE_PATTERN = re.compile(r"dep_(\d{8})_[0-9a-f]{12}")
+
+
+class DepositError(Exception):
+    pass
+
+
+def new_reference(created_at: datetime) -> str:
+    # Carries the creation date, which pins the deposit to one partition of
+    # deposit_transactions: lookups by reference only visit that partition,
+    # and the per-partition unique index keeps references unique overall.
+    return f"dep_{created_at:%Y%m%d}_{uuid4().hex[:12]}"
+
+
+def reference_window(references: Iterable[str]) -> Optional[tuple[datetime, datetime]]:
+    # The created_at range the deposits with these references fall in, or
+    # None if any of them predates dated references.
+    days = []
+    for reference in references:
+        match = REFERENCE_PATTERN.fullmatch(reference or "")
+        if not match:
+            return None
+        days.append(datetime.strptime(match.group(1), "%Y%m%d"))
+    if not days:
+        return None
+    return min(days), max(days) + timedelta(days=1)
+
+
+def by_reference(*references: str) -> list:
+    # WHERE clauses matching deposits by reference, bounded on created_at when
+    # the references allow it so the query is partition-pruned.
+    clauses = [
+        DepositTransaction.reference == references[0]
+        if len(references) == 1
+        else DepositTransaction.reference.in_(references)
+    ]
+    window = reference_window(references)
+    if window is not None:
+        clauses += [DepositTransaction.created_at >= window[0], DepositTransaction.created_at < window[1]]
+    return clauses
+
+
+def to_minor(amount) -> int:
+    # Amounts are stored in kobo/pesewas; Decimal(str()) avoids float artefacts.
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def _ensure_accounts(db: Session, model, rows: dict):
+    # The fund rows only carry settings now; money lives in the ledger.
+    if rows:
+        db.execute(
+            insert(model)
+            .values([dict(user_id=user_id, **values) for user_id, values in sorted(rows.items())])
+            .on_conflict_do_nothing(index_elements=[model.user_id])
+        )
+
+
+def _ledger_legs(deposit: DepositTransaction, safelock) -> list:
+    amount_minor = to_minor(deposit.amount)
+    legs = [("paystack", PAYSTACK_CLEARING_ID, -amount_minor)]
+
+    if deposit.account_type == "safelock":
+        if not safelock:
+            raise DepositError("SafeLock goal not found")
+
+        # If emergency fund is enabled, split the amount. Integer minor units,
+        # rounded down for the fund, so the two shares always add up exactly.
+        safelock_share = amount_minor
+        if safelock.has_emergency_fund and safelock.emergency_fund_percentage:
+            emergency_share = amount_minor * safelock.emergency_fund_percentage // 100
+            safelock_share = amount_minor - emergency_share
+            legs.append(("emergency", deposit.user_id, emergency_share))
+        legs.append(("safelock", deposit.goal_id, safelock_share))
+
+    elif deposit.account_type in ("emergency", "flexi"):
+        legs.append((deposit.account_type, deposit.user_id, amount_minor))
+
+    else:
+        raise DepositError("Invalid account type")
+
+    return legs
+
+
+def credit_deposits(db: Session, deposits: list) -> list:
+    # Marks the deposits successful and posts them to the ledger with a fixed
+    # number of statements however many there are. Returns the deposits this
+    # call settled; ones another request already settled are left out. Every
+    # deposit is validated before anything is written, so a DepositError
+    # leaves the batch untouched. Does not commit; the caller owns the
+    # transaction.
+    if not deposits:
+        return []
+
+    goal_ids = {d.goal_id for d in deposits if d.account_type == "safelock"}
+    safelocks = {}
+    if goal_ids:
+        safelocks = {
+            (row.id, row.user_id): row
+            for row in db.execute(
+                select(
+                    SafeLockAccount.id,
+                    SafeLockAccount.user_id,
+                    SafeLockAccount.has_emergency_fund,
+                    SafeLockAccount.emergency_fund_percentage,
+                ).where(SafeLockAccount.id.in_(goal_ids))
+            )
+        }
+    legs = {d.id: _ledger_legs(d, safelocks.get((d.goal_id, d.user_id))) for d in deposits}
+
+    # Ids in a fixed order so concurrent batches lock rows in the same order.
+    # created_at limits the update to the partitions holding them.
+    claimed = set(
+        db.execute(
+            update(DepositTransaction)
+            .where(
+                DepositTransaction.id.in_(sorted(legs)),
+                DepositTransaction.created_at.in_(sorted({d.created_at for d in deposits})),
+                DepositTransaction.is_successful.is_not(True),
+            )
+            .values(is_successful=True)
+            .returning(DepositTransaction.id)
+        ).scalars()
+    )
+    credited = [d for d in deposits if d.id in claimed]
+    if not credited:
+        return []
+
+    emergency_funds, flexi_accounts = {}, {}
+    for deposit in credited:
+        safelock = safelocks.get((deposit.goal_id, deposit.user_id))
+        for account_type, _, _ in legs[deposit.id]:
+            if account_type == "emergency":
+                if safelock:
+                    emergency_funds[deposit.user_id] = {"percentage": safelock.emergency_fund_percentage}
+                else:
+                    emergency_funds.setdefault(deposit.user_id, {"percentage": 0.0})
+            elif account_type == "flexi":
+                flexi_accounts.setdefault(deposit.user_id, {})
+    _ensure_accounts(db, EmergencyFund, emergency_funds)
+    _ensure_accounts(db, FlexiAccount, flexi_accounts)
+
+    # Plain inserts: no balance row is locked, so concurrent deposits never wait
+    # on each other. Snapshots catch up in app.workers.ledger.
+    db.execute(
+        sa_insert(LedgerEntry),
+        [
+            dict(
+                transaction_id=deposit.id,
+                account_type=account_type,
+                account_id=account_id,
+                user_id=deposit.user_id,
+                amount_minor=amount,
+                deposit_id=deposit.id,
+            )
+            for deposit in credited
+            for account_type, account_id, amount in legs[deposit.id]
+            if amount
+        ],
+    )
+
+    record_events(
+        db,
+        [
+            dict(
+                event_type="deposit.credited",
+                aggregate_type="deposit",
+                aggregate_id=deposit.id,
+                user_id=deposit.user_id,
+                payload={
+                    "reference": deposit.reference,
+                    "account_type": deposit.account_type,
+                    "goal_id": deposit.goal_id,
+                    "amount_minor": to_minor(deposit.amount),
+                    "legs": [
+                        {"account_type": account_type, "account_id": account_id, "amount_minor": amount}
+                        for account_type, account_id, amount in legs[deposit.id]
+                        if amount
+                    ],
+                },
+            )
+            for deposit in credited
+        ],
+    )
+
+    # Ledger inserts bypass the ORM events that normally drop the cached dashboard.
+    for user_id in {deposit.user_id for deposit in credited}:
+        invalidate_dashboard_on_commit(db, user_id)
+        invalidate_projections_on_commit(db, user_id)
+    return credited
+
+
+def credit_deposit(db: Session, deposit: DepositTransaction) -> bool:
+    # Single-deposit form used by verify and the webhook consumer. Returns
+    # False if another request already settled it.
+    return bool(credit_deposits(db, [deposit]))
@@ -1,27 +1,86 @@
-import smtplib
 from email.message import EmailMessage
 import os
+from typing import TYPE_CHECKING, Optional
 from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.email import OutboundEmail
+from app.utils.otp import OTP_LENGTH, OTP_TTL
+
+if TYPE_CHECKING:
+    import smtplib
 
 load_dotenv()  
 
 EMAIL_HOST = os.getenv("EMAIL_HOST")
-EMAIL_PORT = int(os.getenv("EMAIL_PORT"))
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
+EMAIL_FROM = os.getenv("EMAIL_FROM", EMAIL_HOST_USER)
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "true").lower() == "true"
+EMAIL_TIMEOUT = float(os.getenv("EMAIL_TIMEOUT", "10"))
+
+
+def enqueue_email(db: AsyncSession, recipient: str, subject: str, body: str) -> OutboundEmail:
+    # Adds to the outbox in the caller's transaction; the email worker sends it after commit.
+    email = OutboundEmail(recipient=recipient, subject=subject, body=body)
+    db.add(email)
+    return email
+
+
+def send_email_verification_code(db: AsyncSession, email: str, code: str, first_name: Optional[str] = None):
+    greeting = f"Hello {first_name}," if first_name else "Hello,"
+    return enqueue_email(
+        db,
+        email,
+        "DreamBox Email Verification Code",
+        f"{greeting}\n\n"
+        f"Your DreamBox {OTP_LENGTH}-digit verification code is: {code}\n"
+        f"It will expire in {round(OTP_TTL / 60)} minutes.\n\n"
+        f"Thanks,\nDreamBox Team",
+    )
+
 
-def send_email_verification_code(email: str, code: str):
-    msg = EmailMessage()
-    msg["Subject"] = "Your DreamBox Verification Code"
-    msg["From"] = EMAIL_HOST_USER
-    msg["To"] = email
-    msg.set_content(f"Hello,\n\nYour verification code is: {code}\n\nThank you for using DreamBox.")
+class SMTPConnection:
+    # A long-lived, authenticated SMTP session that is reopened on demand, so
+    # STARTTLS and login happen once per connection instead of once per email.
+    # Only the email worker sends, so smtplib is imported there, not by routes.
+    def __init__(self):
+        self._smtp: Optional["smtplib.SMTP"] = None
 
-    try:
-        with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as smtp:
-            smtp.starttls() 
+    def _connect(self) -> "smtplib.SMTP":
+        import smtplib
+
+        smtp = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT, timeout=EMAIL_TIMEOUT)
+        if EMAIL_USE_TLS:
+            smtp.starttls()
+        if EMAIL_HOST_USER:
             smtp.login(EMAIL_HOST_USER, EMAIL_HOST_PASSWORD)
-            smtp.send_message(msg)
-            print(f"Email sent to {email} ✅")
-    except Exception as e:
-        print("Failed to send email ❌:", str(e))
+        return smtp
+
+    def send(self, recipient: str, subject: str, body: str):
+        import smtplib
+
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = EMAIL_FROM
+        msg["To"] = recipient
+        msg.set_content(body)
+
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # Servers drop idle sessions; reconnect once and retry.
+            self._smtp = self._connect()
+            self._smtp.send_message(msg)
+
+    def close(self):
+        import smtplib
+
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
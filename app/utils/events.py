@@ -0,0 +1,52 @@
+# Writing domain events to the outbox. Events join the caller's transaction,
+# so they exist exactly when the change they describe was committed; the
+# relay in app.workers.events publishes them afterwards.
+from typing import Optional, Union
+import orjson
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.events import OutboxEvent
+
+
+def _jsonable(payload: dict) -> dict:
+    # UUIDs, dates and Decimals as JSON strings, like the API renders them.
+    return orjson.loads(orjson.dumps(payload, default=str))
+
+
+def _mark(db: Union[Session, AsyncSession]):
+    # Read on commit by app.workers.events to wake the relay.
+    db.info["events_recorded"] = True
+
+
+def record_event(
+    db: Union[Session, AsyncSession],
+    event_type: str,
+    aggregate_type: str,
+    aggregate_id,
+    user_id=None,
+    payload: Optional[dict] = None,
+) -> OutboxEvent:
+    # Adds to the session; written by the caller's commit.
+    event = OutboxEvent(
+        event_type=event_type,
+        aggregate_type=aggregate_type,
+        aggregate_id=aggregate_id,
+        user_id=user_id,
+        payload=_jsonable(payload or {}),
+    )
+    db.add(event)
+    _mark(db)
+    return event
+
+
+def record_events(db: Session, events: list):
+    # Bulk form for batch paths: one INSERT for any number of events, each a
+    # dict of record_event's arguments.
+    if not events:
+        return
+    db.execute(
+        insert(OutboxEvent),
+        [dict(event, payload=_jsonable(event.get("payload") or {})) for event in events],
+    )
+    _mark(db)
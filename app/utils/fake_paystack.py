@@ -0,0 +1,168 @@
+# Local stand-in for the Paystack API, for offline load tests of the deposit flow.
+#
+#   uvicorn app.utils.fake_paystack:app --port 9000
+#   PAYSTACK_BASE_URL=http://localhost:9000 PAYSTACK_SECRET_KEY=sk_test_fake uvicorn app.main:app
+#
+# FAKE_PAYSTACK_SEED_COUNT pre-populates that many successful synthetic
+# transactions (see synthetic_reference/synthetic_amount), spread evenly over
+# the last FAKE_PAYSTACK_SEED_DAYS. They are computed on demand, so a
+# million of them costs no memory.
+import asyncio
+import os
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+
+FAKE_PAYSTACK_LATENCY_MS = float(os.getenv("FAKE_PAYSTACK_LATENCY_MS", "50"))
+FAKE_PAYSTACK_SEED_COUNT = int(os.getenv("FAKE_PAYSTACK_SEED_COUNT", "0"))
+FAKE_PAYSTACK_SEED_DAYS = float(os.getenv("FAKE_PAYSTACK_SEED_DAYS", "7"))
+
+app = FastAPI(title="Fake Paystack")
+
+transactions: dict[str, dict] = {}
+# References of created transactions, oldest first, for listing.
+created_order: list[str] = []
+
+_seed_start = time.time() - FAKE_PAYSTACK_SEED_DAYS * 86400
+_seed_step = FAKE_PAYSTACK_SEED_DAYS * 86400 / max(FAKE_PAYSTACK_SEED_COUNT, 1)
+
+
+def synthetic_reference(index: int) -> str:
+    return f"syn_{index:07d}"
+
+
+def synthetic_amount(index: int) -> int:
+    # In kobo.
+    return (index % 500 + 1) * 100
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _synthetic(index: int) -> dict:
+    return {
+        "reference": synthetic_reference(index),
+        "amount": synthetic_amount(index),
+        "email": f"synthetic{index}@example.com",
+        "metadata": None,
+        "status": "success",
+        "created_at": _seed_start + index * _seed_step,
+    }
+
+
+def _transaction_at(position: int) -> dict:
+    # Synthetic transactions predate everything created through the API.
+    if position < FAKE_PAYSTACK_SEED_COUNT:
+        return _synthetic(position)
+    return transactions[created_order[position - FAKE_PAYSTACK_SEED_COUNT]]
+
+
+def _created_at(position: int) -> float:
+    return _transaction_at(position)["created_at"]
+
+
+def _lookup(reference: str) -> Optional[dict]:
+    if reference in transactions:
+        return transactions[reference]
+    if reference.startswith("syn_") and reference[4:].isdigit():
+        index = int(reference[4:])
+        if index < FAKE_PAYSTACK_SEED_COUNT:
+            return _synthetic(index)
+    return None
+
+
+def _public(transaction: dict) -> dict:
+    return {**transaction, "created_at": _isoformat(transaction["created_at"])}
+
+
+async def _simulate_latency():
+    if FAKE_PAYSTACK_LATENCY_MS > 0:
+        await asyncio.sleep(FAKE_PAYSTACK_LATENCY_MS / 1000)
+
+
+def _check_auth(authorization: str):
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Invalid key")
+
+
+@app.post("/transaction/initialize")
+async def initialize(request: Request, authorization: str = Header(None)):
+    _check_auth(authorization)
+    await _simulate_latency()
+
+    payload = await request.json()
+    reference = payload.get("reference") or uuid4().hex
+    if _lookup(reference):
+        raise HTTPException(status_code=400, detail="Duplicate Transaction Reference")
+
+    transactions[reference] = {
+        "reference": reference,
+        "amount": payload["amount"],
+        "email": payload.get("email"),
+        "metadata": payload.get("metadata"),
+        # Every fake payment succeeds immediately so verify can settle it.
+        "status": "success",
+        "created_at": time.time(),
+    }
+    created_order.append(reference)
+    return {
+        "status": True,
+        "message": "Authorization URL created",
+        "data": {
+            "authorization_url": f"http://localhost/fake-checkout/{reference}",
+            "access_code": uuid4().hex[:15],
+            "reference": reference,
+        },
+    }
+
+
+@app.get("/transaction/verify/{reference}")
+async def verify(reference: str, authorization: str = Header(None)):
+    _check_auth(authorization)
+    await _simulate_latency()
+
+    transaction = _lookup(reference)
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transaction reference not found")
+
+    return {"status": True, "message": "Verification successful", "data": _public(transaction)}
+
+
+@app.get("/transaction")
+async def list_transactions(
+    page: int = 1,
+    perPage: int = 50,
+    status: Optional[str] = None,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    authorization: str = Header(None),
+):
+    _check_auth(authorization)
+    await _simulate_latency()
+
+    # Every fake transaction succeeds, so any other status filter is empty.
+    positions = range(FAKE_PAYSTACK_SEED_COUNT + len(created_order))
+    if status and status != "success":
+        positions = range(0)
+    lo = bisect_left(positions, from_.timestamp(), key=_created_at) if from_ else 0
+    hi = bisect_right(positions, to.timestamp(), key=_created_at) if to else len(positions)
+    total = max(hi - lo, 0)
+
+    # Newest first, like the real API.
+    end = hi - (page - 1) * perPage
+    start = max(end - perPage, lo)
+    data = [_public(_transaction_at(position)) for position in range(end - 1, start - 1, -1)]
+    # Plain JSON types already; skip FastAPI's encoder so the fake keeps up
+    # with the reconciler at high page rates.
+    return JSONResponse({
+        "status": True,
+        "message": "Transactions retrieved",
+        "data": data,
+        "meta": {"total": total, "perPage": perPage, "page": page, "pageCount": -(-total // perPage)},
+    })
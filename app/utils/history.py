@@ -0,0 +1,109 @@
+# Deposit history: one query shared by the paginated listing and the export.
+#
+# Rows come newest first, ordered by (created_at, id), and every filter
+# combination has an index that returns them in that order: see the
+# ix_deposit_*_history indexes on DepositTransaction. Pages continue from a
+# keyset cursor; exports stream the whole result through a server-side
+# cursor, HISTORY_EXPORT_BATCH rows at a time, so memory stays flat however
+# long the history is.
+import csv
+import io
+import os
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from uuid import UUID
+
+import orjson
+from sqlalchemy import Select, false, func, select, tuple_
+
+from app.core.database import AsyncSessionLocal
+from app.models.transactions import DepositTransaction
+
+HISTORY_EXPORT_BATCH = int(os.getenv("HISTORY_EXPORT_BATCH", "1000"))
+
+HISTORY_COLUMNS = (
+    DepositTransaction.id,
+    DepositTransaction.reference,
+    DepositTransaction.amount,
+    DepositTransaction.account_type,
+    DepositTransaction.goal_id,
+    # NULL has only ever meant pending.
+    func.coalesce(DepositTransaction.is_successful, false()).label("is_successful"),
+    DepositTransaction.created_at,
+)
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def history_query(
+    user_id,
+    account_type: Optional[str] = None,
+    is_successful: Optional[bool] = None,
+    goal_id: Optional[UUID] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after: Optional[tuple[datetime, UUID]] = None,
+) -> Select:
+    # since is inclusive and until exclusive; after is a decoded cursor.
+    query = select(*HISTORY_COLUMNS).where(DepositTransaction.user_id == user_id)
+    if account_type is not None:
+        query = query.where(DepositTransaction.account_type == account_type)
+    if is_successful is not None:
+        query = query.where(
+            DepositTransaction.is_successful.is_(True)
+            if is_successful
+            else DepositTransaction.is_successful.is_not(True)
+        )
+    if goal_id is not None:
+        query = query.where(DepositTransaction.goal_id == goal_id)
+    if since is not None:
+        query = query.where(DepositTransaction.created_at >= since)
+    if until is not None:
+        query = query.where(DepositTransaction.created_at < until)
+    if after is not None:
+        query = query.where(tuple_(DepositTransaction.created_at, DepositTransaction.id) < after)
+    return query.order_by(DepositTransaction.created_at.desc(), DepositTransaction.id.desc())
+
+
+def _csv_chunk(rows, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(column.key for column in HISTORY_COLUMNS)
+    writer.writerows(
+        (row.id, row.reference, row.amount, row.account_type, row.goal_id or "",
+         "true" if row.is_successful else "false", row.created_at.isoformat())
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+def _ndjson_chunk(rows) -> bytes:
+    return b"".join(
+        orjson.dumps({
+            "id": str(row.id),
+            "reference": row.reference,
+            "amount": float(row.amount),
+            "account_type": row.account_type,
+            "goal_id": str(row.goal_id) if row.goal_id else None,
+            "is_successful": row.is_successful,
+            "created_at": row.created_at,
+        }) + b"\n"
+        for row in rows
+    )
+
+
+async def export_history(user_id, query: Select, fmt: str) -> AsyncIterator[bytes]:
+    # Runs in its own session: a streamed body outlives the request's
+    # dependencies, get_db's session included. Read-only, so it goes to the
+    # replica when one is available.
+    async with AsyncSessionLocal() as db:
+        db.info["read_only"] = True
+        db.info["user_id"] = str(user_id)
+        if fmt == "csv":
+            yield _csv_chunk((), header=True)
+        result = await db.stream(query.execution_options(yield_per=HISTORY_EXPORT_BATCH))
+        async for rows in result.partitions():
+            yield _csv_chunk(rows) if fmt == "csv" else _ndjson_chunk(rows)
@@ -1,8 +1,188 @@
-import random
-from datetime import datetime, timedelta
+# One-time codes, kept out of the users table.
+#
+# A code is stored per purpose and subject (e.g. email verification for one
+# address) as an HMAC keyed by SECRET_KEY, with an expiry and a count of wrong
+# guesses. Issuing a new code replaces the old one. A correct code is used up
+# on the spot; after OTP_MAX_ATTEMPTS wrong guesses the code is locked and a
+# new one has to be requested.
+#
+# The postgres backend is the default because the code is usually checked by
+# a different worker process than the one that sent it; the memory backend
+# suits single-process deployments and tests.
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import time
+from datetime import timedelta
+from enum import Enum
+from typing import Optional
 
-def generate_otp(length: int = 6) -> str:
-    return ''.join(str(random.randint(0, 9)) for _ in range(length))
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert
 
-def otp_expiry(minutes=5):
-    return datetime.now() + timedelta(minutes=minutes)
+from app.core.cache import TTLCache
+from app.core.database import async_engine, utcnow
+from app.core.jwt import SECRET_KEY
+from app.models.otp import OneTimeCode
+
+logger = logging.getLogger(__name__)
+
+OTP_BACKEND = os.getenv("OTP_BACKEND", "postgres")
+OTP_LENGTH = int(os.getenv("OTP_LENGTH", "6"))
+OTP_TTL = float(os.getenv("OTP_TTL", "600"))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+OTP_CACHE_SIZE = int(os.getenv("OTP_CACHE_SIZE", "100000"))
+OTP_PURGE_INTERVAL = float(os.getenv("OTP_PURGE_INTERVAL", "600"))
+
+EMAIL_VERIFICATION = "email_verification"
+
+
+class OTPResult(str, Enum):
+    valid = "valid"
+    invalid = "invalid"
+    expired = "expired"
+    missing = "missing"
+    locked = "locked"
+
+
+def generate_otp(length: int = OTP_LENGTH) -> str:
+    return f"{secrets.randbelow(10 ** length):0{length}d}"
+
+
+def _key(purpose: str, subject: str) -> str:
+    return f"{purpose}:{subject}"
+
+
+def _hash(key: str, code: str) -> str:
+    # Keyed and salted with the key, so a leaked table can't be reversed by
+    # hashing all 10^6 codes once.
+    return hmac.new((SECRET_KEY or "").encode(), f"{key}:{code}".encode(), hashlib.sha256).hexdigest()
+
+
+class OTPStore:
+    async def save(self, key: str, code_hash: str, ttl: float):
+        raise NotImplementedError
+
+    async def check(self, key: str, code_hash: str, max_attempts: int) -> OTPResult:
+        # Consumes the code if it matches, otherwise counts a wrong guess.
+        raise NotImplementedError
+
+    async def purge(self):
+        pass
+
+
+class MemoryOTPStore(OTPStore):
+    # Process-local. Every method runs on the event loop without awaiting, so
+    # check's read-modify-write is atomic. Entries outlive their expiry by a
+    # TTL so a late guess reads as expired rather than never sent.
+    def __init__(self, maxsize: int = OTP_CACHE_SIZE):
+        self.cache = TTLCache(maxsize=maxsize, ttl=OTP_TTL)
+
+    async def save(self, key, code_hash, ttl):
+        self.cache.set(key, {"code_hash": code_hash, "attempts": 0, "expires_at": time.time() + ttl}, ttl * 2)
+
+    async def check(self, key, code_hash, max_attempts):
+        entry = self.cache.get(key)
+        if entry is None:
+            return OTPResult.missing
+        if entry["expires_at"] <= time.time():
+            return OTPResult.expired
+        if entry["attempts"] >= max_attempts:
+            return OTPResult.locked
+        if hmac.compare_digest(entry["code_hash"], code_hash):
+            self.cache.delete(key)
+            return OTPResult.valid
+        entry["attempts"] += 1
+        return OTPResult.invalid
+
+
+class PostgresOTPStore(OTPStore):
+    # A correct guess is a single DELETE by primary key; only wrong ones need
+    # the second statement.
+    async def save(self, key, code_hash, ttl):
+        stmt = insert(OneTimeCode).values(
+            key=key, code_hash=code_hash, attempts=0, expires_at=utcnow() + timedelta(seconds=ttl)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[OneTimeCode.key],
+            set_={
+                "code_hash": stmt.excluded.code_hash,
+                "attempts": 0,
+                "expires_at": stmt.excluded.expires_at,
+            },
+        )
+        async with async_engine.begin() as conn:
+            await conn.execute(stmt)
+
+    async def check(self, key, code_hash, max_attempts):
+        now = utcnow()
+        async with async_engine.begin() as conn:
+            consumed = await conn.execute(
+                delete(OneTimeCode)
+                .where(
+                    OneTimeCode.key == key,
+                    OneTimeCode.code_hash == code_hash,
+                    OneTimeCode.expires_at > now,
+                    OneTimeCode.attempts < max_attempts,
+                )
+                .returning(OneTimeCode.key)
+            )
+            if consumed.first() is not None:
+                return OTPResult.valid
+
+            row = (
+                await conn.execute(
+                    update(OneTimeCode)
+                    .where(OneTimeCode.key == key)
+                    .values(attempts=OneTimeCode.attempts + 1)
+                    .returning(OneTimeCode.attempts, OneTimeCode.expires_at)
+                )
+            ).first()
+        if row is None:
+            return OTPResult.missing
+        if row.expires_at <= now:
+            return OTPResult.expired
+        if row.attempts - 1 >= max_attempts:
+            return OTPResult.locked
+        return OTPResult.invalid
+
+    async def purge(self):
+        async with async_engine.begin() as conn:
+            await conn.execute(delete(OneTimeCode).where(OneTimeCode.expires_at <= utcnow()))
+
+
+def create_store(backend: str = OTP_BACKEND) -> OTPStore:
+    if backend == "postgres":
+        return PostgresOTPStore()
+    if backend == "memory":
+        return MemoryOTPStore()
+    raise ValueError(f"Unknown OTP backend: {backend}")
+
+
+otp_store = create_store()
+
+
+async def issue_code(purpose: str, subject: str, ttl: float = OTP_TTL, store: Optional[OTPStore] = None) -> str:
+    # Returns the plain code for the caller to deliver; only its hash is kept.
+    code = generate_otp()
+    key = _key(purpose, subject)
+    await (store or otp_store).save(key, _hash(key, code), ttl)
+    return code
+
+
+async def verify_code(purpose: str, subject: str, code: str, store: Optional[OTPStore] = None) -> OTPResult:
+    key = _key(purpose, subject)
+    return await (store or otp_store).check(key, _hash(key, code), OTP_MAX_ATTEMPTS)
+
+
+async def run_purger(store: Optional[OTPStore] = None):
+    store = store or otp_store
+    while True:
+        await asyncio.sleep(OTP_PURGE_INTERVAL)
+        try:
+            await store.purge()
+        except Exception:
+            logger.exception("OTP purge failed")
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import random
+import time
+from typing import TYPE_CHECKING, Optional
+
+from dotenv import load_dotenv
+
+from app.core import metrics
+
+if TYPE_CHECKING:
+    import httpx
+
+load_dotenv()
+
+PAYSTACK_BASE_URL = os.getenv("PAYSTACK_BASE_URL", "https://api.paystack.co")
+PAYSTACK_TIMEOUT = float(os.getenv("PAYSTACK_TIMEOUT", "10"))
+PAYSTACK_CONNECT_TIMEOUT = float(os.getenv("PAYSTACK_CONNECT_TIMEOUT", "3"))
+PAYSTACK_MAX_CONNECTIONS = int(os.getenv("PAYSTACK_MAX_CONNECTIONS", "100"))
+PAYSTACK_MAX_KEEPALIVE = int(os.getenv("PAYSTACK_MAX_KEEPALIVE", "20"))
+PAYSTACK_MAX_RETRIES = int(os.getenv("PAYSTACK_MAX_RETRIES", "3"))
+PAYSTACK_BACKOFF_BASE = float(os.getenv("PAYSTACK_BACKOFF_BASE", "0.2"))
+PAYSTACK_BACKOFF_MAX = float(os.getenv("PAYSTACK_BACKOFF_MAX", "2"))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+request_duration = metrics.histogram(
+    "paystack_request_duration_seconds", "Latency of each Paystack API attempt, retries included",
+    ("operation", "status"),
+)
+
+
+class PaystackError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class DuplicateReferenceError(PaystackError):
+    # Paystack already has a transaction with this reference, from an attempt
+    # whose response never arrived; its checkout URL is lost with it.
+    pass
+
+
+_client: Optional["httpx.AsyncClient"] = None
+
+
+def get_client() -> "httpx.AsyncClient":
+    # One pooled client per process so TLS sessions are reused across requests.
+    # httpx is imported here rather than at module level: it is the heaviest
+    # import on the startup path and only the payment routes need it.
+    import httpx
+
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=PAYSTACK_BASE_URL,
+            timeout=httpx.Timeout(PAYSTACK_TIMEOUT, connect=PAYSTACK_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=PAYSTACK_MAX_CONNECTIONS,
+                max_keepalive_connections=PAYSTACK_MAX_KEEPALIVE,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _auth_headers() -> dict:
+    secret_key = os.getenv("PAYSTACK_SECRET_KEY")
+    if not secret_key:
+        raise PaystackError("Paystack secret key not configured")
+    return {"Authorization": f"Bearer {secret_key}"}
+
+
+def is_valid_signature(body: bytes, signature: Optional[str]) -> bool:
+    # Paystack signs webhook bodies with HMAC-SHA512 keyed by the secret key.
+    secret_key = os.getenv("PAYSTACK_SECRET_KEY")
+    if not secret_key or not signature:
+        return False
+    expected = hmac.new(secret_key.encode(), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def _backoff(attempt: int) -> float:
+    delay = min(PAYSTACK_BACKOFF_MAX, PAYSTACK_BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, delay)
+
+
+async def _request(operation: str, method: str, path: str, idempotent: bool = True, **kwargs) -> "httpx.Response":
+    # operation names the call for metrics; paths carry references. Calls that
+    # are not idempotent are only retried when the connection failed before
+    # the request went out; after that a retry could act on Paystack twice.
+    import httpx
+
+    headers = _auth_headers()
+    client = get_client()
+
+    for attempt in range(PAYSTACK_MAX_RETRIES + 1):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, headers=headers, **kwargs)
+        except httpx.TransportError as e:
+            request_duration.labels(operation, "error").observe(time.perf_counter() - start)
+            unsent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+            if attempt == PAYSTACK_MAX_RETRIES or not (idempotent or unsent):
+                raise PaystackError(f"Paystack unreachable: {e}") from e
+        else:
+            request_duration.labels(operation, str(response.status_code)).observe(time.perf_counter() - start)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == PAYSTACK_MAX_RETRIES or not idempotent:
+                return response
+        await asyncio.sleep(_backoff(attempt))
+
+
+def _error_message(response: "httpx.Response") -> str:
+    try:
+        body = response.json()
+    except ValueError:
+        return ""
+    return str(body.get("message") or body.get("detail") or "") if isinstance(body, dict) else ""
+
+
+async def initialize_transaction(payload: dict) -> dict:
+    response = await _request("initialize", "POST", "/transaction/initialize", idempotent=False, json=payload)
+    if response.status_code == 400 and "duplicate" in _error_message(response).lower():
+        raise DuplicateReferenceError("Paystack already has a transaction with this reference", response.status_code)
+    if response.status_code != 200:
+        raise PaystackError("Failed to initialize payment with Paystack", response.status_code)
+    return response.json().get("data")
+
+
+async def verify_transaction(reference: str) -> dict:
+    response = await _request("verify", "GET", f"/transaction/verify/{reference}")
+    if response.status_code != 200:
+        raise PaystackError("Failed to verify transaction with Paystack", response.status_code)
+    return response.json().get("data")
+
+
+async def list_transactions(page: int, per_page: int, status: Optional[str] = None,
+                            from_date: Optional[str] = None, to_date: Optional[str] = None) -> tuple:
+    # One page of GET /transaction, newest first. Returns (transactions, meta);
+    # meta carries total and pageCount.
+    params = {"page": page, "perPage": per_page}
+    if status:
+        params["status"] = status
+    if from_date:
+        params["from"] = from_date
+    if to_date:
+        params["to"] = to_date
+
+    response = await _request("list", "GET", "/transaction", params=params)
+    if response.status_code != 200:
+        raise PaystackError("Failed to list transactions from Paystack", response.status_code)
+    body = response.json()
+    return body.get("data") or [], body.get("meta") or {}
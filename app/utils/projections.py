@@ -0,0 +1,224 @@
+# Savings projections: will each goal reach target_amount by target_date?
+#
+# A user's goals and the deposit legs recently credited to them in the ledger
+# are loaded as columns and every figure is computed with NumPy across all
+# goals at once:
+#
+#   contribution_rate  money reaching the goal per day over the last
+#                      PROJECTION_WINDOW_DAYS (or since the goal was created)
+#   required_daily     what is still missing, spread over the days left
+#   projected_amount   the balance on target_date at the current rate
+#   completion_date    the day the balance reaches the target at that rate
+#
+# What-if scenarios add extra monthly amounts to the rate, as a goals x
+# scenarios matrix. The per-goal columns are cached per user until their next
+# deposit or goal change, or the next day.
+import math
+import os
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Sequence
+
+from sqlalchemy import event, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+
+from app.core import cache_invalidation
+from app.core.cache import TTLCache
+from app.core.database import stick_to_primary_on_commit, utcnow
+from app.models.goals import MyGoalAccount, SafeLockAccount
+from app.models.ledger import LedgerEntry
+
+if TYPE_CHECKING:
+    import numpy as np
+
+PROJECTION_WINDOW_DAYS = int(os.getenv("PROJECTION_WINDOW_DAYS", "90"))
+# Goals younger than this are rated as if this old, so one early deposit does
+# not read as a daily habit.
+PROJECTION_MIN_DAYS = float(os.getenv("PROJECTION_MIN_DAYS", "7"))
+PROJECTION_CACHE_TTL = float(os.getenv("PROJECTION_CACHE_TTL", "86400"))
+PROJECTION_CACHE_SIZE = int(os.getenv("PROJECTION_CACHE_SIZE", "10000"))
+PROJECTION_MAX_SCENARIOS = 10
+
+DAYS_PER_MONTH = 365.25 / 12
+# Completion dates further out than this are reported as never.
+MAX_HORIZON_DAYS = 100 * 365
+
+# user_id -> per-goal columns as plain lists. Dropped on the user's next
+# deposit or goal change, in every process (app.core.cache_invalidation).
+projection_cache = TTLCache(maxsize=PROJECTION_CACHE_SIZE, ttl=PROJECTION_CACHE_TTL)
+cache_invalidation.register("projections", projection_cache)
+
+
+def _goal_columns(model, plan: str, user_id):
+    return select(
+        model.id,
+        literal(plan).label("plan"),
+        model.goal_name,
+        model.target_amount,
+        model.target_date,
+        model.created_at,
+        model.current_amount.label("current_amount"),
+    ).where(model.user_id == user_id)
+
+
+async def load_goal_stats(db: AsyncSession, user_id, now: datetime) -> dict:
+    import numpy as np
+
+    goals = (
+        await db.execute(
+            union_all(
+                _goal_columns(SafeLockAccount, "safelock", user_id),
+                _goal_columns(MyGoalAccount, "mygoal", user_id),
+            )
+        )
+    ).all()
+    window_start = now - timedelta(days=PROJECTION_WINDOW_DAYS)
+    # The goal's own deposit legs: only SafeLock deposits credit a goal, and
+    # the leg is the net amount after the emergency fund's share, split as it
+    # was when the deposit settled.
+    legs = (
+        await db.execute(
+            select(LedgerEntry.account_id, LedgerEntry.amount_minor).where(
+                LedgerEntry.account_type == "safelock",
+                LedgerEntry.account_id.in_([goal.id for goal in goals if goal.plan == "safelock"]),
+                LedgerEntry.deposit_id.is_not(None),
+                LedgerEntry.created_at >= window_start,
+            )
+        )
+    ).all()
+
+    index = {goal.id: i for i, goal in enumerate(goals)}
+    n = len(goals)
+
+    created = np.array([goal.created_at or now for goal in goals], dtype="datetime64[us]")
+
+    goal_idx = np.fromiter((index[leg.account_id] for leg in legs), dtype=np.intp, count=len(legs))
+    to_goal = np.fromiter((leg.amount_minor for leg in legs), dtype=np.int64, count=len(legs))
+
+    contributed = np.bincount(goal_idx, weights=to_goal, minlength=n) / 100
+    start = np.maximum(created, np.datetime64(window_start, "us"))
+    observed_days = (np.datetime64(now, "us") - start) / np.timedelta64(1, "D")
+    rate = contributed / np.maximum(observed_days, PROJECTION_MIN_DAYS)
+
+    return {
+        "as_of": now.date().isoformat(),
+        "goals": [
+            {"id": str(goal.id), "plan": goal.plan, "goal_name": goal.goal_name}
+            for goal in goals
+        ],
+        "target_amount": [float(goal.target_amount) for goal in goals],
+        "current_amount": [float(goal.current_amount) for goal in goals],
+        "target_date": [goal.target_date.toordinal() for goal in goals],
+        "contribution_rate": rate.tolist(),
+    }
+
+
+def _completion_dates(remaining: "np.ndarray", rate: "np.ndarray", today: date) -> list:
+    # Element-wise: today when nothing is left, None when the rate never gets
+    # there, otherwise the day the target is reached.
+    import numpy as np
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days = np.where(remaining <= 0, 0.0, np.ceil(remaining / rate))
+    reachable = (remaining <= 0) | ((rate > 0) & (days <= MAX_HORIZON_DAYS))
+    ordinals = np.where(reachable, today.toordinal() + np.nan_to_num(days), 0).astype(np.int64)
+    return [date.fromordinal(o) if ok else None for o, ok in zip(ordinals.tolist(), reachable.tolist())]
+
+
+def project(stats: dict, today: date, extra_monthly: Sequence[float] = ()) -> list[dict]:
+    import numpy as np
+
+    target = np.asarray(stats["target_amount"], dtype=np.float64)
+    balance = np.asarray(stats["current_amount"], dtype=np.float64)
+    rate = np.asarray(stats["contribution_rate"], dtype=np.float64)
+    days_left = np.maximum(np.asarray(stats["target_date"], dtype=np.int64) - today.toordinal(), 0)
+
+    remaining = np.maximum(target - balance, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        required = np.where(remaining <= 0, 0.0, remaining / days_left)
+    projected = balance + rate * days_left
+    completion = _completion_dates(remaining, rate, today)
+
+    # goals x scenarios
+    extra = np.asarray(extra_monthly, dtype=np.float64) / DAYS_PER_MONTH
+    scenario_rate = np.maximum(rate[:, None] + extra[None, :], 0.0)
+    scenario_projected = balance[:, None] + scenario_rate * days_left[:, None]
+    scenario_completion = _completion_dates(
+        np.broadcast_to(remaining[:, None], scenario_rate.shape).ravel(), scenario_rate.ravel(), today
+    )
+
+    projections = []
+    columns = zip(
+        stats["goals"], balance.tolist(), target.tolist(), stats["target_date"], days_left.tolist(),
+        rate.tolist(), required.tolist(), projected.tolist(), completion,
+    )
+    for i, (goal, current, goal_target, target_day, days, goal_rate, need, amount, done) in enumerate(columns):
+        projections.append({
+            **goal,
+            "current_amount": current,
+            "target_amount": goal_target,
+            "target_date": date.fromordinal(target_day),
+            "days_left": days,
+            "contribution_rate": round(goal_rate, 2),
+            "required_daily": None if math.isinf(need) else round(need, 2),
+            "projected_amount": round(amount, 2),
+            "completion_date": done,
+            "on_track": round(amount, 2) >= goal_target,
+            "scenarios": [
+                {
+                    "extra_monthly": extra_monthly[j],
+                    "projected_amount": round(scenario_amount, 2),
+                    "completion_date": scenario_completion[i * len(extra_monthly) + j],
+                    "on_track": round(scenario_amount, 2) >= goal_target,
+                }
+                for j, scenario_amount in enumerate(scenario_projected[i].tolist())
+            ],
+        })
+    return projections
+
+
+async def user_projections(db: AsyncSession, user_id, extra_monthly: Sequence[float] = ()) -> list[dict]:
+    now = utcnow()
+    key = str(user_id)
+    stats = projection_cache.get(key)
+    if stats is None or stats["as_of"] != now.date().isoformat():
+        stats = await load_goal_stats(db, user_id, now)
+        projection_cache.set(key, stats)
+    return project(stats, now.date(), extra_monthly)
+
+
+def invalidate_projections(user_id):
+    projection_cache.delete(str(user_id))
+
+
+def invalidate_projections_on_commit(session: Session, user_id):
+    invalidate_projections(user_id)
+    # Again on commit, so a concurrent request can't re-cache pre-commit data,
+    # and the refill reads from the primary until the replica has the write.
+    session.info.setdefault("invalidated_projections", set()).add(str(user_id))
+    cache_invalidation.invalidate_everywhere_on_commit(session, "projections", user_id)
+    stick_to_primary_on_commit(session, user_id)
+
+
+def _invalidate_on_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        invalidate_projections_on_commit(session, target.user_id)
+    else:
+        invalidate_projections(target.user_id)
+
+
+for _model in (SafeLockAccount, MyGoalAccount):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _invalidate_on_change)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_projections(session):
+    for user_id in session.info.pop("invalidated_projections", ()):
+        invalidate_projections(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidated_projections(session):
+    session.info.pop("invalidated_projections", None)
@@ -0,0 +1,97 @@
+# Background consumer that drains the Paystack webhook inbox and credits deposits.
+import asyncio
+import logging
+import os
+from typing import Optional
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal, utcnow
+from app.models.transactions import DepositTransaction, PaystackEvent
+from app.utils.deposits import DepositError, by_reference, credit_deposit, to_minor
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "2"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+
+_wakeup = asyncio.Event()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def notify():
+    # Called by the webhook endpoint so new events are picked up without waiting a poll interval.
+    # Safe to call from threadpool handlers as well as the event loop.
+    if _loop is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def _handle_charge_success(db: Session, event: PaystackEvent):
+    data = event.payload.get("data") or {}
+
+    deposit = db.query(DepositTransaction).filter(*by_reference(event.reference)).first()
+    if not deposit:
+        raise DepositError("Transaction not found")
+
+    # Idempotent on reference: redeliveries and client verifies are no-ops.
+    if deposit.is_successful:
+        return
+
+    if data.get("amount") != to_minor(deposit.amount):
+        raise DepositError("Transaction amount mismatch")
+
+    credit_deposit(db, deposit)
+
+
+def process_pending_events(db: Session, batch_size: int = WEBHOOK_BATCH_SIZE) -> int:
+    events = (
+        db.query(PaystackEvent)
+        .filter(PaystackEvent.processed_at.is_(None), PaystackEvent.attempts < WEBHOOK_MAX_ATTEMPTS)
+        .order_by(PaystackEvent.received_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+    for event in events:
+        try:
+            with db.begin_nested():
+                if event.event == "charge.success":
+                    _handle_charge_success(db, event)
+        except Exception as e:
+            logger.warning("Failed to apply Paystack event %s (%s): %s", event.id, event.reference, e)
+            event.attempts += 1
+            event.last_error = str(e)
+            continue
+
+        event.attempts += 1
+        event.last_error = None
+        event.processed_at = utcnow()
+
+    db.commit()
+    return len(events)
+
+
+def _process_batch() -> int:
+    db = SessionLocal()
+    try:
+        return process_pending_events(db)
+    finally:
+        db.close()
+
+
+async def run_consumer():
+    global _loop
+    _loop = asyncio.get_running_loop()
+    while True:
+        _wakeup.clear()
+        try:
+            processed = await asyncio.to_thread(_process_batch)
+        except Exception:
+            logger.exception("Paystack event consumer failed")
+            processed = 0
+
+        if processed < WEBHOOK_BATCH_SIZE:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=WEBHOOK_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
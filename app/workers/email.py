@@ -0,0 +1,132 @@
+# Background sender that drains the email outbox over a persistent SMTP session.
+#
+# For local testing run an SMTP sink and point the app at it:
+#   python -m aiosmtpd -n -l localhost:1025
+#   EMAIL_HOST=localhost EMAIL_PORT=1025 EMAIL_USE_TLS=false
+import asyncio
+import logging
+import os
+from typing import Optional
+import time
+from datetime import timedelta
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal, utcnow
+from app.core.metrics import export_dict
+from app.models.email import OutboundEmail
+from app.utils.email import SMTPConnection
+
+logger = logging.getLogger(__name__)
+
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", "2"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_BACKOFF_BASE = float(os.getenv("EMAIL_BACKOFF_BASE", "5"))
+EMAIL_BACKOFF_MAX = float(os.getenv("EMAIL_BACKOFF_MAX", "300"))
+# Bodies carry one-time codes; they are cleared once the email is sent or
+# given up on, so the outbox never holds a live code longer than needed.
+REDACTED_BODY = "[redacted]"
+
+metrics = {
+    "sent_total": 0,
+    "failed_total": 0,
+    "queue_lag_seconds": 0.0,
+    "send_rate": 0.0,
+}
+export_dict("email_worker", metrics, "Outbound email worker statistic")
+
+_wakeup = asyncio.Event()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_connection = SMTPConnection()
+
+
+def notify():
+    # Safe to call from threadpool handlers as well as the event loop.
+    if _loop is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(EMAIL_BACKOFF_MAX, EMAIL_BACKOFF_BASE * (2 ** (attempts - 1))))
+
+
+def send_pending_emails(db: Session, connection: SMTPConnection, batch_size: int = EMAIL_BATCH_SIZE) -> int:
+    now = utcnow()
+    emails = (
+        db.query(OutboundEmail)
+        .filter(
+            OutboundEmail.sent_at.is_(None),
+            OutboundEmail.next_attempt_at <= now,
+            OutboundEmail.attempts < EMAIL_MAX_ATTEMPTS,
+        )
+        .order_by(OutboundEmail.next_attempt_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not emails:
+        metrics["queue_lag_seconds"] = 0.0
+        return 0
+
+    metrics["queue_lag_seconds"] = (now - min(e.created_at for e in emails)).total_seconds()
+
+    import smtplib  # only once there is mail to send; routes import this module for notify()
+
+    start = time.perf_counter()
+    sent = 0
+    for email in emails:
+        email.attempts += 1
+        try:
+            connection.send(email.recipient, email.subject, email.body)
+        except Exception as e:
+            if not isinstance(e, smtplib.SMTPResponseException):
+                # Anything but a server reply leaves the session in an unknown state.
+                connection.close()
+            logger.warning("Failed to send email %s to %s: %s", email.id, email.recipient, e)
+            email.last_error = str(e)
+            email.next_attempt_at = now + _backoff(email.attempts)
+            if email.attempts >= EMAIL_MAX_ATTEMPTS:
+                email.body = REDACTED_BODY
+            metrics["failed_total"] += 1
+            continue
+
+        email.sent_at = utcnow()
+        email.last_error = None
+        email.body = REDACTED_BODY
+        sent += 1
+
+    db.commit()
+
+    metrics["sent_total"] += sent
+    elapsed = time.perf_counter() - start
+    if elapsed > 0:
+        metrics["send_rate"] = sent / elapsed
+    return len(emails)
+
+
+def _send_batch() -> int:
+    db = SessionLocal()
+    try:
+        return send_pending_emails(db, _connection)
+    finally:
+        db.close()
+
+
+async def run_sender():
+    global _loop
+    _loop = asyncio.get_running_loop()
+    try:
+        while True:
+            _wakeup.clear()
+            try:
+                processed = await asyncio.to_thread(_send_batch)
+            except Exception:
+                logger.exception("Email sender failed")
+                processed = 0
+
+            if processed < EMAIL_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), timeout=EMAIL_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        await asyncio.to_thread(_connection.close)
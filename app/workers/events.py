@@ -0,0 +1,285 @@
+# Relays outbox events (app.utils.events) to downstream consumers.
+#
+# Each pass first stamps newly committed events with the next stream offsets,
+# under an advisory lock, so offsets are gapless and follow commit order:
+# two changes to the same row commit one after the other and their events
+# keep that order. It then publishes the events past its checkpoint to the
+# configured sink, in offset order, and advances the checkpoint.
+#
+# Delivery is at-least-once: a crash between publishing and checkpointing
+# resends that batch with the same offsets, so consumers skip offsets they
+# have already seen. Consumers reading the table directly use
+# consume_events, which commits their checkpoint together with their own
+# writes and so processes every event exactly once.
+#
+#   EVENT_SINK=file:/var/lib/dreambox/events.jsonl   one JSON event per line
+#   EVENT_SINK=memory                                in-process queue (tests)
+#
+# With no sink, events are still stamped for table consumers. Other
+# transports (Kafka, Redis streams, ...) plug in as an EventSink.
+import asyncio
+import logging
+import os
+import queue
+import time
+from datetime import timedelta
+from typing import Callable, Iterator, Optional
+import orjson
+from sqlalchemy import delete, event, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal, utcnow
+from app.core.metrics import export_dict
+from app.models.events import OutboxEvent
+from app.models.jobs import JobCheckpoint
+
+logger = logging.getLogger(__name__)
+
+EVENT_SINK = os.getenv("EVENT_SINK", "")
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "500"))
+EVENT_POLL_INTERVAL = float(os.getenv("EVENT_POLL_INTERVAL", "2"))
+# Events every consumer has passed are deleted once they are this old.
+EVENT_RETENTION_DAYS = float(os.getenv("EVENT_RETENTION_DAYS", "7"))
+EVENT_PRUNE_INTERVAL = float(os.getenv("EVENT_PRUNE_INTERVAL", "3600"))
+
+# Consumer checkpoints live in job_checkpoints as "events:<consumer>".
+CHECKPOINT_PREFIX = "events:"
+RELAY_CONSUMER = "relay"
+STAMP_CHECKPOINT = "event_stamp"
+# Serialises stamping across processes.
+STAMP_LOCK_KEY = 0xE7E175
+
+metrics = {
+    "stamped_total": 0,
+    "delivered_total": 0,
+    "pruned_total": 0,
+    "delivery_lag_seconds": 0.0,
+}
+export_dict("event_relay", metrics, "Outbox event relay statistic")
+
+_wakeup = asyncio.Event()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def notify():
+    # Safe to call from threadpool handlers as well as the event loop.
+    if _loop is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_on_commit(session):
+    if session.info.pop("events_recorded", False):
+        notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_recorded(session):
+    session.info.pop("events_recorded", None)
+
+
+class EventSink:
+    def publish(self, events: list[dict]):
+        # Must not return until the batch is durable at the destination.
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FileSink(EventSink):
+    # Appends JSON lines and fsyncs each batch. One writer per file: with
+    # several app hosts, give each its own path or use a shared transport.
+    def __init__(self, path: str):
+        self.path = path
+
+    def publish(self, events):
+        with open(self.path, "ab") as f:
+            f.write(b"".join(orjson.dumps(e) + b"\n" for e in events))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class QueueSink(EventSink):
+    # In-process; tests read events off .queue.
+    def __init__(self):
+        self.queue: "queue.Queue[dict]" = queue.Queue()
+
+    def publish(self, events):
+        for e in events:
+            self.queue.put(e)
+
+
+def create_sink(spec: str = EVENT_SINK) -> Optional[EventSink]:
+    if not spec:
+        return None
+    if spec == "memory":
+        return QueueSink()
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):])
+    raise ValueError(f"Unknown event sink: {spec}")
+
+
+def event_dict(e: OutboxEvent) -> dict:
+    return {
+        "offset": e.stream_offset,
+        "type": e.event_type,
+        "aggregate_type": e.aggregate_type,
+        "aggregate_id": str(e.aggregate_id),
+        "user_id": str(e.user_id) if e.user_id else None,
+        "payload": e.payload,
+        "created_at": e.created_at.isoformat(),
+    }
+
+
+def stamp_events(db: Session, batch_size: int = EVENT_BATCH_SIZE) -> int:
+    # Gives up to batch_size committed, unstamped events the next offsets, in
+    # id order. Returns the number stamped.
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": STAMP_LOCK_KEY})
+    # Kept apart from the events so pruning can never make offsets repeat.
+    last = db.scalar(select(JobCheckpoint.position).where(JobCheckpoint.name == STAMP_CHECKPOINT)) or 0
+    pending = (
+        select(OutboxEvent.id)
+        .where(OutboxEvent.stream_offset.is_(None))
+        .order_by(OutboxEvent.id)
+        .limit(batch_size)
+        .subquery()
+    )
+    numbered = select(
+        pending.c.id, (last + func.row_number().over(order_by=pending.c.id)).label("offset")
+    ).subquery()
+    stamped = db.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id == numbered.c.id)
+        .values(stream_offset=numbered.c.offset)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if stamped:
+        stmt = insert(JobCheckpoint).values(name=STAMP_CHECKPOINT, position=last + stamped, updated_at=utcnow())
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[JobCheckpoint.name],
+                set_={"position": stmt.excluded.position, "updated_at": stmt.excluded.updated_at},
+            )
+        )
+    db.commit()
+    metrics["stamped_total"] += stamped
+    return stamped
+
+
+def _claim(db: Session, consumer: str, batch_size: int) -> tuple[JobCheckpoint, list]:
+    # Locks the consumer's checkpoint for the rest of the transaction, so two
+    # processes running the same consumer take turns, and returns the events
+    # after it.
+    name = CHECKPOINT_PREFIX + consumer
+    db.execute(
+        insert(JobCheckpoint)
+        .values(name=name, position=0, updated_at=utcnow())
+        .on_conflict_do_nothing(index_elements=[JobCheckpoint.name])
+    )
+    checkpoint = db.scalar(select(JobCheckpoint).where(JobCheckpoint.name == name).with_for_update())
+    events = db.scalars(
+        select(OutboxEvent)
+        .where(OutboxEvent.stream_offset > checkpoint.position)
+        .order_by(OutboxEvent.stream_offset)
+        .limit(batch_size)
+    ).all()
+    return checkpoint, events
+
+
+def consume_events(
+    db: Session,
+    consumer: str,
+    handler: Callable[[Session, dict], None],
+    batch_size: int = EVENT_BATCH_SIZE,
+) -> int:
+    # Runs handler(db, event) for the consumer's next events and commits its
+    # writes together with the new checkpoint: each event takes effect
+    # exactly once. If the handler raises nothing is committed and the batch
+    # is retried on the next call. Returns the number handled.
+    checkpoint, events = _claim(db, consumer, batch_size)
+    for e in events:
+        handler(db, event_dict(e))
+    if events:
+        checkpoint.position = events[-1].stream_offset
+    db.commit()
+    return len(events)
+
+
+def deliver_events(db: Session, sink: EventSink, batch_size: int = EVENT_BATCH_SIZE) -> int:
+    checkpoint, events = _claim(db, RELAY_CONSUMER, batch_size)
+    if events:
+        sink.publish([event_dict(e) for e in events])
+        checkpoint.position = events[-1].stream_offset
+        metrics["delivered_total"] += len(events)
+        metrics["delivery_lag_seconds"] = (utcnow() - events[-1].created_at).total_seconds()
+    db.commit()
+    return len(events)
+
+
+def prune_events(db: Session, retention: timedelta = timedelta(days=EVENT_RETENTION_DAYS)) -> int:
+    # Deletes old events that every known consumer has passed.
+    low_water = db.scalar(
+        select(func.min(JobCheckpoint.position)).where(JobCheckpoint.name.startswith(CHECKPOINT_PREFIX))
+    )
+    stmt = delete(OutboxEvent).where(
+        OutboxEvent.stream_offset.is_not(None), OutboxEvent.created_at < utcnow() - retention
+    )
+    if low_water is not None:
+        stmt = stmt.where(OutboxEvent.stream_offset <= low_water)
+    pruned = db.execute(stmt).rowcount
+    db.commit()
+    metrics["pruned_total"] += pruned
+    return pruned
+
+
+def read_events(path: str, after: int = 0) -> Iterator[dict]:
+    # Reads a FileSink file from offset `after` on, skipping redelivered
+    # offsets.
+    last = after
+    with open(path, "rb") as f:
+        for line in f:
+            e = orjson.loads(line)
+            if e["offset"] > last:
+                last = e["offset"]
+                yield e
+
+
+def _relay_batch(sink: Optional[EventSink], prune: bool) -> int:
+    db = SessionLocal()
+    try:
+        processed = stamp_events(db)
+        if sink is not None:
+            processed = max(processed, deliver_events(db, sink))
+        if prune:
+            prune_events(db)
+        return processed
+    finally:
+        db.close()
+
+
+async def run_relay(sink: Optional[EventSink] = None):
+    global _loop
+    _loop = asyncio.get_running_loop()
+    sink = sink or create_sink()
+    last_prune = time.monotonic()
+    try:
+        while True:
+            _wakeup.clear()
+            prune = time.monotonic() - last_prune >= EVENT_PRUNE_INTERVAL
+            try:
+                processed = await asyncio.to_thread(_relay_batch, sink, prune)
+                if prune:
+                    last_prune = time.monotonic()
+            except Exception:
+                logger.exception("Event relay failed")
+                processed = 0
+
+            if processed < EVENT_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), timeout=EVENT_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        if sink is not None:
+            sink.close()
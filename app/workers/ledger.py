@@ -0,0 +1,186 @@
+# Keeps account_balances snapshots in step with the append-only ledger.
+#
+# The folder runs in the app lifespan and adds new ledger entries to the
+# snapshots. Entries are folded by the id of the transaction that wrote them
+# (LedgerEntry.txid), and only below the oldest transaction still running:
+# every entry there has committed or never will, so a window once folded
+# cannot gain entries later, however long their transaction took. A
+# long-running writer holds folding back; balances stay exact meanwhile, as
+# reads add up the entries not folded yet. The checkpoint is the txid
+# folding has reached. The full rebuild is a
+# reconciliation job, run on demand:
+#   python -m app.workers.ledger rebuild
+import asyncio
+import logging
+import os
+import sys
+from sqlalchemy import BigInteger, DateTime, func, literal, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal, utcnow
+from app.models.jobs import JobCheckpoint
+from app.models.ledger import AccountBalance, LedgerEntry
+
+logger = logging.getLogger(__name__)
+
+LEDGER_FOLD_BATCH_SIZE = int(os.getenv("LEDGER_FOLD_BATCH_SIZE", "10000"))
+LEDGER_FOLD_INTERVAL = float(os.getenv("LEDGER_FOLD_INTERVAL", "5"))
+LEDGER_REBUILD_BATCH_SIZE = int(os.getenv("LEDGER_REBUILD_BATCH_SIZE", "5000"))
+
+FOLD_CHECKPOINT = "ledger_fold"
+# Serialises snapshot writers (folder and rebuild) across processes.
+SNAPSHOT_LOCK_KEY = 0x1ED6E5
+
+
+def _lock_snapshots(db: Session):
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SNAPSHOT_LOCK_KEY})
+
+
+def _fold_position(db: Session) -> int:
+    return db.scalar(select(JobCheckpoint.position).where(JobCheckpoint.name == FOLD_CHECKPOINT)) or 0
+
+
+def _finished_below(db: Session) -> int:
+    # Every transaction with a lower id has committed or aborted.
+    return db.scalar(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"))
+
+
+def _upsert_snapshots(db: Session, stmt, incremental: bool):
+    balance = stmt.excluded.balance_minor
+    if incremental:
+        balance = AccountBalance.balance_minor + stmt.excluded.balance_minor
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[AccountBalance.account_type, AccountBalance.account_id],
+            set_={
+                "balance_minor": balance,
+                "folded_txid": stmt.excluded.folded_txid,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+    )
+
+
+def fold_snapshots(db: Session, batch_size: int = LEDGER_FOLD_BATCH_SIZE) -> int:
+    # Adds about batch_size new entries, whole transactions at a time, to
+    # their account snapshots in one statement and advances the checkpoint.
+    # Returns the number folded.
+    _lock_snapshots(db)
+    start = _fold_position(db)
+    horizon = _finished_below(db)
+
+    window = (
+        select(LedgerEntry.txid)
+        .where(LedgerEntry.txid >= start, LedgerEntry.txid < horizon)
+        .order_by(LedgerEntry.txid)
+        .limit(batch_size)
+        .subquery()
+    )
+    last, count = db.execute(select(func.max(window.c.txid), func.count())).one()
+    # A full batch ends after its last transaction; anything less reaches
+    # the horizon.
+    end = last + 1 if count == batch_size else horizon
+
+    if count:
+        # Accounts rebuilt past this window already include these entries.
+        rows = (
+            select(
+                LedgerEntry.account_type,
+                LedgerEntry.account_id,
+                func.sum(LedgerEntry.amount_minor),
+                literal(end, BigInteger),
+                literal(utcnow(), DateTime),
+            )
+            .outerjoin(
+                AccountBalance,
+                (AccountBalance.account_type == LedgerEntry.account_type)
+                & (AccountBalance.account_id == LedgerEntry.account_id),
+            )
+            .where(
+                LedgerEntry.txid >= start,
+                LedgerEntry.txid < end,
+                LedgerEntry.txid >= func.coalesce(AccountBalance.folded_txid, 0),
+            )
+            .group_by(LedgerEntry.account_type, LedgerEntry.account_id)
+        )
+        columns = ["account_type", "account_id", "balance_minor", "folded_txid", "updated_at"]
+        _upsert_snapshots(db, insert(AccountBalance).from_select(columns, rows), incremental=True)
+
+    if end > start:
+        checkpoint = insert(JobCheckpoint).values(name=FOLD_CHECKPOINT, position=end, updated_at=utcnow())
+        db.execute(
+            checkpoint.on_conflict_do_update(
+                index_elements=[JobCheckpoint.name],
+                set_={"position": checkpoint.excluded.position, "updated_at": checkpoint.excluded.updated_at},
+            )
+        )
+    db.commit()
+    return count
+
+
+def rebuild_snapshots(db: Session, batch_size: int = LEDGER_REBUILD_BATCH_SIZE) -> int:
+    # Recomputes every snapshot from the ledger, batch_size accounts per
+    # transaction, walking accounts in key order so memory stays flat and the
+    # folder is only held off for one batch at a time. Returns accounts rebuilt.
+    after = None
+    rebuilt = 0
+    while True:
+        _lock_snapshots(db)
+        upto = _fold_position(db)
+
+        query = (
+            select(LedgerEntry.account_type, LedgerEntry.account_id, func.sum(LedgerEntry.amount_minor))
+            .where(LedgerEntry.txid < upto)
+            .group_by(LedgerEntry.account_type, LedgerEntry.account_id)
+            .order_by(LedgerEntry.account_type, LedgerEntry.account_id)
+            .limit(batch_size)
+        )
+        if after is not None:
+            query = query.where(tuple_(LedgerEntry.account_type, LedgerEntry.account_id) > after)
+        batch = db.execute(query).all()
+        if not batch:
+            db.commit()
+            return rebuilt
+
+        now = utcnow()
+        values = [
+            dict(account_type=t, account_id=i, balance_minor=total, folded_txid=upto, updated_at=now)
+            for t, i, total in batch
+        ]
+        _upsert_snapshots(db, insert(AccountBalance).values(values), incremental=False)
+        db.commit()
+
+        rebuilt += len(batch)
+        after = (batch[-1].account_type, batch[-1].account_id)
+        logger.info("Rebuilt %d ledger snapshots", rebuilt)
+
+
+def _fold() -> int:
+    db = SessionLocal()
+    try:
+        return fold_snapshots(db)
+    finally:
+        db.close()
+
+
+async def run_folder():
+    while True:
+        try:
+            folded = await asyncio.to_thread(_fold)
+        except Exception:
+            logger.exception("Ledger snapshot fold failed")
+            folded = 0
+
+        if folded < LEDGER_FOLD_BATCH_SIZE:
+            await asyncio.sleep(LEDGER_FOLD_INTERVAL)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m app.workers.ledger rebuild")
+    db = SessionLocal()
+    try:
+        print(f"rebuilt {rebuild_snapshots(db)} account snapshots")
+    finally:
+        db.close()
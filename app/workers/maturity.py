@@ -0,0 +1,221 @@
+# Matures goals whose target_date has arrived: SafeLocks unlock and MyGoals
+# close. Each goal gets matured_at and a "<kind>.matured" outbox event for
+# notifications and analytics.
+#
+# A sweep drains the due goals in chunks of MATURITY_CHUNK_SIZE across a
+# pool of MATURITY_WORKERS threads. Every chunk is claimed with
+# FOR UPDATE SKIP LOCKED through the partial target_date index and committed
+# on its own, so any number of threads and processes can sweep together
+# without waiting on each other, and a sweep cut short leaves nothing half
+# done: the next one simply finds the remaining goals still due. Progress
+# per kind and day is kept in job_checkpoints ("maturity:<kind>"). Run once
+# from the shell with:
+#   python -m app.workers.maturity [--date YYYY-MM-DD]
+import argparse
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Optional
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal, stick_to_primary_on_commit, utcnow
+from app.core.metrics import export_dict
+from app.models.goals import MyGoalAccount, SafeLockAccount
+from app.models.jobs import JobCheckpoint
+from app.utils.events import record_events
+
+logger = logging.getLogger(__name__)
+
+MATURITY_INTERVAL = float(os.getenv("MATURITY_INTERVAL", "3600"))
+MATURITY_CHUNK_SIZE = int(os.getenv("MATURITY_CHUNK_SIZE", "1000"))
+MATURITY_WORKERS = int(os.getenv("MATURITY_WORKERS", "4"))
+
+GOAL_KINDS = {
+    "safelock": SafeLockAccount,
+    "mygoal": MyGoalAccount,
+}
+CHECKPOINT_PREFIX = "maturity:"
+
+metrics = {
+    "matured_total": 0,
+    "chunks_total": 0,
+    "last_sweep_seconds": 0.0,
+    "last_sweep_goals_per_second": 0.0,
+}
+export_dict("goal_maturity", metrics, "Goal maturity sweep statistic")
+
+
+def _today() -> date:
+    return utcnow().date()
+
+
+def mature_chunk(db: Session, kind: str, today: date, chunk_size: int = MATURITY_CHUNK_SIZE) -> int:
+    # Matures up to chunk_size due goals no other sweeper holds, in one
+    # transaction with their events and the progress count. Returns the
+    # number matured; 0 once nothing due is left unclaimed.
+    model = GOAL_KINDS[kind]
+    due = (
+        select(model.id)
+        .where(model.matured_at.is_(None), model.target_date <= today)
+        .order_by(model.target_date)
+        .limit(chunk_size)
+        .with_for_update(skip_locked=True)
+    )
+    now = utcnow()
+    rows = db.execute(
+        update(model)
+        .where(model.id.in_(due.scalar_subquery()))
+        .values(matured_at=now)
+        .returning(model.id, model.user_id, model.goal_name, model.target_amount, model.target_date)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not rows:
+        db.rollback()
+        return 0
+
+    record_events(
+        db,
+        [
+            dict(
+                event_type=f"{kind}.matured",
+                aggregate_type=kind,
+                aggregate_id=row.id,
+                user_id=row.user_id,
+                payload={"goal_name": row.goal_name, "target_amount": row.target_amount, "target_date": row.target_date},
+            )
+            for row in rows
+        ],
+    )
+    # Owners read their goals from the primary until the replica has matured_at.
+    for user_id in {row.user_id for row in rows}:
+        stick_to_primary_on_commit(db, user_id)
+    # Last, so the shared progress row is only locked for the commit.
+    db.execute(
+        update(JobCheckpoint)
+        .where(JobCheckpoint.name == CHECKPOINT_PREFIX + kind)
+        .values(position=JobCheckpoint.position + len(rows), updated_at=now)
+    )
+    db.commit()
+    return len(rows)
+
+
+def _drain(kind: str, today: date, chunk_size: int) -> tuple[int, int]:
+    db = SessionLocal()
+    matured = chunks = 0
+    try:
+        while True:
+            n = mature_chunk(db, kind, today, chunk_size)
+            if not n:
+                return matured, chunks
+            matured += n
+            chunks += 1
+    finally:
+        db.close()
+
+
+def _start_run(db: Session, kind: str, today: date) -> dict:
+    # Same-day runs continue the day's count; a new day starts from zero.
+    name = CHECKPOINT_PREFIX + kind
+    checkpoint = db.scalar(select(JobCheckpoint).where(JobCheckpoint.name == name))
+    state = checkpoint.state if checkpoint is not None else None
+    if state and state.get("date") == today.isoformat():
+        state = {**state, "finished_at": None}
+        position = JobCheckpoint.position
+    else:
+        state = {"date": today.isoformat(), "started_at": utcnow().isoformat(), "finished_at": None}
+        position = 0
+    stmt = insert(JobCheckpoint).values(name=name, position=0, state=state, updated_at=utcnow())
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[JobCheckpoint.name],
+            set_={"position": position, "state": stmt.excluded.state, "updated_at": stmt.excluded.updated_at},
+        )
+    )
+    db.commit()
+    return state
+
+
+def _finish_run(db: Session, kind: str, state: dict):
+    db.execute(
+        update(JobCheckpoint)
+        .where(JobCheckpoint.name == CHECKPOINT_PREFIX + kind)
+        .values(state={**state, "finished_at": utcnow().isoformat()}, updated_at=utcnow())
+    )
+    db.commit()
+
+
+def sweep_is_due(db: Session, kind: str, today: date) -> bool:
+    state = db.scalar(select(JobCheckpoint.state).where(JobCheckpoint.name == CHECKPOINT_PREFIX + kind))
+    return not state or state.get("date") != today.isoformat() or state.get("finished_at") is None
+
+
+def sweep(kind: str, today: Optional[date] = None, workers: int = MATURITY_WORKERS,
+          chunk_size: int = MATURITY_CHUNK_SIZE) -> int:
+    # Matures every goal of this kind due by `today`. Returns the number
+    # matured by this call.
+    today = today or _today()
+    db = SessionLocal()
+    try:
+        state = _start_run(db, kind, today)
+    finally:
+        db.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"maturity-{kind}") as pool:
+        results = list(pool.map(lambda _: _drain(kind, today, chunk_size), range(workers)))
+    matured = sum(n for n, _ in results)
+    elapsed = time.perf_counter() - start
+
+    db = SessionLocal()
+    try:
+        _finish_run(db, kind, state)
+    finally:
+        db.close()
+
+    metrics["matured_total"] += matured
+    metrics["chunks_total"] += sum(c for _, c in results)
+    metrics["last_sweep_seconds"] = elapsed
+    if elapsed > 0:
+        metrics["last_sweep_goals_per_second"] = matured / elapsed
+    logger.info("Matured %d %s goals due by %s in %.1fs", matured, kind, today, elapsed)
+    return matured
+
+
+def _sweep_due() -> int:
+    today = _today()
+    matured = 0
+    for kind in GOAL_KINDS:
+        db = SessionLocal()
+        try:
+            due = sweep_is_due(db, kind, today)
+        finally:
+            db.close()
+        if due:
+            matured += sweep(kind, today)
+    return matured
+
+
+async def run_scheduler():
+    while True:
+        try:
+            await asyncio.to_thread(_sweep_due)
+        except Exception:
+            logger.exception("Goal maturity sweep failed")
+        await asyncio.sleep(MATURITY_INTERVAL)
+
+
+if __name__ == "__main__":
+    from app.models import transactions, user  # noqa: F401  (resolve relationships on the goal models)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="mature goals due by this date")
+    parser.add_argument("--workers", type=int, default=MATURITY_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=MATURITY_CHUNK_SIZE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    for kind in GOAL_KINDS:
+        print(f"{kind}: matured {sweep(kind, args.date, args.workers, args.chunk_size)}")
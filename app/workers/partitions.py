@@ -0,0 +1,226 @@
+# Keeps deposit_transactions' monthly partitions ahead of time and archives
+# old ones.
+#
+# Each pass makes sure partitions exist for this month and the next
+# DEPOSIT_PARTITIONS_AHEAD months, so inserts never find a month missing.
+# With DEPOSIT_ARCHIVE_DIR set, partitions older than
+# DEPOSIT_RETENTION_MONTHS are detached (CONCURRENTLY, so deposits keep
+# flowing), streamed with COPY into <archive dir>/<partition>.csv.gz and
+# dropped once the file is complete and fsynced. A partition detached by a
+# pass that then failed is picked up again by the next one. Only one process
+# archives at a time; the others skip the pass.
+#
+# To bring a month back, recreate its partition and load the file:
+#   python -m app.workers.partitions --create 2024-01
+#   gunzip -c deposit_transactions_p202401.csv.gz | psql "$DATABASE_URL" \
+#       -c "\copy deposit_transactions FROM STDIN WITH (FORMAT csv, HEADER)"
+#
+# Run a pass from the shell with:
+#   python -m app.workers.partitions [--archive]
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import date
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from app.core.database import engine, try_advisory_lock, utcnow
+from app.core.metrics import export_dict
+
+logger = logging.getLogger(__name__)
+
+DEPOSIT_PARTITIONS_AHEAD = int(os.getenv("DEPOSIT_PARTITIONS_AHEAD", "3"))
+DEPOSIT_RETENTION_MONTHS = int(os.getenv("DEPOSIT_RETENTION_MONTHS", "24"))
+# Archiving is off unless a directory is given; nothing is detached without it.
+DEPOSIT_ARCHIVE_DIR = os.getenv("DEPOSIT_ARCHIVE_DIR", "")
+PARTITION_INTERVAL = float(os.getenv("PARTITION_INTERVAL", "86400"))
+
+PARENT = "deposit_transactions"
+PARTITION_PATTERN = re.compile(PARENT + r"_p(\d{4})(\d{2})")
+# Serialises partition DDL across processes, and archive passes: only one
+# process detaches and exports at a time.
+PARTITION_LOCK_KEY = 0xDE9057
+
+metrics = {
+    "partitions_created_total": 0,
+    "partitions_archived_total": 0,
+    "rows_archived_total": 0,
+}
+export_dict("deposit_partitions", metrics, "Deposit partition maintenance statistic")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_PATTERN.fullmatch(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def create_partition(conn: Connection, month: date) -> bool:
+    # Creates the partition for the month starting at `month`, with its own
+    # unique index on reference. Returns False if it already existed.
+    name = partition_name(month)
+    if conn.scalar(text("SELECT to_regclass(:name)"), {"name": name}) is not None:
+        return False
+    conn.execute(text(
+        f'CREATE TABLE "{name}" PARTITION OF {PARENT} '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    conn.execute(text(f'CREATE UNIQUE INDEX "{name}_reference_key" ON "{name}" (reference)'))
+    metrics["partitions_created_total"] += 1
+    return True
+
+
+def ensure_partitions(today: Optional[date] = None, ahead: int = DEPOSIT_PARTITIONS_AHEAD) -> list[str]:
+    # Returns the names of the partitions created.
+    first = month_start(today or utcnow().date())
+    created = []
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+        for n in range(ahead + 1):
+            month = add_months(first, n)
+            if create_partition(conn, month):
+                created.append(partition_name(month))
+    for name in created:
+        logger.info("Created partition %s", name)
+    return created
+
+
+def attached_partitions(conn: Connection) -> list[str]:
+    return list(conn.scalars(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        f"WHERE i.inhparent = '{PARENT}'::regclass ORDER BY c.relname"
+    )))
+
+
+def detached_partitions(conn: Connection) -> list[str]:
+    # Partition tables left detached by an interrupted archive.
+    names = conn.scalars(text(
+        "SELECT c.relname FROM pg_class c "
+        "WHERE c.relkind = 'r' AND c.relnamespace = current_schema()::regnamespace AND c.relname LIKE :prefix "
+        "AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid) ORDER BY c.relname"
+    ), {"prefix": f"{PARENT}\\_p%"})
+    return [name for name in names if partition_month(name)]
+
+
+class _CountingWriter:
+    # Counts the lines COPY writes; values in these rows never contain a
+    # newline, so lines - 1 (the header) is the row count.
+    def __init__(self, file):
+        self.file = file
+        self.lines = 0
+
+    def write(self, data: bytes):
+        self.lines += data.count(b"\n")
+        return self.file.write(data)
+
+
+def export_partition(name: str, directory: str) -> tuple[str, int]:
+    # Streams a detached partition to <directory>/<name>.csv.gz through COPY,
+    # in constant memory. Returns the path and the number of rows written.
+    path = os.path.join(directory, f"{name}.csv.gz")
+    partial = path + ".partial"
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(f'SELECT count(*) FROM "{name}"')
+        expected = cursor.fetchone()[0]
+        with open(partial, "wb") as f:
+            with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                writer = _CountingWriter(gz)
+                cursor.copy_expert(f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER)', writer)
+            f.flush()
+            os.fsync(f.fileno())
+        raw.rollback()
+    finally:
+        raw.close()
+    rows = writer.lines - 1
+    if rows != expected:
+        raise RuntimeError(f"Archive of {name} has {rows} rows, expected {expected}")
+    os.replace(partial, path)
+    return path, rows
+
+
+def archive_partition(name: str, directory: str) -> int:
+    # Detaches (if still attached), exports and drops one partition. Returns
+    # the number of rows archived.
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if name in attached_partitions(conn):
+            conn.execute(text(f'ALTER TABLE {PARENT} DETACH PARTITION "{name}" CONCURRENTLY'))
+    path, rows = export_partition(name, directory)
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP TABLE "{name}"'))
+    metrics["partitions_archived_total"] += 1
+    metrics["rows_archived_total"] += rows
+    logger.info("Archived %d deposits from %s to %s", rows, name, path)
+    return rows
+
+
+def archive_partitions(
+    today: Optional[date] = None,
+    retention_months: int = DEPOSIT_RETENTION_MONTHS,
+    directory: str = DEPOSIT_ARCHIVE_DIR,
+) -> list[str]:
+    # Archives every partition whose month ended more than retention_months
+    # ago, oldest first. Returns their names; none if another process is
+    # archiving, since two exports of one partition would share its file.
+    cutoff = add_months(month_start(today or utcnow().date()), -retention_months)
+    with try_advisory_lock(PARTITION_LOCK_KEY) as acquired:
+        if not acquired:
+            logger.info("Skipping deposit archive: another process holds the partition lock")
+            return []
+        with engine.connect() as conn:
+            names = detached_partitions(conn) + [
+                name for name in attached_partitions(conn) if partition_month(name) and partition_month(name) < cutoff
+            ]
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(names):
+            archive_partition(name, directory)
+        return sorted(names)
+
+
+def maintain(archive: bool = bool(DEPOSIT_ARCHIVE_DIR)):
+    ensure_partitions()
+    if archive:
+        archive_partitions()
+
+
+async def run_partition_manager():
+    while True:
+        try:
+            await asyncio.to_thread(maintain)
+        except Exception:
+            logger.exception("Deposit partition maintenance failed")
+        await asyncio.sleep(PARTITION_INTERVAL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--archive", action="store_true", help="also archive old partitions to DEPOSIT_ARCHIVE_DIR")
+    parser.add_argument("--create", type=lambda s: date.fromisoformat(s + "-01"), help="create the partition for YYYY-MM")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.create:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+            print(f"{partition_name(args.create)}: {'created' if create_partition(conn, args.create) else 'exists'}")
+    else:
+        print(f"created: {ensure_partitions()}")
+        if args.archive:
+            if not DEPOSIT_ARCHIVE_DIR:
+                parser.error("DEPOSIT_ARCHIVE_DIR is not set")
+            print(f"archived: {archive_partitions()}")
@@ -0,0 +1,228 @@
+# Background reconciler for deposits the user never came back to verify.
+#
+# Each run pages through Paystack's transaction listing for a fixed time
+# window covering the pending deposits, settles the matching ones page by
+# page and checkpoints its progress, so a restarted process resumes where
+# the previous one stopped. Every app process runs the loop, but a run only
+# goes ahead in the one holding RECONCILE_LOCK_KEY; the others skip it. Run
+# once from the shell with:
+#   python -m app.workers.reconcile
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal, try_advisory_lock_async, utcnow
+from app.core.metrics import export_dict
+from app.models.jobs import JobCheckpoint
+from app.models.transactions import DepositTransaction
+from app.utils import paystack
+from app.utils.deposits import DepositError, by_reference, credit_deposit, credit_deposits, to_minor
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "900"))
+RECONCILE_PER_PAGE = int(os.getenv("RECONCILE_PER_PAGE", "100"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "4"))
+RECONCILE_LOOKBACK_DAYS = float(os.getenv("RECONCILE_LOOKBACK_DAYS", "30"))
+# Paystack timestamps a transaction when it is initialised, slightly before
+# the deposit row is written.
+RECONCILE_WINDOW_SLACK = float(os.getenv("RECONCILE_WINDOW_SLACK", "3600"))
+
+CHECKPOINT = "paystack_reconcile"
+# Held for a whole run, so processes don't page Paystack side by side or
+# overwrite each other's checkpoint.
+RECONCILE_LOCK_KEY = 0x2EC0C1
+
+metrics = {
+    "pages_total": 0,
+    "transactions_seen_total": 0,
+    "deposits_settled_total": 0,
+    "last_run_seconds": 0.0,
+}
+export_dict("paystack_reconcile", metrics, "Paystack reconciliation statistic")
+
+
+def _isoformat(value: datetime) -> str:
+    return value.replace(tzinfo=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _save_state(db: Session, state: dict):
+    stmt = insert(JobCheckpoint).values(name=CHECKPOINT, position=state["page"], state=state, updated_at=utcnow())
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[JobCheckpoint.name],
+            set_={"position": stmt.excluded.position, "state": stmt.excluded.state, "updated_at": stmt.excluded.updated_at},
+        )
+    )
+    db.commit()
+
+
+def start_run(db: Session) -> Optional[dict]:
+    # Resumes an unfinished run, or opens a new window from the oldest
+    # pending deposit up to now. None when nothing is pending.
+    state = db.scalar(select(JobCheckpoint.state).where(JobCheckpoint.name == CHECKPOINT))
+    if state and (state["page_count"] is None or state["page"] < state["page_count"]):
+        return state
+
+    now = utcnow()
+    oldest = db.scalar(
+        select(func.min(DepositTransaction.created_at)).where(
+            DepositTransaction.is_successful.is_not(True),
+            DepositTransaction.created_at >= now - timedelta(days=RECONCILE_LOOKBACK_DAYS),
+        )
+    )
+    if oldest is None:
+        return None
+
+    state = {
+        "from": _isoformat(oldest - timedelta(seconds=RECONCILE_WINDOW_SLACK)),
+        "to": _isoformat(now),
+        "page": 0,
+        "page_count": None,
+    }
+    _save_state(db, state)
+    return state
+
+
+def settle_page(db: Session, transactions: list) -> int:
+    # Matches one page of Paystack transactions to pending deposits and
+    # settles them in a single transaction. Returns the number settled.
+    paid = {
+        t["reference"]: t for t in transactions if t.get("status") == "success" and t.get("reference")
+    }
+    if not paid:
+        return 0
+
+    pending = (
+        db.query(DepositTransaction)
+        .filter(*by_reference(*paid), DepositTransaction.is_successful.is_not(True))
+        .all()
+    )
+    matched = []
+    for deposit in pending:
+        if paid[deposit.reference].get("amount") == to_minor(deposit.amount):
+            matched.append(deposit)
+        else:
+            logger.warning("Amount mismatch for deposit %s, left pending", deposit.reference)
+
+    try:
+        settled = len(credit_deposits(db, matched))
+    except DepositError:
+        # Nothing was written; settle one by one so a single bad deposit
+        # does not hold back the rest of the page.
+        settled = 0
+        for deposit in matched:
+            try:
+                with db.begin_nested():
+                    settled += credit_deposit(db, deposit)
+            except DepositError as e:
+                logger.warning("Could not settle deposit %s: %s", deposit.reference, e)
+
+    db.commit()
+    return settled
+
+
+def _with_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def _process_page(state: dict, page: int) -> tuple:
+    transactions, meta = await paystack.list_transactions(
+        page, RECONCILE_PER_PAGE, status="success", from_date=state["from"], to_date=state["to"]
+    )
+    settled = await asyncio.to_thread(_with_session, settle_page, transactions)
+
+    metrics["pages_total"] += 1
+    metrics["transactions_seen_total"] += len(transactions)
+    metrics["deposits_settled_total"] += settled
+    return meta, settled
+
+
+async def reconcile() -> int:
+    # One full pass over the current window, unless another process is
+    # running one. Returns deposits settled.
+    async with try_advisory_lock_async(RECONCILE_LOCK_KEY) as acquired:
+        if not acquired:
+            logger.info("Skipping reconciliation: another process is running it")
+            return 0
+        return await _reconcile()
+
+
+async def _reconcile() -> int:
+    state = await asyncio.to_thread(_with_session, start_run)
+    if state is None:
+        return 0
+
+    start = time.perf_counter()
+    settled_total = 0
+
+    if state["page_count"] is None:
+        meta, settled_total = await _process_page(state, 1)
+        state = {**state, "page": 1, "page_count": meta.get("pageCount") or 0}
+        await asyncio.to_thread(_with_session, _save_state, state)
+
+    # Pages finish out of order; the checkpoint only advances past pages
+    # whose predecessors are all done. Re-running a page after a crash is
+    # harmless because settling is idempotent.
+    pages = iter(range(state["page"] + 1, state["page_count"] + 1))
+    done = set()
+    save_lock = asyncio.Lock()
+
+    async def worker():
+        nonlocal state, settled_total
+        for page in pages:
+            _, settled = await _process_page(state, page)
+            settled_total += settled
+            done.add(page)
+            watermark = state["page"]
+            while watermark + 1 in done:
+                watermark += 1
+                done.discard(watermark)
+            if watermark != state["page"]:
+                state = {**state, "page": watermark}
+                # Serialised so checkpoints are written in order.
+                async with save_lock:
+                    await asyncio.to_thread(_with_session, _save_state, state)
+
+    workers = [asyncio.create_task(worker()) for _ in range(RECONCILE_CONCURRENCY)]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
+    metrics["last_run_seconds"] = time.perf_counter() - start
+    logger.info("Reconciled %d pages, settled %d deposits", state["page_count"], settled_total)
+    return settled_total
+
+
+async def run_reconciler():
+    while True:
+        try:
+            await reconcile()
+        except Exception:
+            logger.exception("Deposit reconciliation failed")
+        await asyncio.sleep(RECONCILE_INTERVAL)
+
+
+if __name__ == "__main__":
+    from app.models import user  # noqa: F401  (resolve relationships on the goal models)
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        try:
+            print(f"settled {await reconcile()} deposits")
+        finally:
+            await paystack.close_client()
+
+    asyncio.run(main())
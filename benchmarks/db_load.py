@@ -0,0 +1,112 @@
+# Load-tests the read endpoints and reports requests/sec and tail latency,
+# comparing the async stack (app.main) with the old sync stack
+# (benchmarks.sync_baseline). Needs a local Postgres at DATABASE_URL with the
+# schema migrated.
+#
+#   DATABASE_URL=postgresql://... python -m benchmarks.db_load --concurrency 64 --duration 15
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from uuid import uuid4
+
+import httpx
+from sqlalchemy import text
+
+from app.core.database import engine
+from app.core.jwt import create_access_token
+
+PATHS = ["/me", "/goals/", "/goals/flexi"]
+TARGETS = {
+    "async": ("app.main:app", 8101),
+    "sync": ("benchmarks.sync_baseline:app", 8102),
+}
+
+
+def seed_user() -> str:
+    user_id = uuid4()
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO users (id, first_name, last_name, gender, date_of_birth, phone_number, email, hashed_password, created_at) "
+                "VALUES (:id, 'load', 'test', 'male', DATE '1990-01-01', :phone, :email, 'x', now())"
+            ),
+            {"id": user_id, "phone": f"load-{user_id}", "email": f"{user_id}@example.com"},
+        )
+        conn.execute(text("INSERT INTO flexi_accounts (id, user_id) VALUES (gen_random_uuid(), :id)"), {"id": user_id})
+        conn.execute(
+            text(
+                'INSERT INTO "safeLock_account" (id, user_id, goal_name, target_amount, target_date, has_emergency_fund, created_at) '
+                "SELECT gen_random_uuid(), :id, 'goal ' || g, 1000, DATE '2030-01-01', false, now() FROM generate_series(1, 10) g"
+            ),
+            {"id": user_id},
+        )
+    return create_access_token({"user_id": str(user_id)})
+
+
+async def wait_until_up(url: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url + "/docs")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+
+async def load(url: str, token: str, concurrency: int, duration: float) -> tuple[int, list[float], int]:
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def worker(client: httpx.AsyncClient, offset: int):
+        nonlocal errors
+        i = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.get(PATHS[i % len(PATHS)], headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+            i += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(client, n) for n in range(concurrency)))
+    return len(latencies), latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--targets", default="async,sync")
+    args = parser.parse_args()
+
+    token = seed_user()
+    print(f"{'stack':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name in args.targets.split(","):
+        module, port = TARGETS[name]
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", module, "--port", str(port), "--log-level", "warning"],
+            env=os.environ.copy(),
+        )
+        try:
+            url = f"http://127.0.0.1:{port}"
+            asyncio.run(wait_until_up(url))
+            total, latencies, errors = asyncio.run(load(url, token, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+        q = statistics.quantiles(latencies, n=100)
+        print(f"{name:>6} {total / args.duration:>9.1f} {q[49]:>8.1f} {q[94]:>8.1f} {q[98]:>8.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# Stress test for concurrent deposit settlement: many pending deposits for one
+# user are each settled several times in parallel, then the balances are
+# checked against the expected totals. Exits non-zero on any lost update,
+# double credit or unbalanced ledger transaction.
+#
+#   DATABASE_URL=postgresql://... python -m benchmarks.deposit_concurrency --deposits 1000 --attempts 3
+import argparse
+import random
+import sys
+import time
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from sqlalchemy import func, select, text
+
+from app.core.database import SessionLocal, engine, utcnow
+from app.models.goals import EmergencyFund, FlexiAccount, SafeLockAccount
+from app.models.ledger import LedgerEntry
+from app.models.transactions import DepositTransaction
+from app.utils.deposits import credit_deposit, new_reference, to_minor
+
+EMERGENCY_PERCENTAGE = 10
+
+
+def seed(deposits: int):
+    user_id, safelock_id = uuid4(), uuid4()
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO users (id, first_name, last_name, gender, date_of_birth, phone_number, email, hashed_password, created_at) "
+                "VALUES (:id, 'stress', 'test', 'male', DATE '1990-01-01', :phone, :email, 'x', now())"
+            ),
+            {"id": user_id, "phone": f"stress-{user_id}", "email": f"{user_id}@example.com"},
+        )
+        conn.execute(
+            text(
+                'INSERT INTO "safeLock_account" (id, user_id, goal_name, target_amount, target_date, '
+                "has_emergency_fund, emergency_fund_percentage, created_at) "
+                "VALUES (:id, :user_id, 'stress', 1000000, DATE '2030-01-01', true, :pct, now())"
+            ),
+            {"id": safelock_id, "user_id": user_id, "pct": EMERGENCY_PERCENTAGE},
+        )
+
+    rows = []
+    for _ in range(deposits):
+        account_type = random.choice(["safelock", "emergency", "flexi"])
+        created_at = utcnow()
+        rows.append(
+            {
+                "id": uuid4(),
+                "user_id": user_id,
+                "goal_id": safelock_id if account_type == "safelock" else None,
+                "amount": Decimal(random.randint(1, 50000)) / 100,
+                "reference": new_reference(created_at),
+                "account_type": account_type,
+                "is_successful": False,
+                "created_at": created_at,
+            }
+        )
+    with engine.begin() as conn:
+        conn.execute(DepositTransaction.__table__.insert(), rows)
+    return user_id, safelock_id, rows
+
+
+def settle(key) -> bool:
+    db = SessionLocal()
+    try:
+        deposit = db.get(DepositTransaction, key)
+        credited = credit_deposit(db, deposit)
+        db.commit()
+        return credited
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--deposits", type=int, default=1000)
+    parser.add_argument("--attempts", type=int, default=3, help="parallel settlements per deposit")
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    user_id, safelock_id, rows = seed(args.deposits)
+    jobs = [(row["id"], row["created_at"]) for row in rows for _ in range(args.attempts)]
+    random.shuffle(jobs)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        credited = sum(pool.map(settle, jobs))
+    elapsed = time.perf_counter() - start
+
+    # Same split as credit_deposit: the fund's share is rounded down in minor units.
+    expected = {"safelock": 0, "emergency": 0, "flexi": 0}
+    for row in rows:
+        amount = to_minor(row["amount"])
+        if row["account_type"] == "safelock":
+            share = amount * EMERGENCY_PERCENTAGE // 100
+            expected["emergency"] += share
+            expected["safelock"] += amount - share
+        else:
+            expected[row["account_type"]] += amount
+
+    db = SessionLocal()
+    try:
+        actual = {
+            "safelock": db.get(SafeLockAccount, safelock_id).current_amount,
+            "emergency": db.query(EmergencyFund).filter_by(user_id=user_id).one().balance,
+            "flexi": db.query(FlexiAccount).filter_by(user_id=user_id).one().balance,
+        }
+        settled = db.query(DepositTransaction).filter_by(user_id=user_id, is_successful=True).count()
+        unbalanced = db.scalar(
+            select(func.count()).select_from(
+                select(LedgerEntry.transaction_id)
+                .where(LedgerEntry.user_id == user_id)
+                .group_by(LedgerEntry.transaction_id)
+                .having(func.sum(LedgerEntry.amount_minor) != 0)
+                .subquery()
+            )
+        )
+    finally:
+        db.close()
+
+    print(f"{len(jobs)} settlements in {elapsed:.2f}s ({len(jobs) / elapsed:.0f}/s), {credited} credited, {settled} settled")
+    ok = credited == len(rows) == settled and unbalanced == 0
+    print(f"{'ok  ' if unbalanced == 0 else 'FAIL'} ledger: {unbalanced} unbalanced transactions")
+    for account, value in expected.items():
+        matches = to_minor(actual[account]) == value
+        ok = ok and matches
+        print(f"{'ok  ' if matches else 'FAIL'} {account}: expected {value / 100:.2f}, got {actual[account]:.2f}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
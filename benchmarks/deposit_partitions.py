@@ -0,0 +1,190 @@
+# Compares deposit lookups on a monthly-partitioned deposit_transactions with
+# the same rows in one unpartitioned table.
+#
+# Seeds --rows deposits spread evenly over the last --months months into two
+# scratch schemas: bench_flat, a plain table with the global unique index on
+# reference the table used to have, and bench_partitioned, partitioned as by
+# migration 0011 and app.workers.partitions. Then times, with the app's own
+# queries:
+#
+#   by reference, flat         the old verify_deposit lookup
+#   by reference, pruned       by_reference() on a dated reference: one partition
+#   by reference, unpruned     a legacy reference: every partition's index
+#   oldest pending             the reconciler's scan for pending deposits
+#
+# and prints p50/p99 latencies and the size of each layout.
+#
+#   DATABASE_URL=postgresql://... alembic upgrade head
+#   DATABASE_URL=postgresql://... python -m benchmarks.deposit_partitions --rows 100000000
+import argparse
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from sqlalchemy import func, select, text
+
+from app.core.database import engine, utcnow
+from app.models.transactions import DepositTransaction
+from app.utils.deposits import by_reference
+from app.workers.partitions import add_months, create_partition, month_start
+from app.workers.reconcile import RECONCILE_LOOKBACK_DAYS
+
+FLAT = "bench_flat"
+PARTITIONED = "bench_partitioned"
+SEED_BATCH = 1_000_000
+# One in PENDING_EVERY deposits never settles.
+PENDING_EVERY = 100
+
+SEED_SQL = """
+INSERT INTO {schema}.deposit_transactions (id, user_id, amount, reference, account_type, is_successful, created_at)
+SELECT gen_random_uuid(), NULL, 1 + g % 500,
+       'dep_' || to_char(t, 'YYYYMMDD') || '_' || lpad(to_hex(g), 12, '0'), 'flexi', g % {pending} <> 0, t
+FROM generate_series(:first, :last) g
+CROSS JOIN LATERAL (SELECT CAST(:start AS timestamp) + (CAST(:end AS timestamp) - CAST(:start AS timestamp)) * (g::float8 / :rows) AS t) c
+"""
+
+
+def create_tables(first_month, months: int):
+    with engine.begin() as conn:
+        for schema in (FLAT, PARTITIONED):
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.execute(text(
+            f"CREATE TABLE {FLAT}.deposit_transactions (LIKE public.deposit_transactions INCLUDING ALL)"
+        ))
+        conn.execute(text(f"ALTER TABLE {FLAT}.deposit_transactions ADD UNIQUE (reference)"))
+        conn.execute(text(
+            f"CREATE TABLE {PARTITIONED}.deposit_transactions (LIKE public.deposit_transactions INCLUDING ALL) "
+            "PARTITION BY RANGE (created_at)"
+        ))
+        # create_partition works on the deposit_transactions in search_path.
+        conn.execute(text(f"SET LOCAL search_path TO {PARTITIONED}"))
+        for n in range(months + 1):
+            create_partition(conn, add_months(first_month, n))
+
+
+def seed(rows: int, start, end):
+    for offset in range(0, rows, SEED_BATCH):
+        begun = time.perf_counter()
+        last = min(offset + SEED_BATCH, rows) - 1
+        with engine.begin() as conn:
+            conn.execute(text("SET LOCAL synchronous_commit = off"))
+            for schema in (FLAT, PARTITIONED):
+                conn.execute(
+                    text(SEED_SQL.format(schema=schema, pending=PENDING_EVERY)),
+                    {"first": offset, "last": last, "rows": rows, "start": start, "end": end},
+                )
+        print(f"  seeded {last + 1:>13,} deposits ({time.perf_counter() - begun:.1f}s)")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for schema in (FLAT, PARTITIONED):
+            conn.execute(text(f"VACUUM ANALYZE {schema}.deposit_transactions"))
+
+
+def sample_references(n: int) -> list[str]:
+    with engine.connect() as conn:
+        rows = conn.scalar(text(f"SELECT reltuples::bigint FROM pg_class WHERE oid = '{FLAT}.deposit_transactions'::regclass"))
+        percent = min(100.0, 100.0 * 20 * n / max(rows, 1))
+        references = list(conn.scalars(text(
+            f"SELECT reference FROM {FLAT}.deposit_transactions TABLESAMPLE SYSTEM ({percent})"
+        )))
+    return random.sample(references, min(n, len(references)))
+
+
+def timed(schema: str, statements: list) -> list[float]:
+    # Runs each statement once on the same connection, with the scratch schema
+    # first in search_path; returns milliseconds.
+    latencies = []
+    with engine.connect() as conn:
+        conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+        conn.execute(statements[0]).all()
+        for statement in statements:
+            start = time.perf_counter()
+            conn.execute(statement).all()
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def lookup(*clauses):
+    return select(DepositTransaction.__table__).where(*clauses)
+
+
+def explain(schema: str, statement) -> list[str]:
+    compiled = statement.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+        return [row[0] for row in conn.execute(text(f"EXPLAIN {compiled}"))]
+
+
+def sizes() -> dict:
+    with engine.connect() as conn:
+        return {
+            "flat": conn.execute(text(
+                f"SELECT pg_total_relation_size('{FLAT}.deposit_transactions'), "
+                f"pg_relation_size('{FLAT}.deposit_transactions_reference_key')"
+            )).one(),
+            "partitioned": conn.execute(text(
+                "SELECT sum(pg_total_relation_size(t.relid)), max(pg_relation_size(i.indexrelid)) "
+                f"FROM pg_partition_tree('{PARTITIONED}.deposit_transactions') t "
+                "JOIN pg_index i ON i.indrelid = t.relid JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE t.isleaf AND c.relname LIKE '%\\_reference\\_key'"
+            )).one(),
+        }
+
+
+def percentile(latencies: list[float], q: float) -> float:
+    return statistics.quantiles(latencies, n=100, method="inclusive")[round(q * 100) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000_000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--pending-scans", type=int, default=50)
+    parser.add_argument("--reuse", action="store_true", help="skip seeding; use the schemas left by --keep")
+    parser.add_argument("--keep", action="store_true", help="leave the scratch schemas in place")
+    args = parser.parse_args()
+
+    now = utcnow()
+    first_month = add_months(month_start(now.date()), -args.months)
+    try:
+        if not args.reuse:
+            print(f"seeding {args.rows:,} deposits over {args.months} months into {FLAT} and {PARTITIONED}")
+            create_tables(first_month, args.months)
+            seed(args.rows, first_month, now)
+
+        references = sample_references(args.lookups)
+        oldest_pending = select(func.min(DepositTransaction.created_at)).where(
+            DepositTransaction.is_successful.is_not(True),
+            DepositTransaction.created_at >= now - timedelta(days=RECONCILE_LOOKBACK_DAYS),
+        )
+        cases = [
+            ("by reference, flat", FLAT, [lookup(*by_reference(r)[:1]) for r in references]),
+            ("by reference, pruned", PARTITIONED, [lookup(*by_reference(r)) for r in references]),
+            ("by reference, unpruned", PARTITIONED, [lookup(*by_reference(r)[:1]) for r in references]),
+            ("oldest pending, flat", FLAT, [oldest_pending] * args.pending_scans),
+            ("oldest pending, partitioned", PARTITIONED, [oldest_pending] * args.pending_scans),
+        ]
+
+        print("\npruned lookup plan:")
+        for line in explain(PARTITIONED, cases[1][2][0]):
+            print(f"  {line}")
+
+        print(f"\n{'query':<30} {'runs':>6} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, schema, statements in cases:
+            latencies = timed(schema, statements)
+            print(f"{name:<30} {len(latencies):>6} {percentile(latencies, 0.5):>8.3f} {percentile(latencies, 0.99):>8.3f}")
+
+        print(f"\n{'layout':<12} {'total MB':>10} {'largest reference index MB':>28}")
+        for layout, (total, reference_index) in sizes().items():
+            print(f"{layout:<12} {total / 2**20:>10,.0f} {reference_index / 2**20:>28,.1f}")
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                for schema in (FLAT, PARTITIONED):
+                    conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
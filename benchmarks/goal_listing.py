@@ -0,0 +1,73 @@
+# Compares payload size and latency of GET /goals/my-Goals for full listings,
+# keyset pages and field projections at several goal counts.
+#
+#   DATABASE_URL=postgresql://... alembic upgrade head
+#   DATABASE_URL=postgresql://... python -m benchmarks.goal_listing
+import argparse
+import statistics
+import time
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.core.database import engine
+from app.core.jwt import create_access_token
+from app.main import app
+
+VARIANTS = {
+    "full": {},
+    "page(50)": {"limit": 50},
+    "fields": {"fields": "id,goal_name,current_amount"},
+    "fields+page(50)": {"fields": "id,goal_name,current_amount", "limit": 50},
+}
+
+
+def seed_user(goals: int):
+    user_id = uuid4()
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO users (id, first_name, last_name, gender, date_of_birth, phone_number, email, hashed_password, created_at) "
+                "VALUES (:id, 'bench', 'user', 'male', DATE '1990-01-01', :phone, :email, 'x', now())"
+            ),
+            {"id": user_id, "phone": f"bench-{user_id}", "email": f"{user_id}@example.com"},
+        )
+        conn.execute(
+            text(
+                'INSERT INTO "myGoal_account" (id, user_id, goal_name, target_amount, target_date, created_at) '
+                "SELECT gen_random_uuid(), :id, 'goal ' || g, 1000, DATE '2030-01-01', now() - (g || ' seconds')::interval "
+                "FROM generate_series(1, :n) g"
+            ),
+            {"id": user_id, "n": goals},
+        )
+    return user_id
+
+
+def run(client: TestClient, args):
+    print(f"{'goals':>8} {'variant':>16} {'bytes':>12} {'p50 ms':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        user_id = seed_user(size)
+        headers = {"Authorization": f"Bearer {create_access_token({'user_id': str(user_id)})}"}
+        for name, params in VARIANTS.items():
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                response = client.get("/goals/my-Goals", params=params, headers=headers)
+                timings.append((time.perf_counter() - start) * 1000)
+                response.raise_for_status()
+            print(f"{size:>8} {name:>16} {len(response.content):>12} {statistics.median(timings):>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,1000,100000")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with TestClient(app) as client:
+        run(client, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# Measures bcrypt verify throughput (the dominant cost of /login) through the
+# HashingService at increasing worker counts.
+#
+#   python -m benchmarks.login_throughput --requests 200
+import argparse
+import asyncio
+import os
+import time
+
+from app.core.security import HashingBusyError, HashingService, hash_password, verify_password
+
+
+async def run(workers: int, requests: int, hashed: str) -> tuple[float, int]:
+    service = HashingService(workers=workers, max_pending=requests)
+    # Warm the pool so process start-up isn't timed.
+    await asyncio.gather(*(service.run(verify_password, "secret", hashed) for _ in range(max(workers, 1))))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(service.run(verify_password, "secret", hashed) for _ in range(requests)),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - start
+    service.shutdown()
+
+    rejected = sum(isinstance(r, HashingBusyError) for r in results)
+    return (requests - rejected) / elapsed, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    hashed = hash_password("secret")
+    counts = sorted({0, 1, *range(2, args.max_workers + 1, 2), args.max_workers})
+
+    print(f"{'workers':>8} {'logins/s':>10} {'rejected':>9}")
+    for workers in counts:
+        rate, rejected = asyncio.run(run(workers, args.requests, hashed))
+        label = "thread" if workers == 0 else str(workers)
+        print(f"{label:>8} {rate:>10.1f} {rejected:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Times the goal-maturity sweep (app.workers.maturity) over synthetic goals.
+#
+# Seeds --goals SafeLocks spread over --users users, --due-fraction of them
+# due today or earlier and the rest due over the next few years, then runs
+# the sweep once per --workers count, resetting the matured goals in between.
+# Prints the plan of the chunk query, which should be an index scan on
+# ix_safelock_due, and goals matured per second.
+#
+#   DATABASE_URL=postgresql://... alembic upgrade head
+#   DATABASE_URL=postgresql://... python -m benchmarks.maturity_sweep --goals 10000000
+import argparse
+import time
+from datetime import date
+
+from sqlalchemy import select, text
+
+from app.core.database import engine
+from app.models import transactions, user  # noqa: F401  (resolve relationships on the goal models)
+from app.models.goals import SafeLockAccount
+from app.workers import maturity
+
+BENCH_EMAIL = "maturity-bench-%@example.com"
+SEED_BATCH = 1_000_000
+
+
+def seed(goals: int, users: int, due_fraction: float):
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO users (id, first_name, last_name, gender, date_of_birth, phone_number, email, hashed_password, created_at) "
+                "SELECT gen_random_uuid(), 'bench', 'user', 'male', DATE '1990-01-01', 'maturity-bench-' || u, "
+                "'maturity-bench-' || u || '@example.com', 'x', now() FROM generate_series(1, :users) u"
+            ),
+            {"users": users},
+        )
+    due_per_mille = round(due_fraction * 1000)
+    for offset in range(0, goals, SEED_BATCH):
+        start = time.perf_counter()
+        count = min(SEED_BATCH, goals - offset)
+        with engine.begin() as conn:
+            conn.execute(text("SET LOCAL synchronous_commit = off"))
+            conn.execute(
+                text(
+                    "WITH bench_users AS (SELECT array_agg(id) AS ids FROM users WHERE email LIKE :email) "
+                    'INSERT INTO "safeLock_account" (id, user_id, goal_name, target_amount, target_date, has_emergency_fund, created_at) '
+                    "SELECT gen_random_uuid(), ids[1 + g % :users], 'bench goal', 1000, "
+                    "CASE WHEN (g::bigint * 7919) % 1000 < :due THEN CURRENT_DATE - (g % 365) "
+                    "ELSE CURRENT_DATE + 1 + (g % 1500) END, false, now() "
+                    "FROM bench_users, generate_series(:first, :last) g"
+                ),
+                {"email": BENCH_EMAIL, "users": users, "due": due_per_mille,
+                 "first": offset + 1, "last": offset + count},
+            )
+        print(f"  seeded {offset + count:>11,} goals ({time.perf_counter() - start:.1f}s)")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text('VACUUM ANALYZE "safeLock_account"'))
+
+
+def reset():
+    # Puts matured bench goals back to due and drops their events.
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                'UPDATE "safeLock_account" SET matured_at = NULL WHERE matured_at IS NOT NULL '
+                "AND user_id IN (SELECT id FROM users WHERE email LIKE :email)"
+            ),
+            {"email": BENCH_EMAIL},
+        )
+        conn.execute(text("DELETE FROM event_outbox WHERE event_type = 'safelock.matured'"))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text('VACUUM ANALYZE "safeLock_account"'))
+        conn.execute(text("VACUUM ANALYZE event_outbox"))
+
+
+def cleanup():
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM event_outbox WHERE event_type = 'safelock.matured'"))
+        conn.execute(
+            text(
+                'DELETE FROM "safeLock_account" WHERE user_id IN (SELECT id FROM users WHERE email LIKE :email)'
+            ),
+            {"email": BENCH_EMAIL},
+        )
+        conn.execute(text("DELETE FROM users WHERE email LIKE :email"), {"email": BENCH_EMAIL})
+
+
+def explain_chunk(chunk_size: int):
+    query = (
+        select(SafeLockAccount.id)
+        .where(SafeLockAccount.matured_at.is_(None), SafeLockAccount.target_date <= date.today())
+        .order_by(SafeLockAccount.target_date)
+        .limit(chunk_size)
+        .with_for_update(skip_locked=True)
+    )
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text(f"EXPLAIN {compiled}"))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--goals", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--due-fraction", type=float, default=0.1)
+    parser.add_argument("--workers", default="1,4", help="comma-separated worker counts to compare")
+    parser.add_argument("--chunk-size", type=int, default=maturity.MATURITY_CHUNK_SIZE)
+    parser.add_argument("--reuse", action="store_true", help="skip seeding; use goals left by --keep")
+    parser.add_argument("--keep", action="store_true", help="leave the synthetic goals in place")
+    args = parser.parse_args()
+
+    try:
+        if not args.reuse:
+            print(f"seeding {args.goals:,} goals over {args.users:,} users, {args.due_fraction:.0%} due")
+            seed(args.goals, args.users, args.due_fraction)
+
+        print("\nchunk query plan:")
+        for line in explain_chunk(args.chunk_size):
+            print(f"  {line}")
+
+        print(f"\n{'workers':>8} {'matured':>11} {'seconds':>9} {'goals/s':>10}")
+        for workers in (int(w) for w in args.workers.split(",")):
+            reset()
+            start = time.perf_counter()
+            matured = maturity.sweep("safelock", date.today(), workers, args.chunk_size)
+            elapsed = time.perf_counter() - start
+            print(f"{workers:>8} {matured:>11,} {elapsed:>9.1f} {matured / elapsed:>10,.0f}")
+    finally:
+        if not args.keep:
+            cleanup()
+
+
+if __name__ == "__main__":
+    main()
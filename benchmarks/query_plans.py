@@ -0,0 +1,127 @@
+# Seeds a large synthetic dataset and checks that every per-user route query
+# is served by an index. Exits non-zero if any plan falls back to a Seq Scan
+# of a non-empty table.
+#
+#   DATABASE_URL=postgresql://... alembic upgrade head
+#   DATABASE_URL=postgresql://... python -m benchmarks.query_plans --users 50000
+import argparse
+import re
+import sys
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from app.core.database import engine
+from app.models.goals import EmergencyFund, FlexiAccount, MyGoalAccount, SafeLockAccount
+from app.models.transactions import DepositTransaction
+from app.models.user import User
+from app.utils.deposits import by_reference
+from app.utils.history import history_query
+
+SEED_SQL = """
+INSERT INTO users (id, first_name, last_name, gender, date_of_birth, phone_number, email, hashed_password, created_at)
+SELECT gen_random_uuid(), 'user', g::text, 'male', DATE '1990-01-01', 'bench-' || g, 'bench' || g || '@example.com', 'x', now()
+FROM generate_series(1, :users) g;
+
+INSERT INTO "safeLock_account" (id, user_id, goal_name, target_amount, target_date, has_emergency_fund, created_at)
+SELECT gen_random_uuid(), u.id, 'goal', 1000, DATE '2030-01-01', false, now() - (g || ' minutes')::interval
+FROM users u CROSS JOIN generate_series(1, :per_user) g WHERE u.phone_number LIKE 'bench-%';
+
+INSERT INTO "myGoal_account" (id, user_id, goal_name, target_amount, target_date, created_at)
+SELECT gen_random_uuid(), u.id, 'goal', 1000, DATE '2030-01-01', now() - (g || ' minutes')::interval
+FROM users u CROSS JOIN generate_series(1, :per_user) g WHERE u.phone_number LIKE 'bench-%';
+
+INSERT INTO flexi_accounts (id, user_id)
+SELECT gen_random_uuid(), u.id FROM users u WHERE u.phone_number LIKE 'bench-%';
+
+INSERT INTO emergency_funds (id, user_id, percentage)
+SELECT gen_random_uuid(), u.id, 10 FROM users u WHERE u.phone_number LIKE 'bench-%';
+
+INSERT INTO deposit_transactions (id, user_id, amount, reference, account_type, is_successful, created_at)
+SELECT gen_random_uuid(), u.id, 10, 'dep_' || to_char(t, 'YYYYMMDD') || '_' || left(md5(u.id::text || g), 12), 'flexi', g % 2 = 0, t
+FROM users u CROSS JOIN generate_series(1, :per_user) g CROSS JOIN LATERAL (SELECT now() - (g || ' minutes')::interval AS t) c
+WHERE u.phone_number LIKE 'bench-%';
+
+INSERT INTO ledger_entries (transaction_id, account_type, account_id, user_id, amount_minor, deposit_id, created_at)
+SELECT d.id, leg.account_type, leg.account_id, d.user_id, leg.amount_minor, d.id, d.created_at
+FROM deposit_transactions d
+CROSS JOIN LATERAL (VALUES
+    ('paystack', '00000000-0000-0000-0000-000000000000'::uuid, -1000),
+    ('flexi', d.user_id, 1000)
+) AS leg (account_type, account_id, amount_minor)
+JOIN users u ON u.id = d.user_id
+WHERE d.is_successful AND u.phone_number LIKE 'bench-%';
+
+INSERT INTO account_balances (account_type, account_id, balance_minor, folded_txid, updated_at)
+SELECT account_type, account_id, sum(amount_minor), max(txid) + 1, now()
+FROM ledger_entries GROUP BY account_type, account_id
+ON CONFLICT (account_type, account_id) DO UPDATE
+SET balance_minor = excluded.balance_minor, folded_txid = excluded.folded_txid;
+"""
+
+
+def route_queries(user_id, goal_id, reference, deposit_id):
+    return {
+        "get_current_user": select(User).where(User.id == user_id),
+        "login": select(User).where(User.email == "bench1@example.com"),
+        "GET /goals/": select(SafeLockAccount).where(SafeLockAccount.user_id == user_id),
+        "GET /goals/my-Goals": select(MyGoalAccount).where(MyGoalAccount.user_id == user_id),
+        "GET /goals/emergency": select(EmergencyFund).where(EmergencyFund.user_id == user_id),
+        "GET /goals/flexi": select(FlexiAccount).where(FlexiAccount.user_id == user_id),
+        "init-deposit goal lookup": select(SafeLockAccount).where(
+            SafeLockAccount.id == goal_id, SafeLockAccount.user_id == user_id
+        ),
+        "verify-deposit by reference": select(DepositTransaction).where(
+            *by_reference(reference), DepositTransaction.user_id == user_id
+        ),
+        "deposit by id": select(DepositTransaction).where(
+            DepositTransaction.id == deposit_id, DepositTransaction.user_id == user_id
+        ),
+        "pending deposits": select(DepositTransaction).where(
+            DepositTransaction.user_id == user_id, DepositTransaction.is_successful.is_(False)
+        ),
+        "GET /payments/history": history_query(user_id).limit(51),
+        "GET /payments/history?is_successful": history_query(user_id, is_successful=True).limit(51),
+        "GET /payments/history?account_type": history_query(user_id, account_type="flexi").limit(51),
+        "GET /payments/history?goal_id": history_query(user_id, goal_id=goal_id).limit(51),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--per-user", type=int, default=5)
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if not args.skip_seed:
+            for statement in SEED_SQL.split(";"):
+                if statement.strip():
+                    conn.execute(text(statement), {"users": args.users, "per_user": args.per_user})
+            conn.execute(text("ANALYZE"))
+
+        user_id, goal_id = conn.execute(text('SELECT user_id, id FROM "safeLock_account" LIMIT 1')).one()
+        deposit_id, reference = conn.execute(
+            text("SELECT id, reference FROM deposit_transactions WHERE user_id = :u LIMIT 1"), {"u": user_id}
+        ).one()
+
+        # Partitions for months to come are empty and cost nothing to scan.
+        empty = set(conn.scalars(text("SELECT relname FROM pg_class WHERE relkind = 'r' AND relpages = 0")))
+
+        failures = []
+        for name, stmt in route_queries(user_id, goal_id, reference, deposit_id).items():
+            sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+            plan = "\n".join(row[0] for row in conn.execute(text("EXPLAIN " + sql)))
+            ok = all(table.strip('"') in empty for table in re.findall(r"Seq Scan on (\S+)", plan))
+            print(f"{'ok  ' if ok else 'FAIL'} {name}: {plan.splitlines()[0]}")
+            if not ok:
+                failures.append((name, plan))
+
+    for name, plan in failures:
+        print(f"\n{name}\n{plan}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Measures what the rate limiter (app.core.rate_limit,
+# app.dependencies.rate_limit) adds to a request.
+#
+#   backend   cost of one hit against the backend alone, on a hot key and
+#             spread over more keys than the memory backend keeps
+#   request   a JSON POST through a minimal FastAPI app in-process, with and
+#             without the login limits (IP + email), limits set high enough
+#             that nothing is rejected; the difference is the per-request
+#             overhead
+#
+#   python -m benchmarks.rate_limit --requests 5000
+#   DATABASE_URL=postgresql://... python -m benchmarks.rate_limit --backend postgres
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Optional
+
+import httpx
+from fastapi import Depends, FastAPI
+from pydantic import BaseModel
+
+from app.core import rate_limit as core
+from app.dependencies import rate_limit as deps
+
+
+class LoginBody(BaseModel):
+    email: str
+    password: str
+
+
+def build_app(backend: Optional[core.RateLimitBackend]) -> FastAPI:
+    app = FastAPI()
+    dependencies = [Depends(deps.rate_limit(
+        deps.RateLimit("bench_ip", "1000000000/1", deps.client_ip),
+        deps.RateLimit("bench_email", "1000000000/1", deps.request_email),
+        backend=backend,
+    ))] if backend else []
+
+    @app.post("/login", dependencies=dependencies)
+    async def login(body: LoginBody):
+        return {"ok": True}
+
+    return app
+
+
+async def time_requests(app: FastAPI, requests: int, emails: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(200):
+            await client.post("/login", json={"email": f"warm{i}@example.com", "password": "x"})
+        start = time.perf_counter()
+        for i in range(requests):
+            response = await client.post("/login", json={"email": f"user{i % emails}@example.com", "password": "x"})
+            assert response.status_code == 200, response.text
+        return (time.perf_counter() - start) / requests
+
+
+async def time_backend(backend: core.RateLimitBackend, hits: int, keys: int) -> float:
+    start = time.perf_counter()
+    for i in range(hits):
+        await backend.hit(f"bench:{i % keys}", 1_000_000_000, 1)
+    return (time.perf_counter() - start) / hits
+
+
+async def run(args):
+    backend = core.create_backend(args.backend)
+
+    print(f"backend: {type(backend).__name__}")
+    hot = await time_backend(backend, args.hits, 1)
+    print(f"  hit, one hot key          {hot * 1e6:8.2f} us")
+    spread_keys = core.RATE_LIMIT_MAX_KEYS * 2 if args.backend == "memory" else 10_000
+    spread = await time_backend(backend, args.hits, spread_keys)
+    print(f"  hit, {spread_keys:>7} keys          {spread * 1e6:8.2f} us")
+
+    plain, limited = [], []
+    for _ in range(args.runs):
+        plain.append(await time_requests(build_app(None), args.requests, args.emails))
+        limited.append(await time_requests(build_app(backend), args.requests, args.emails))
+    base, with_limits = statistics.median(plain), statistics.median(limited)
+    print(f"\nrequest ({args.requests} requests x {args.runs} runs, median)")
+    print(f"  without limiter           {base * 1e6:8.1f} us/request")
+    print(f"  with IP + email limits    {with_limits * 1e6:8.1f} us/request")
+    print(f"  overhead                  {(with_limits - base) * 1e6:8.1f} us/request "
+          f"({(with_limits - base) / base:+.1%})")
+    await backend.purge()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="memory", choices=["memory", "postgres"])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--emails", type=int, default=1000, help="distinct emails across the requests")
+    parser.add_argument("--hits", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    if args.backend == "postgres":
+        args.hits = min(args.hits, 5000)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
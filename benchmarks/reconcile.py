@@ -0,0 +1,153 @@
+# Benchmarks the Paystack reconciler against the fake Paystack API seeded with
+# synthetic transactions. Every --pending-every'th synthetic transaction gets a
+# pending deposit (a few with a wrong amount, plus some that Paystack never
+# saw). Optionally simulates a crash part-way through and checks the next run
+# resumes from the checkpoint. Exits non-zero if the wrong deposits settle.
+#
+#   DATABASE_URL=postgresql://... alembic upgrade head
+#   DATABASE_URL=postgresql://... python -m benchmarks.reconcile --transactions 1000000 --crash-after 200
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from datetime import timedelta
+from uuid import uuid4
+
+from sqlalchemy import text
+
+from app.core.database import engine, utcnow
+from app.models import user  # noqa: F401  (resolve relationships on the goal models)
+from app.utils import paystack
+from app.workers import reconcile as reconciler
+from app.workers.partitions import create_partition, month_start
+from benchmarks.db_load import wait_until_up
+
+PORT = 8103
+
+SEED_SQL = """
+INSERT INTO deposit_transactions (id, user_id, amount, reference, account_type, is_successful, created_at)
+SELECT gen_random_uuid(), :user_id,
+       (g % 500) + 1 + CASE WHEN g % :mismatch_every = 0 THEN 1 ELSE 0 END,
+       'syn_' || lpad(g::text, 7, '0'), 'flexi', false, now() - interval '8 days'
+FROM generate_series(0, :transactions - 1, :pending_every) g;
+
+INSERT INTO deposit_transactions (id, user_id, amount, reference, account_type, is_successful, created_at)
+SELECT gen_random_uuid(), :user_id, 10, 'abandoned_' || gen_random_uuid(), 'flexi', false, now() - interval '8 days'
+FROM generate_series(1, :abandoned) g;
+"""
+
+
+def seed(args) -> str:
+    user_id = uuid4()
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "DELETE FROM ledger_entries WHERE deposit_id IN "
+                "(SELECT id FROM deposit_transactions WHERE reference LIKE 'syn\\_%' OR reference LIKE 'abandoned\\_%')"
+            )
+        )
+        conn.execute(text("DELETE FROM deposit_transactions WHERE reference LIKE 'syn\\_%' OR reference LIKE 'abandoned\\_%'"))
+        conn.execute(text("DELETE FROM job_checkpoints WHERE name = :name"), {"name": reconciler.CHECKPOINT})
+        conn.execute(
+            text(
+                "INSERT INTO users (id, first_name, last_name, gender, date_of_birth, phone_number, email, hashed_password, created_at) "
+                "VALUES (:id, 'reconcile', 'test', 'male', DATE '1990-01-01', :phone, :email, 'x', now())"
+            ),
+            {"id": user_id, "phone": f"reconcile-{user_id}", "email": f"{user_id}@example.com"},
+        )
+        params = {
+            "user_id": user_id,
+            "transactions": args.transactions,
+            "pending_every": args.pending_every,
+            "mismatch_every": args.pending_every * args.mismatch_every,
+            "abandoned": args.transactions // args.pending_every // 10,
+        }
+        # The seeded deposits are 8 days old, which may fall in last month.
+        create_partition(conn, month_start((utcnow() - timedelta(days=8)).date()))
+        for statement in SEED_SQL.split(";"):
+            if statement.strip():
+                conn.execute(text(statement), params)
+    return user_id
+
+
+async def run(args):
+    if args.crash_after:
+        task = asyncio.create_task(reconciler.reconcile())
+        while reconciler.metrics["pages_total"] < args.crash_after and not task.done():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        with engine.connect() as conn:
+            page = conn.execute(
+                text("SELECT position FROM job_checkpoints WHERE name = :name"), {"name": reconciler.CHECKPOINT}
+            ).scalar()
+        print(f"crashed after {reconciler.metrics['pages_total']} pages, checkpoint at page {page}")
+
+    before = reconciler.metrics["pages_total"]
+    start = time.perf_counter()
+    await reconciler.reconcile()
+    elapsed = time.perf_counter() - start
+    await paystack.close_client()
+    return reconciler.metrics["pages_total"] - before, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--pending-every", type=int, default=10)
+    parser.add_argument("--mismatch-every", type=int, default=100, help="one in N pending deposits has a wrong amount")
+    parser.add_argument("--per-page", type=int, default=reconciler.RECONCILE_PER_PAGE)
+    parser.add_argument("--concurrency", type=int, default=reconciler.RECONCILE_CONCURRENCY)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--crash-after", type=int, default=0, help="cancel the first run after N pages")
+    args = parser.parse_args()
+
+    user_id = seed(args)
+    reconciler.RECONCILE_PER_PAGE = args.per_page
+    reconciler.RECONCILE_CONCURRENCY = args.concurrency
+    paystack.PAYSTACK_BASE_URL = f"http://127.0.0.1:{PORT}"
+    os.environ.setdefault("PAYSTACK_SECRET_KEY", "sk_test_fake")
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.utils.fake_paystack:app", "--port", str(PORT), "--log-level", "warning"],
+        env={
+            **os.environ,
+            "FAKE_PAYSTACK_SEED_COUNT": str(args.transactions),
+            "FAKE_PAYSTACK_LATENCY_MS": str(args.latency_ms),
+        },
+    )
+    try:
+        asyncio.run(wait_until_up(paystack.PAYSTACK_BASE_URL))
+        pages, elapsed = asyncio.run(run(args))
+    finally:
+        server.terminate()
+        server.wait()
+
+    with engine.connect() as conn:
+        counts = dict(
+            conn.execute(
+                text(
+                    "SELECT CASE WHEN reference LIKE 'abandoned%' THEN 'abandoned' "
+                    "WHEN (amount - 1)::int % 500 = (substr(reference, 5)::int % 500) THEN 'match' ELSE 'mismatch' END, "
+                    "count(*) FILTER (WHERE is_successful) FROM deposit_transactions WHERE user_id = :u GROUP BY 1"
+                ),
+                {"u": user_id},
+            ).all()
+        )
+    expected = len(range(0, args.transactions, args.pending_every))
+    expected -= len(range(0, args.transactions, args.pending_every * args.mismatch_every))
+
+    transactions = pages * args.per_page
+    print(f"{pages} pages in {elapsed:.1f}s: {pages / elapsed:.0f} pages/s, {transactions / elapsed:.0f} transactions/s")
+    ok = counts.get("match") == expected and not counts.get("mismatch") and not counts.get("abandoned")
+    print(
+        f"{'ok  ' if ok else 'FAIL'} settled {counts.get('match')} of {expected} matching deposits, "
+        f"{counts.get('mismatch')} mismatched, {counts.get('abandoned')} abandoned"
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
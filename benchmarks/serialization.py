@@ -0,0 +1,96 @@
+# Microbenchmark of response encoding for the schemas in app/schemas/goals.py
+# and app/schemas/user.py. For each schema it times, per object:
+#   validated+json    FastAPI's response_model path with the stdlib encoder
+#   validated+orjson  the same path with ORJSONResponse (the app default)
+#   trusted           app.core.serialization.orm_response
+# and checks the trusted output decodes to the same JSON as the validated one.
+#
+#   python -m benchmarks.serialization --objects 1000
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import List
+from uuid import uuid4
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.core.serialization import orm_response
+from app.schemas import goals, user
+
+
+def _goal(i: int, **extra) -> SimpleNamespace:
+    # Shaped like the ORM rows: Numeric balances, Date target, naive UTC timestamps.
+    return SimpleNamespace(
+        id=uuid4(),
+        user_id=uuid4(),
+        goal_name=f"goal {i}",
+        target_amount=1000.0 + i,
+        current_amount=Decimal(i * 7) / 100,
+        target_date=date(2030, 1, 1) + timedelta(days=i % 365),
+        created_at=datetime(2026, 1, 1) + timedelta(seconds=i),
+        matured_at=None,
+        **extra,
+    )
+
+
+FACTORIES = {
+    goals.SafeLockResponse: lambda i: _goal(i, has_emergency_fund=bool(i % 2), emergency_fund_percentage=10 if i % 2 else None),
+    goals.MyGoalOut: _goal,
+    goals.EmergencyFundOut: lambda i: SimpleNamespace(id=uuid4(), user_id=uuid4(), balance=Decimal(i) / 100),
+    goals.FlexiAccountOut: lambda i: SimpleNamespace(id=uuid4(), user_id=uuid4(), balance=Decimal(i) / 100),
+    user.UserOut: lambda i: SimpleNamespace(
+        id=uuid4(), first_name="Ama", last_name=f"User{i}", email=f"user{i}@example.com",
+        phone_number=f"+2335500{i:05d}", date_of_birth=date(1990, 1, 1) + timedelta(days=i),
+    ),
+}
+
+
+def _per_object(fn, objects: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best / objects * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    ok = True
+    print(f"{'schema':<18} {'validated+json':>15} {'validated+orjson':>17} {'trusted':>9}  us/object")
+    for schema, factory in FACTORIES.items():
+        rows = [factory(i) for i in range(args.objects)]
+        field = create_model_field(name="response", type_=List[schema], mode="serialization")
+
+        def validated(response_class):
+            content = loop.run_until_complete(serialize_response(field=field, response_content=rows, is_coroutine=True))
+            return response_class(content).body
+
+        timings = [
+            _per_object(lambda: validated(JSONResponse), args.objects, args.repeat),
+            _per_object(lambda: validated(ORJSONResponse), args.objects, args.repeat),
+            _per_object(lambda: orm_response(schema, rows).body, args.objects, args.repeat),
+        ]
+        same = json.loads(validated(JSONResponse)) == json.loads(orm_response(schema, rows).body)
+        ok = ok and same
+        print(
+            f"{schema.__name__:<18} {timings[0]:>15.2f} {timings[1]:>17.2f} {timings[2]:>9.2f}"
+            f"  {'' if same else 'OUTPUT DIFFERS'}"
+        )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# The pre-async request path (sync Session in Starlette's threadpool) for the
+# read endpoints, kept only as a baseline for benchmarks.db_load.
+#
+#   uvicorn benchmarks.sync_baseline:app --port 8102
+from typing import List
+from uuid import UUID
+
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.security import APIKeyHeader
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.core.jwt import ALGORITHM, SECRET_KEY
+from app.models import transactions  # noqa: F401  (resolve User.deposits)
+from app.models.goals import FlexiAccount, SafeLockAccount
+from app.models.user import User
+from app.schemas import goals
+from app.schemas.user import UserOut
+
+app = FastAPI()
+oauth2_scheme = APIKeyHeader(name="Authorization")
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    try:
+        payload = jwt.decode(token.removeprefix("Bearer "), SECRET_KEY, algorithms=[ALGORITHM])
+        user = db.query(User).filter(User.id == UUID(payload["user_id"])).first()
+    except (JWTError, KeyError, ValueError):
+        user = None
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return user
+
+
+@app.get("/me", response_model=UserOut)
+def get_me(current_user: User = Depends(get_current_user)):
+    return current_user
+
+
+@app.get("/goals/", response_model=List[goals.SafeLockResponse])
+def get_user_safelocks(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return db.query(SafeLockAccount).filter(SafeLockAccount.user_id == current_user.id).all()
+
+
+@app.get("/goals/flexi", response_model=goals.FlexiAccountOut)
+def get_flexi_account(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    flexi = db.query(FlexiAccount).filter_by(user_id=current_user.id).first()
+    if not flexi:
+        raise HTTPException(status_code=404, detail="Flexi account not found.")
+    return flexi
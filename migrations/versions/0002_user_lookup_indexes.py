@@ -0,0 +1,108 @@
+"""user lookup indexes
+
+Covers the per-user access paths in the goals and payments routes. Indexes
+are built CONCURRENTLY so the migration does not block writes on live tables.
+
+flexi_accounts becomes unique per user. create-flexi used to check and then
+insert, so concurrent requests could give a user more than one account; those
+are merged first into the account with the largest balance, the others'
+balances added to it. A build that fails leaves an INVALID index behind, which
+is dropped on the next run so the migration can simply be rerun.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 11:53:59.843731
+
+"""
+from typing import Sequence, Union
+
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_deposit_user_created", "deposit_transactions", ["user_id", "created_at"]),
+    ("ix_deposit_user_successful", "deposit_transactions", ["user_id", "is_successful"]),
+    ("ix_mygoal_user_created", "myGoal_account", ["user_id", "created_at"]),
+    ("ix_safelock_user_created", "safeLock_account", ["user_id", "created_at"]),
+]
+
+
+def _merge_duplicate_flexi_accounts():
+    merged = op.get_bind().execute(sa.text("""
+        WITH ranked AS (
+            SELECT id, user_id, balance,
+                   first_value(id) OVER (
+                       PARTITION BY user_id ORDER BY coalesce(balance, 0) DESC, id
+                   ) AS keeper
+            FROM flexi_accounts
+            WHERE user_id IS NOT NULL
+        ), extra AS (
+            DELETE FROM flexi_accounts f USING ranked r
+            WHERE f.id = r.id AND r.id <> r.keeper
+            RETURNING r.keeper, coalesce(r.balance, 0) AS balance
+        ), totals AS (
+            SELECT keeper, sum(balance) AS balance, count(*) AS accounts FROM extra GROUP BY keeper
+        )
+        UPDATE flexi_accounts f SET balance = coalesce(f.balance, 0) + t.balance
+        FROM totals t WHERE f.id = t.keeper
+        RETURNING f.user_id, t.accounts
+    """)).all()
+    if merged:
+        logger.warning(
+            "Merged %d duplicate flexi accounts of %d users before making user_id unique",
+            sum(accounts for _, accounts in merged), len(merged),
+        )
+
+
+def _drop_invalid_indexes(names):
+    # Left behind by a CONCURRENTLY build that failed on an earlier run.
+    invalid = op.get_bind().execute(
+        sa.text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE NOT i.indisvalid AND c.relname = ANY(:names)"
+        ),
+        {"names": list(names)},
+    ).scalars().all()
+    for name in invalid:
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def upgrade() -> None:
+    _merge_duplicate_flexi_accounts()
+
+    with op.get_context().autocommit_block():
+        _drop_invalid_indexes([name for name, _, _ in INDEXES] + ["flexi_accounts_user_id_key"])
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(
+            "flexi_accounts_user_id_key",
+            "flexi_accounts",
+            ["user_id"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+    op.execute(
+        "ALTER TABLE flexi_accounts ADD CONSTRAINT flexi_accounts_user_id_key "
+        "UNIQUE USING INDEX flexi_accounts_user_id_key"
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("flexi_accounts_user_id_key", "flexi_accounts", type_="unique")
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
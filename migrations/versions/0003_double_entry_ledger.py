@@ -0,0 +1,123 @@
+"""double entry ledger
+
+Moves goal and fund balances out of mutable Float columns into an append-only
+ledger of minor-unit entries with per-account snapshots. Existing balances are
+carried over as opening-balance transactions before the columns are dropped.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 16:05:12.409871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+OPENING_BALANCE_ID = "00000000-0000-0000-0000-000000000001"
+
+# (ledger account type, table, account id column, balance column)
+BALANCES = [
+    ("safelock", "safeLock_account", "id", "current_amount"),
+    ("mygoal", "myGoal_account", "id", "current_amount"),
+    ("emergency", "emergency_funds", "user_id", "balance"),
+    ("flexi", "flexi_accounts", "user_id", "balance"),
+]
+
+
+def upgrade() -> None:
+    op.create_table('ledger_entries',
+    sa.Column('id', sa.BigInteger(), sa.Identity(always=False), nullable=False),
+    sa.Column('transaction_id', sa.UUID(), nullable=False),
+    sa.Column('account_type', sa.String(), nullable=False),
+    sa.Column('account_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=True),
+    sa.Column('amount_minor', sa.Numeric(precision=20, scale=0), nullable=False),
+    sa.Column('deposit_id', sa.UUID(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_ledger_account_entry', 'ledger_entries', ['account_type', 'account_id', 'id'], unique=False)
+    op.create_index('ix_ledger_transaction', 'ledger_entries', ['transaction_id'], unique=False)
+    op.create_table('account_balances',
+    sa.Column('account_type', sa.String(), nullable=False),
+    sa.Column('account_id', sa.UUID(), nullable=False),
+    sa.Column('balance_minor', sa.Numeric(precision=20, scale=0), nullable=False),
+    sa.Column('last_entry_id', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('account_type', 'account_id')
+    )
+    op.create_table('job_checkpoints',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('position', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    # One balanced two-leg transaction per non-zero account.
+    for account_type, table, id_column, balance_column in BALANCES:
+        op.execute(f"""
+            WITH opening AS (
+                SELECT gen_random_uuid() AS transaction_id, "{id_column}" AS account_id, user_id,
+                       round("{balance_column}"::numeric * 100) AS amount_minor
+                FROM "{table}"
+                WHERE round(coalesce("{balance_column}", 0)::numeric * 100) <> 0
+            )
+            INSERT INTO ledger_entries (transaction_id, account_type, account_id, user_id, amount_minor, created_at)
+            SELECT transaction_id, '{account_type}', account_id, user_id, amount_minor, timezone('utc', now())
+            FROM opening
+            UNION ALL
+            SELECT transaction_id, 'opening', '{OPENING_BALANCE_ID}', user_id, -amount_minor, timezone('utc', now())
+            FROM opening
+        """)
+        op.drop_column(table, balance_column)
+
+    op.execute("""
+        INSERT INTO account_balances (account_type, account_id, balance_minor, last_entry_id, updated_at)
+        SELECT account_type, account_id, sum(amount_minor), max(id), timezone('utc', now())
+        FROM ledger_entries
+        GROUP BY account_type, account_id
+    """)
+    op.execute("""
+        INSERT INTO job_checkpoints (name, position, updated_at)
+        SELECT 'ledger_fold', coalesce(max(id), 0), timezone('utc', now()) FROM ledger_entries
+    """)
+
+    op.alter_column('deposit_transactions', 'amount',
+               existing_type=sa.Float(),
+               type_=sa.Numeric(precision=14, scale=2),
+               existing_nullable=False,
+               postgresql_using='round(amount::numeric, 2)')
+
+
+def downgrade() -> None:
+    op.alter_column('deposit_transactions', 'amount',
+               existing_type=sa.Numeric(precision=14, scale=2),
+               type_=sa.Float(),
+               existing_nullable=False)
+
+    for account_type, table, id_column, balance_column in BALANCES:
+        op.add_column(table, sa.Column(balance_column, sa.Float(), nullable=True))
+        op.execute(f"""
+            UPDATE "{table}" t
+            SET "{balance_column}" = coalesce((
+                SELECT sum(amount_minor) / 100.0 FROM ledger_entries e
+                WHERE e.account_type = '{account_type}' AND e.account_id = t."{id_column}"
+            ), 0)
+        """)
+    for table in ("safeLock_account", "myGoal_account"):
+        op.alter_column(table, 'current_amount', existing_type=sa.Float(), nullable=False)
+
+    op.drop_table('job_checkpoints')
+    op.drop_table('account_balances')
+    op.drop_index('ix_ledger_transaction', table_name='ledger_entries')
+    op.drop_index('ix_ledger_account_entry', table_name='ledger_entries')
+    op.drop_table('ledger_entries')
@@ -0,0 +1,44 @@
+"""reconcile checkpoint state
+
+Adds free-form state to job checkpoints for the Paystack reconciler's run
+window, and a partial index for finding the oldest pending deposit.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 17:21:40.118263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('job_checkpoints', sa.Column('state', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_deposit_pending_created',
+            'deposit_transactions',
+            ['created_at'],
+            unique=False,
+            postgresql_where=sa.text('is_successful IS NOT true'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_deposit_pending_created',
+            table_name='deposit_transactions',
+            postgresql_concurrently=True,
+        )
+    op.drop_column('job_checkpoints', 'state')
@@ -0,0 +1,35 @@
+"""rate limits
+
+Unlogged GCRA buckets for the Postgres rate limit backend.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 21:14:05.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('rate_limits',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('tat', sa.Float(), nullable=False),
+    sa.Column('allowed_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('key'),
+    prefixes=['UNLOGGED']
+    )
+    op.create_index('ix_rate_limits_tat', 'rate_limits', ['tat'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_rate_limits_tat', table_name='rate_limits')
+    op.drop_table('rate_limits')
@@ -0,0 +1,40 @@
+"""otp codes
+
+Moves email verification codes out of users into otp_codes, stored hashed.
+Codes outstanding at upgrade time are dropped; users request a new one.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 22:02:41.530917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('otp_codes',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('code_hash', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_otp_codes_expires', 'otp_codes', ['expires_at'], unique=False)
+    op.drop_column('users', 'email_code_expiry')
+    op.drop_column('users', 'email_verification_code')
+
+
+def downgrade() -> None:
+    op.add_column('users', sa.Column('email_verification_code', sa.String(), nullable=True))
+    op.add_column('users', sa.Column('email_code_expiry', sa.DateTime(), nullable=True))
+    op.drop_index('ix_otp_codes_expires', table_name='otp_codes')
+    op.drop_table('otp_codes')
@@ -0,0 +1,49 @@
+"""event outbox
+
+Domain events written with the changes they describe, numbered and relayed
+by app.workers.events.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 23:10:17.402215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('event_outbox',
+    sa.Column('id', sa.BigInteger(), sa.Identity(always=False), nullable=False),
+    sa.Column('event_type', sa.String(), nullable=False),
+    sa.Column('aggregate_type', sa.String(), nullable=False),
+    sa.Column('aggregate_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=True),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('stream_offset', sa.BigInteger(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_event_outbox_offset', 'event_outbox', ['stream_offset'], unique=True)
+    op.create_index(
+        'ix_event_outbox_unstamped',
+        'event_outbox',
+        ['id'],
+        unique=False,
+        postgresql_where=sa.text('stream_offset IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_event_outbox_unstamped', table_name='event_outbox', postgresql_where=sa.text('stream_offset IS NULL'))
+    op.drop_index('ix_event_outbox_offset', table_name='event_outbox')
+    op.drop_table('event_outbox')
@@ -0,0 +1,60 @@
+"""goal maturity
+
+Adds matured_at to SafeLock and MyGoal accounts, and partial target_date
+indexes over the goals not matured yet for app.workers.maturity.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 23:48:52.660193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('safeLock_account', sa.Column('matured_at', sa.DateTime(), nullable=True))
+    op.add_column('myGoal_account', sa.Column('matured_at', sa.DateTime(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_safelock_due',
+            'safeLock_account',
+            ['target_date'],
+            unique=False,
+            postgresql_where=sa.text('matured_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_mygoal_due',
+            'myGoal_account',
+            ['target_date'],
+            unique=False,
+            postgresql_where=sa.text('matured_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_mygoal_due',
+            table_name='myGoal_account',
+            postgresql_where=sa.text('matured_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_safelock_due',
+            table_name='safeLock_account',
+            postgresql_where=sa.text('matured_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+    op.drop_column('myGoal_account', 'matured_at')
+    op.drop_column('safeLock_account', 'matured_at')
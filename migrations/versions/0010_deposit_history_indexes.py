@@ -0,0 +1,57 @@
+"""deposit history indexes
+
+Keyset indexes on (created_at, id) for each deposit history filter, built
+CONCURRENTLY. They replace ix_deposit_user_created and
+ix_deposit_user_successful, whose access paths they cover.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 09:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_deposit_user_history", ["user_id", "created_at", "id"], None),
+    ("ix_deposit_user_settled_history", ["user_id", "created_at", "id"], "is_successful IS true"),
+    ("ix_deposit_user_pending_history", ["user_id", "created_at", "id"], "is_successful IS NOT true"),
+    ("ix_deposit_user_type_history", ["user_id", "account_type", "created_at", "id"], None),
+    ("ix_deposit_goal_history", ["goal_id", "created_at", "id"], "goal_id IS NOT NULL"),
+]
+REPLACED = [
+    ("ix_deposit_user_created", ["user_id", "created_at"]),
+    ("ix_deposit_user_successful", ["user_id", "is_successful"]),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, columns, where in INDEXES:
+            op.create_index(
+                name,
+                'deposit_transactions',
+                columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+            )
+        for name, _ in REPLACED:
+            op.drop_index(name, table_name='deposit_transactions', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, columns in REPLACED:
+            op.create_index(name, 'deposit_transactions', columns, postgresql_concurrently=True)
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='deposit_transactions', postgresql_concurrently=True)
@@ -0,0 +1,127 @@
+"""partition deposit_transactions
+
+Rebuilds deposit_transactions as a table range-partitioned by month of
+created_at, with partitions from the oldest deposit's month to three months
+ahead, and copies the rows over. The primary key becomes (id, created_at)
+and reference is unique per partition, as keys on a partitioned table must
+include the partition key. Later partitions come from
+app.workers.partitions.
+
+The copy holds an exclusive lock on deposit_transactions; run it in a
+maintenance window on large tables.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 14:03:52.918364
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, Sequence[str], None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+PARTITIONS_AHEAD = 3
+COLUMNS = "id, user_id, goal_id, amount, reference, account_type, is_successful, created_at"
+INDEXES = [
+    ("ix_deposit_user_history", ["user_id", "created_at", "id"], None),
+    ("ix_deposit_user_settled_history", ["user_id", "created_at", "id"], "is_successful IS true"),
+    ("ix_deposit_user_pending_history", ["user_id", "created_at", "id"], "is_successful IS NOT true"),
+    ("ix_deposit_user_type_history", ["user_id", "account_type", "created_at", "id"], None),
+    ("ix_deposit_goal_history", ["goal_id", "created_at", "id"], "goal_id IS NOT NULL"),
+    ("ix_deposit_pending_created", ["created_at"], "is_successful IS NOT true"),
+]
+
+
+def _columns(created_at_nullable: bool = False):
+    return [
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=True),
+        sa.Column('goal_id', sa.UUID(), nullable=True),
+        sa.Column('amount', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('reference', sa.String(), nullable=False),
+        sa.Column('account_type', sa.String(), nullable=False),
+        sa.Column('is_successful', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=created_at_nullable),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+    ]
+
+
+def _create_indexes(table):
+    for name, columns, where in INDEXES:
+        op.create_index(name, table, columns, postgresql_where=sa.text(where) if where else None)
+
+
+def _add_month(month: date, n: int = 1) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    op.execute("LOCK TABLE deposit_transactions IN ACCESS EXCLUSIVE MODE")
+    # created_at becomes part of the key; it has always had a default.
+    op.execute("UPDATE deposit_transactions SET created_at = now() AT TIME ZONE 'utc' WHERE created_at IS NULL")
+    op.rename_table('deposit_transactions', 'deposit_transactions_unpartitioned')
+    # Frees the index names for the new table.
+    for name, _, _ in INDEXES:
+        op.drop_index(name, table_name='deposit_transactions_unpartitioned')
+    op.drop_constraint('deposit_transactions_reference_key', 'deposit_transactions_unpartitioned', type_='unique')
+    op.drop_constraint('deposit_transactions_pkey', 'deposit_transactions_unpartitioned', type_='primary')
+
+    op.create_table(
+        'deposit_transactions',
+        *_columns(),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+    _create_indexes('deposit_transactions')
+
+    this_month = conn.scalar(sa.text("SELECT date_trunc('month', now() AT TIME ZONE 'utc')::date"))
+    oldest = conn.scalar(
+        sa.text("SELECT date_trunc('month', min(created_at))::date FROM deposit_transactions_unpartitioned")
+    )
+    month = min(oldest or this_month, this_month)
+    while month <= _add_month(this_month, PARTITIONS_AHEAD):
+        name = f"deposit_transactions_p{month:%Y%m}"
+        op.execute(
+            f'CREATE TABLE "{name}" PARTITION OF deposit_transactions '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_month(month).isoformat()}')"
+        )
+        op.execute(f'CREATE UNIQUE INDEX "{name}_reference_key" ON "{name}" (reference)')
+        month = _add_month(month)
+
+    op.execute(
+        f"INSERT INTO deposit_transactions ({COLUMNS}) SELECT {COLUMNS} FROM deposit_transactions_unpartitioned"
+    )
+    op.drop_table('deposit_transactions_unpartitioned')
+
+
+def downgrade() -> None:
+    # Archived (dropped) partitions are not restored.
+    op.execute("LOCK TABLE deposit_transactions IN ACCESS EXCLUSIVE MODE")
+    op.rename_table('deposit_transactions', 'deposit_transactions_partitioned')
+    for name, _, _ in INDEXES:
+        op.drop_index(name, table_name='deposit_transactions_partitioned')
+    op.drop_constraint('deposit_transactions_pkey', 'deposit_transactions_partitioned', type_='primary')
+
+    op.create_table(
+        'deposit_transactions',
+        *_columns(created_at_nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('reference'),
+    )
+    _create_indexes('deposit_transactions')
+    op.execute(
+        f"INSERT INTO deposit_transactions ({COLUMNS}) SELECT {COLUMNS} FROM deposit_transactions_partitioned"
+    )
+    # Takes the partitions with it.
+    op.drop_table('deposit_transactions_partitioned')
@@ -0,0 +1,36 @@
+"""redact sent emails
+
+Clears the bodies of outbox emails that were sent or given up on, which may
+hold verification codes in plaintext. app.workers.email redacts them from
+now on. The bodies are not restored on downgrade.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-20 10:21:07.533940
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, Sequence[str], None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# EMAIL_MAX_ATTEMPTS' default when this was written.
+MAX_ATTEMPTS = 5
+
+
+def upgrade() -> None:
+    op.execute(
+        "UPDATE email_outbox SET body = '[redacted]' "
+        f"WHERE (sent_at IS NOT NULL OR attempts >= {MAX_ATTEMPTS}) AND body <> '[redacted]'"
+    )
+
+
+def downgrade() -> None:
+    pass
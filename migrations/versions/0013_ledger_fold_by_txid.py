@@ -0,0 +1,95 @@
+"""ledger fold by txid
+
+Stamps ledger entries with the id of the transaction that wrote them and
+tracks, per snapshot, the txid it is folded up to (folded_txid) instead of an
+entry id, so app.workers.ledger only folds entries whose transaction has
+finished. Existing entries get txid 0 and every snapshot is recomputed from
+the whole ledger, which also picks up entries an earlier fold skipped.
+
+The recompute holds writes to ledger_entries for one pass over the table;
+run it in a maintenance window on large ledgers.
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-20 15:42:18.106629
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0013'
+down_revision: Union[str, Sequence[str], None] = '0012'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A constant default fills existing rows without a rewrite; new rows get
+    # their transaction's id.
+    op.add_column('ledger_entries', sa.Column('txid', sa.BigInteger(), server_default='0', nullable=False))
+    op.alter_column('ledger_entries', 'txid', server_default=sa.text('pg_current_xact_id()::text::bigint'))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_ledger_account_txid', 'ledger_entries', ['account_type', 'account_id', 'txid'],
+            postgresql_concurrently=True,
+        )
+        op.create_index('ix_ledger_txid', 'ledger_entries', ['txid'], postgresql_concurrently=True)
+
+    # Waits for in-flight writers, so every existing entry is visible below.
+    op.execute("LOCK TABLE ledger_entries IN EXCLUSIVE MODE")
+    op.add_column('account_balances', sa.Column('folded_txid', sa.BigInteger(), server_default='0', nullable=False))
+    op.alter_column('account_balances', 'folded_txid', server_default=None)
+    op.drop_column('account_balances', 'last_entry_id')
+    # Entries from before the column have txid 0; those written since the
+    # default went in (during the index builds) have a real one and are left
+    # to the folder, so folded_txid 1 covers exactly the txid-0 entries.
+    op.execute("DELETE FROM account_balances")
+    op.execute("""
+        INSERT INTO account_balances (account_type, account_id, balance_minor, folded_txid, updated_at)
+        SELECT account_type, account_id, sum(amount_minor), 1, timezone('utc', now())
+        FROM ledger_entries
+        WHERE txid = 0
+        GROUP BY account_type, account_id
+    """)
+    op.execute("""
+        INSERT INTO job_checkpoints (name, position, updated_at)
+        VALUES ('ledger_fold', 1, timezone('utc', now()))
+        ON CONFLICT (name) DO UPDATE SET position = excluded.position, updated_at = excluded.updated_at
+    """)
+
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_ledger_account_entry', table_name='ledger_entries', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_ledger_account_entry', 'ledger_entries', ['account_type', 'account_id', 'id'],
+            postgresql_concurrently=True,
+        )
+
+    op.execute("LOCK TABLE ledger_entries IN EXCLUSIVE MODE")
+    op.add_column('account_balances', sa.Column('last_entry_id', sa.BigInteger(), server_default='0', nullable=False))
+    op.alter_column('account_balances', 'last_entry_id', server_default=None)
+    op.drop_column('account_balances', 'folded_txid')
+    op.execute("DELETE FROM account_balances")
+    op.execute("""
+        INSERT INTO account_balances (account_type, account_id, balance_minor, last_entry_id, updated_at)
+        SELECT account_type, account_id, sum(amount_minor), max(id), timezone('utc', now())
+        FROM ledger_entries
+        GROUP BY account_type, account_id
+    """)
+    op.execute("""
+        INSERT INTO job_checkpoints (name, position, updated_at)
+        SELECT 'ledger_fold', coalesce(max(id), 0), timezone('utc', now()) FROM ledger_entries
+        ON CONFLICT (name) DO UPDATE SET position = excluded.position, updated_at = excluded.updated_at
+    """)
+
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_ledger_txid', table_name='ledger_entries', postgresql_concurrently=True)
+        op.drop_index('ix_ledger_account_txid', table_name='ledger_entries', postgresql_concurrently=True)
+    op.drop_column('ledger_entries', 'txid')
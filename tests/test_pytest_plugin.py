@@ -0,0 +1,108 @@
+# Runs app.core.pytest_plugin in pytester against a one-route app that
+# executes a given number of statements on the app's sync engine. Needs the
+# database in DATABASE_URL, like the app itself.
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core.database import engine
+
+try:
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+except OperationalError as exc:
+    pytest.skip(f"database not reachable: {exc.orig}", allow_module_level=True)
+
+CONFTEST = """
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.core.database import engine
+from app.core.profiling import SQLProfilingMiddleware
+
+pytest_plugins = ["app.core.pytest_plugin"]
+
+app = FastAPI()
+app.add_middleware(SQLProfilingMiddleware)
+
+
+@app.get("/queries/{n}")
+def run_queries(n: int, repeat: bool = False):
+    with engine.connect() as conn:
+        for i in range(n):
+            conn.execute(text("SELECT 0" if repeat else f"SELECT {i}"))
+    return {}
+
+
+client = TestClient(app)
+"""
+
+
+@pytest.fixture
+def plugin(pytester):
+    pytester.makeconftest(CONFTEST)
+    return pytester
+
+
+def test_marker_budget(plugin):
+    plugin.makepyfile("""
+        import pytest
+        from conftest import client
+
+        @pytest.mark.query_budget(3)
+        def test_within():
+            client.get("/queries/3")
+
+        @pytest.mark.query_budget(3)
+        def test_over():
+            client.get("/queries/4")
+
+        @pytest.mark.query_budget(1)
+        @pytest.mark.query_budget(4, route="GET /queries/{n}")
+        def test_route_marker_wins():
+            client.get("/queries/4")
+    """)
+    result = plugin.runpytest()
+    result.assert_outcomes(passed=2, failed=1)
+    result.stdout.fnmatch_lines(["*GET /queries/{n} ran 4 SQL statements, budget is 3*"])
+
+
+def test_ini_budgets(plugin):
+    plugin.makeini("""
+        [pytest]
+        query_budgets =
+            GET /queries/{n} = 2
+        query_budget_default = 0
+    """)
+    plugin.makepyfile("""
+        from conftest import client
+
+        def test_within():
+            client.get("/queries/2")
+
+        def test_over():
+            client.get("/queries/5")
+
+        def test_unmatched_route_uses_default():
+            client.get("/missing")
+    """)
+    result = plugin.runpytest()
+    result.assert_outcomes(passed=2, failed=1)
+    result.stdout.fnmatch_lines(["*GET /queries/{n} ran 5 SQL statements, budget is 2*"])
+
+
+def test_fail_on_n_plus_one(plugin):
+    plugin.makepyfile("""
+        from conftest import client
+
+        def test_distinct():
+            client.get("/queries/5")
+
+        def test_repeated():
+            client.get("/queries/5", params={"repeat": True})
+    """)
+    plugin.runpytest().assert_outcomes(passed=2)
+    result = plugin.runpytest("--fail-on-n-plus-one")
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(["*GET /queries/{n} repeated 5x: SELECT 0*"])